@@ -5,7 +5,7 @@ import torch
 import torch.nn as nn
 import torch.nn.functional as F
 import torch.optim as optim
-from data_loaders import load_data_labels_based_on_dataset
+from data_loaders import load_subjects
 from data_utils import get_dataset_basic_info, get_input_data_path, standard_saving_path
 from DiffE.diffE_models import (
     DDPM,
@@ -302,11 +302,10 @@ if __name__ == "__main__":
         )
         dataset_info["#_channels"] = 1
 
-    for subject_id in range(1, dataset_info["subjects"] + 1):
-        _, X, Y = load_data_labels_based_on_dataset(
-            dataset_info,
-            subject_id,
-            data_path,
-            channels_independent=channels_independent,
-        )
+    for subject_id, X, Y in load_subjects(
+        dataset_info,
+        range(1, dataset_info["subjects"] + 1),
+        data_path,
+        channels_independent=channels_independent,
+    ):  # The next subjects are loaded while this one is trained
         diffE_train(subject_id=subject_id, X=X, Y=Y, dataset_info=dataset_info)
@@ -234,12 +234,11 @@ if __name__ == "__main__":
                 "a",
             ) as f:
                 f.write(f"Subject: {subject_id}\n\n")
-            epochs, _, _ = load_data_labels_based_on_dataset(
+            _, data, labels = load_data_labels_based_on_dataset(
                 dataset_info, subject_id, data_path
             )
 
-            data = (epochs.get_data() * 1e6).astype(np.float32)
-            labels = epochs.events[:, 2].astype(np.int64)
+            data = (data * 1e6).astype(np.float32)
             labels = convert_into_binary(
                 labels, chosen_numbered_label=chosen_numbered_label
             )
@@ -253,7 +252,7 @@ if __name__ == "__main__":
             testing_time_over_cv = []
             training_time = []
             accuracy = 0
-            for train, test in cv.split(epochs, labels):
+            for train, test in cv.split(data, labels):
                 print(
                     "******************************** Training ********************************"
                 )
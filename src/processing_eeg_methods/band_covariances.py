@@ -0,0 +1,174 @@
+import copy
+
+import numpy as np
+from mne.decoding import CSP
+from online_recentering import OnlineRecentering
+from pyriemann.estimation import Covariances, ERPCovariances, XdawnCovariances
+from pyriemann.tangentspace import TangentSpace
+from sklearn.pipeline import Pipeline
+
+
+def oas_shrinkage(covariances, n_samples: int) -> np.ndarray:
+    """
+    Oracle Approximating Shrinkage of the empirical covariances, same as sklearn.covariance.oas for each matrix.
+
+    Parameters
+    ----------
+    covariances: (..., n, n) empirical (centered, divided by n_samples) covariances.
+    n_samples: samples used to estimate them.
+    """
+    n_features = covariances.shape[-1]
+    alpha = np.mean(covariances**2, axis=(-2, -1))
+    mu = np.trace(covariances, axis1=-2, axis2=-1) / n_features
+    num = alpha + mu**2
+    den = (n_samples + 1) * (alpha - mu**2 / n_features)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        shrinkage = np.where(den == 0, 1.0, np.minimum(num / den, 1.0))
+    shrunk = (1.0 - shrinkage)[..., np.newaxis, np.newaxis] * covariances
+    diagonal = np.arange(n_features)
+    shrunk[..., diagonal, diagonal] += (shrinkage * mu)[..., np.newaxis]
+    return shrunk
+
+
+class BandCovariances:
+    """
+    Mean and second moment (X @ X.T / n_times) of each trial of one band, computed once and shared by all the
+    covariance based transforms of transform_data:
+
+    - Covariances (scm or oas) is the centered second moment.
+    - CSP features are the log of diag(W @ S @ W.T), the average power of the CSP sources.
+    - ERPCovariances and XdawnCovariances augment the (Xdawn filtered) trial with the class prototypes P; the
+      covariance of [P; V @ X] is built by blocks, only the cross term P @ X.T is computed for each transform.
+
+    The fitted estimators are the usual pyriemann/mne ones, only their covariances are taken from here.
+
+    Parameters
+    ----------
+    X: [epochs, chans, samples] data of the band.
+    """
+
+    def __init__(self, X):
+        self.X = np.asarray(X, dtype=np.float64)
+        self.n_times = self.X.shape[-1]
+        self.means = self.X.mean(axis=-1)
+        self.second_moments = self.X @ self.X.transpose(0, 2, 1) / self.n_times
+
+    def _estimate(self, covariances, estimator: str):
+        if estimator == "oas":
+            return oas_shrinkage(covariances, self.n_times)
+        return covariances
+
+    def covariances(self, estimator: str = "scm") -> np.ndarray:
+        """
+        Same as pyriemann Covariances(estimator).transform(X) for "scm" and "oas".
+        """
+        centered = self.second_moments - np.einsum("ti,tj->tij", self.means, self.means)
+        return self._estimate(centered, estimator)
+
+    def prototype_covariances(
+        self, P, filters=None, estimator: str = "oas"
+    ) -> np.ndarray:
+        """
+        Same as pyriemann covariances_EP(filters @ X, P, estimator) for "scm" and "oas".
+
+        Parameters
+        ----------
+        P: [prototypes x samples] ERPCovariances.P_ or XdawnCovariances.P_
+        filters: [filters x chans] Xdawn filters, None for ERPCovariances (no filtering).
+        estimator
+        """
+        if filters is None:
+            filters = np.eye(self.X.shape[1])
+        P = np.asarray(P, dtype=np.float64)
+        n_prototypes = P.shape[0]
+        prototype_mean = P.mean(axis=-1)
+        means = self.means @ filters.T
+
+        augmented = np.empty(
+            (len(self.X), n_prototypes + len(filters), n_prototypes + len(filters))
+        )
+        augmented[:, :n_prototypes, :n_prototypes] = P @ P.T / self.n_times - np.outer(
+            prototype_mean, prototype_mean
+        )
+        cross = (P @ self.X.transpose(0, 2, 1) / self.n_times) @ filters.T - np.einsum(
+            "p,tf->tpf", prototype_mean, means
+        )
+        augmented[:, :n_prototypes, n_prototypes:] = cross
+        augmented[:, n_prototypes:, :n_prototypes] = cross.transpose(0, 2, 1)
+        filtered_second_moments = filters @ self.second_moments @ filters.T
+        augmented[:, n_prototypes:, n_prototypes:] = (
+            filtered_second_moments - np.einsum("tf,tg->tfg", means, means)
+        )
+        return self._estimate(augmented, estimator)
+
+    def csp_features(self, csp: CSP) -> np.ndarray:
+        """
+        Same as csp.transform(X) for the average power with log=True (transform_data's CSP).
+        """
+        # The picked filters are the CSP sources of an identity "trial", whatever the mne version picks
+        sources = copy.copy(csp)
+        sources.transform_into = "csp_space"
+        filters = sources.transform(np.eye(self.X.shape[1])[np.newaxis])[0]
+        return np.log(np.einsum("fi,tij,fj->tf", filters, self.second_moments, filters))
+
+
+def transform_band(
+    pipeline: Pipeline,
+    band_covariances: BandCovariances,
+    labels=None,
+    recentering: OnlineRecentering = None,
+):
+    """
+    Same as pipeline.fit_transform(X, labels) if labels are given, pipeline.transform(X) otherwise, with X the data of
+    band_covariances. The covariances of the first step are taken from band_covariances when it's one of the
+    estimators above, the rest of the steps (TangentSpace) are fitted and applied as usual.
+    If recentering is given (and no labels), the reference of the TangentSpace is moved towards the new covariances
+    before projecting them, the caller advances recentering once all the pipelines of these trials are done.
+
+    Returns
+    -------
+    [epochs x features] array
+    """
+    steps = [step for _, step in pipeline.steps]
+    if len(steps) == 1 and isinstance(steps[0], Pipeline):
+        # transform_data wraps each features pipeline in another Pipeline
+        steps = [step for _, step in steps[0].steps]
+    first, rest = steps[0], steps[1:]
+    estimator = getattr(first, "estimator", None)
+
+    if isinstance(first, CSP) and first.transform_into == "average_power":
+        if labels is not None:
+            first.fit(band_covariances.X, labels)
+        X_features = (
+            band_covariances.csp_features(first)
+            if first.log in (None, True)
+            else first.transform(band_covariances.X)
+        )
+    elif isinstance(first, (ERPCovariances, XdawnCovariances)) and estimator in (
+        "scm",
+        "oas",
+    ):
+        if labels is not None:
+            first.fit(band_covariances.X, labels)
+        if isinstance(first, XdawnCovariances):
+            filters = first.Xd_.filters_ if first.applyfilters else None
+        else:
+            filters = None
+        X_features = band_covariances.prototype_covariances(
+            first.P_, filters, estimator
+        )
+    elif isinstance(first, Covariances) and estimator in ("scm", "oas"):
+        X_features = band_covariances.covariances(estimator)
+    elif labels is not None:
+        X_features = first.fit_transform(band_covariances.X, labels)
+    else:
+        X_features = first.transform(band_covariances.X)
+
+    for step in rest:
+        if labels is not None:
+            X_features = step.fit_transform(X_features, labels)
+        else:
+            if recentering is not None and isinstance(step, TangentSpace):
+                recentering.recenter(step, X_features)
+            X_features = step.transform(X_features)
+    return X_features
@@ -0,0 +1,65 @@
+import contextlib
+import io
+import time
+
+import numpy as np
+import pandas as pd
+from data_utils import ClfSwitcher, classifiers, successive_halving_search
+from pyriemann.estimation import Covariances
+from pyriemann.tangentspace import TangentSpace
+from sklearn.model_selection import GridSearchCV, StratifiedKFold
+from sklearn.pipeline import Pipeline
+
+if __name__ == "__main__":
+    # Training time of customized_train's "Cova + TS" pipeline with the whole classifiers zoo: exhaustive grid
+    # search (what search="grid" would cost with the zoo) against successive halving on all the cores, on
+    # braincommand-like trials: 8 channels, 1.4 s at 250 Hz.
+    rng = np.random.default_rng(42)
+    labels = np.repeat(np.arange(4), 40)
+    data = rng.normal(size=(len(labels), 8, 350))
+    data[labels == 1, :2] *= 1.1
+    data[labels == 2, 2:4] *= 1.1
+    data[labels == 3, 4:6] *= 1.1
+    estimators = Pipeline(
+        [("Cova", Covariances()), ("ts", TangentSpace()), ("clf", ClfSwitcher())]
+    )
+    cv = StratifiedKFold(n_splits=4, shuffle=True, random_state=42)
+
+    results = []
+    start = time.perf_counter()
+    grid = GridSearchCV(
+        estimator=estimators,
+        param_grid=[
+            {"clf__estimator": [classificator]} for classificator in classifiers
+        ],
+        cv=cv,
+    )
+    grid.fit(data, labels)
+    results.append(
+        {
+            "Search": "GridSearchCV, 1 core",
+            "Best": grid.best_params_["clf__estimator"],
+            "Accuracy": grid.best_score_,
+            "Time (s)": time.perf_counter() - start,
+        }
+    )
+
+    for name, time_budget in [
+        ("Successive halving, all cores", None),
+        ("Successive halving, all cores, 2 s budget", 2.0),
+    ]:
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            best_estimator, acc = successive_halving_search(
+                data, labels, estimators, classifiers, cv, time_budget=time_budget
+            )
+        results.append(
+            {
+                "Search": name,
+                "Best": best_estimator.named_steps["clf"].estimator,
+                "Accuracy": acc,
+                "Time (s)": time.perf_counter() - start,
+            }
+        )
+
+    print(pd.DataFrame(results).to_string(index=False))
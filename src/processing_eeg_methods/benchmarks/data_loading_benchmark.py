@@ -0,0 +1,61 @@
+import os
+import time
+import tracemalloc
+
+import pandas as pd
+from data_loaders import load_data_labels_based_on_dataset
+from data_utils import get_input_data_path
+from share import datasets_basic_infos
+
+
+def measure_load(dataset_info: dict, subject_id: int, data_path: str, build_epochs):
+    tracemalloc.start()
+    start = time.perf_counter()
+    epochs, data, labels = load_data_labels_based_on_dataset(
+        dataset_info, subject_id, data_path
+    )
+    if build_epochs:
+        epochs.to_epochs()
+    timing = time.perf_counter() - start
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return timing, peak_memory / 1e6
+
+
+if __name__ == "__main__":
+    # Compares the arrays-only load with the load that also creates the mne.EpochsArray.
+    # The first load of each subject creates its epoch store, so it is done before measuring.
+    subject_id = 1
+    repetitions = 5
+
+    results = []
+    for dataset_name, dataset_info in datasets_basic_infos.items():
+        data_path = get_input_data_path(dataset_name)
+        if not os.path.exists(data_path):
+            print(f"Skipping {dataset_name}, {data_path} doesn't exist.")
+            continue
+        try:
+            load_data_labels_based_on_dataset(dataset_info, subject_id, data_path)
+        except Exception as error:
+            print(f"Skipping {dataset_name}, it couldn't be loaded: {error}")
+            continue
+
+        for build_epochs in [True, False]:
+            timings = []
+            peak_memories = []
+            for _ in range(repetitions):
+                timing, peak_memory = measure_load(
+                    dataset_info, subject_id, data_path, build_epochs
+                )
+                timings.append(timing)
+                peak_memories.append(peak_memory)
+            results.append(
+                {
+                    "Dataset": dataset_name,
+                    "EpochsArray": build_epochs,
+                    "Load Time (s)": min(timings),
+                    "Peak Memory (MB)": max(peak_memories),
+                }
+            )
+
+    print(pd.DataFrame(results).to_string(index=False))
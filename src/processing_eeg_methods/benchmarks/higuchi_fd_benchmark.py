@@ -0,0 +1,34 @@
+import timeit
+
+import antropy as ant
+import features_extraction.EEGExtract as eeg
+import numpy as np
+import pandas as pd
+
+if __name__ == "__main__":
+    # Pseudo-trials of one fold: trials x channels rows, for the complete signal and each of the 7 bands
+    n_samples = 350
+    repetitions = 5
+
+    results = []
+    for n_signals in [8, 120 * 8, 120 * 24]:
+        data = np.random.default_rng(42).normal(size=(n_signals, n_samples))
+        loop_time = min(
+            timeit.repeat(
+                lambda: [ant.higuchi_fd(data_trial) for data_trial in data],
+                number=1,
+                repeat=repetitions,
+            )
+        )
+        batched_time = min(
+            timeit.repeat(lambda: eeg.higuchiFD(data), number=1, repeat=repetitions)
+        )
+        results.append(
+            {
+                "Signals": n_signals,
+                "antropy loop (ms)": loop_time * 1e3,
+                "higuchiFD (ms)": batched_time * 1e3,
+                "Speed-up": loop_time / batched_time,
+            }
+        )
+    print(pd.DataFrame(results).to_string(index=False))
@@ -0,0 +1,73 @@
+import contextlib
+import io
+import timeit
+
+import numpy as np
+import pandas as pd
+from data_utils import data_normalization
+from multiple_transforms_with_models.transforms_selectKBest_probs import (
+    feature_nodes,
+    selected_transformers_test,
+    selected_transformers_train,
+    transform_data,
+)
+
+if __name__ == "__main__":
+    # Per-trial latency of the real-time path of selected_transformers_function.test (same calls, without importing
+    # classifiers_classes and the deep learning methods), on braincommand-like trials: 8 channels, 1.4 s at 250 Hz.
+    dataset_info = {"sample_rate": 250}
+    repetitions = 3
+    n_test_trials = 20
+
+    rng = np.random.default_rng(42)
+    labels = np.repeat(np.arange(4), 30)
+    data = rng.normal(size=(len(labels), 8, 350))
+    test_data = rng.normal(size=(n_test_trials, 8, 350))
+
+    # transform_data prints every transform
+    with contextlib.redirect_stdout(io.StringIO()):
+        features_train, transform_methods = transform_data(
+            data, dataset_info=dataset_info, labels=labels
+        )
+        clf, _, columns_list = selected_transformers_train(features_train, labels)
+
+        selected_nodes = feature_nodes(columns_list)
+
+        def test(trial, nodes):
+            features_test, _ = transform_data(
+                trial[np.newaxis],
+                dataset_info=dataset_info,
+                transform_methods=transform_methods,
+                nodes=nodes,
+            )
+            return data_normalization(
+                selected_transformers_test(clf, features_test.select(columns_list))
+            )
+
+        results = []
+        for name, nodes in [
+            ("All the (band, transform) nodes", None),
+            ("Nodes of columns_list", selected_nodes),
+        ]:
+            test_time = min(
+                timeit.repeat(
+                    lambda: [test(trial, nodes) for trial in test_data],
+                    number=1,
+                    repeat=repetitions,
+                )
+            )
+            results.append(
+                {
+                    "Test path": name,
+                    "Nodes": len(transform_methods) if nodes is None else len(nodes),
+                    "Bands": (
+                        len({band for band, _ in transform_methods})
+                        if nodes is None
+                        else len({band for band, _ in nodes})
+                    ),
+                    "Per trial (ms)": test_time / n_test_trials * 1e3,
+                }
+            )
+
+    print(f"{features_train.shape[1]} columns, {len(columns_list)} selected")
+    print(pd.DataFrame(results).to_string(index=False))
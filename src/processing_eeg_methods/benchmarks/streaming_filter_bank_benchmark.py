@@ -0,0 +1,76 @@
+import time
+
+import numpy as np
+import pandas as pd
+from data_loaders import load_data_labels_based_on_dataset
+from data_utils import get_dataset_basic_info, get_input_data_path
+from features_extraction.get_features_probs import get_frequency_ranges
+from filter_bank import StreamingFilterBank, get_filter_bank
+from share import datasets_basic_infos
+
+
+def compare_streaming_with_offline(data, dataset_info: dict, chunk_size: int):
+    """
+    The trials are streamed one after the other as in a live session, in chunks of chunk_size samples. At the end
+    of every trial the streamed window is compared with the zero-phase filtering of the isolated trial.
+    """
+    frequency_ranges = get_frequency_ranges(dataset_info["sample_rate"])
+    n_samples = data.shape[-1]
+
+    start = time.perf_counter()
+    offline = get_filter_bank(dataset_info["sample_rate"], frequency_ranges).apply(data)
+    offline_time = (time.perf_counter() - start) / len(data)
+
+    streaming = StreamingFilterBank(
+        dataset_info["sample_rate"], frequency_ranges, data.shape[1], n_samples
+    )
+    streamed = np.empty_like(offline)
+    chunk_times = []
+    for i_trial, trial in enumerate(data):
+        for chunk_start in range(0, n_samples, chunk_size):
+            start = time.perf_counter()
+            streaming.push(trial[:, chunk_start : chunk_start + chunk_size])
+            chunk_times.append(time.perf_counter() - start)
+        streamed[:, i_trial] = streaming.get_window()[0]
+
+    results = []
+    for i_band, band_name in enumerate(frequency_ranges):
+        band_offline = offline[i_band].reshape(-1, n_samples)
+        band_streamed = streamed[i_band].reshape(-1, n_samples)
+        correlation = [
+            np.corrcoef(offline_row, streamed_row)[0, 1]
+            for offline_row, streamed_row in zip(band_offline, band_streamed)
+        ]
+        relative_error = np.linalg.norm(
+            band_offline - band_streamed, axis=-1
+        ) / np.linalg.norm(band_offline, axis=-1)
+        results.append(
+            {
+                "Band": band_name,
+                "Correlation": np.nanmean(correlation),
+                "Relative Error": np.nanmean(relative_error),
+            }
+        )
+    print(
+        f"Offline filtering per trial: {offline_time * 1e3:.3f} ms, "
+        f"streaming per chunk of {chunk_size} samples: {np.mean(chunk_times) * 1e3:.3f} ms"
+    )
+    return pd.DataFrame(results)
+
+
+if __name__ == "__main__":
+    # The causal filters have group delay and no backward pass, so they don't match the zero-phase ones exactly.
+    # This shows how far the features of the live sessions are from the ones used in training.
+    dataset_name = "braincommand"
+    subject_id = 1
+    chunk_size = 25  # 0.1 s at 250 Hz
+
+    dataset_info = get_dataset_basic_info(datasets_basic_infos, dataset_name)
+    _, data, _ = load_data_labels_based_on_dataset(
+        dataset_info, subject_id, get_input_data_path(dataset_name)
+    )
+    print(
+        compare_streaming_with_offline(data, dataset_info, chunk_size).to_string(
+            index=False
+        )
+    )
@@ -1,4 +1,5 @@
 import copy
+import os
 from dataclasses import dataclass, field
 from typing import Any, List, Optional
 
@@ -6,23 +7,21 @@ import joblib
 import numpy as np
 from BigProject.GRU_probs import GRU_test, GRU_train
 from BigProject.LSTM_probs import LSTM_test, LSTM_train
-from data_utils import (
-    convert_into_binary,
-    convert_into_independent_channels,
-    data_normalization,
-)
+from data_utils import convert_into_binary, data_normalization
 from DiffE.diffE_probs import diffE_test
 from DiffE.diffE_training import diffE_train
 from features_extraction.get_features_probs import (
-    by_frequency_band,
     extractions_test,
     extractions_train,
+    trial_features_cache,
+    trials_by_frequency_band,
 )
 from multiple_transforms_with_models.customized_probs import (
     customized_test,
     customized_train,
 )
 from multiple_transforms_with_models.transforms_selectKBest_probs import (
+    feature_nodes,
     selected_transformers_test,
     selected_transformers_train,
     transform_data,
@@ -31,6 +30,7 @@ from NeuroTechX_dl_eeg.ShallowFBCSPNet_probs import (
     ShallowFBCSPNet_test,
     ShallowFBCSPNet_train,
 )
+from online_recentering import OnlineRecentering
 
 
 class ProcessingMethod:
@@ -50,6 +50,12 @@ class ProcessingMethod:
         """
         raise Exception("Not implemented yet.")
 
+    def adapt(self, **kwargs):
+        """
+        Online mode, updates the trained method with new trials (labeled or not) without retraining.
+        """
+        raise Exception("Not implemented yet.")
+
     def save(self, path):
         for name, attribute in self.__dict__.items():
             name = ".".join((name, "joblib"))
@@ -63,6 +69,8 @@ class ProcessingMethod:
         for name in cls.__annotations__:
             file_name = ".".join((name, "joblib"))
             print("/".join((path, file_name)))
+            if not os.path.exists("/".join((path, file_name))):
+                continue  # Saved before the attribute existed, it keeps its default
             with open("/".join((path, file_name)), "rb") as f:
                 my_model[name] = joblib.load(f)
         return cls(**my_model)
@@ -73,48 +81,106 @@ class selected_transformers_function(ProcessingMethod):
     clf: Optional[Any] = None
     columns_list: List[str] = field(default_factory=list)
     transform_methods: dict = field(default_factory=dict)
-
-    def train(self, data, labels, dataset_info: dict, **kwargs):
-        features_train_df, self.transform_methods = transform_data(
+    recentering: Optional[OnlineRecentering] = None
+
+    def train(
+        self,
+        data,
+        labels,
+        dataset_info: dict,
+        search: str = "grid",
+        time_budget: Optional[float] = None,
+        **kwargs,
+    ):
+        features_train, self.transform_methods = transform_data(
             data, dataset_info=dataset_info, labels=labels
         )
+        self.recentering = OnlineRecentering(n_seen=len(data))
         (
             self.clf,
             accuracy,
             self.columns_list,
-        ) = selected_transformers_train(features_train_df, labels)
+        ) = selected_transformers_train(
+            features_train, labels, search=search, time_budget=time_budget
+        )
         return accuracy
 
-    def test(self, data, dataset_info: dict, **kwargs):
-        transforms_test_df, _ = transform_data(
+    def test(self, data, dataset_info: dict, online: bool = False, **kwargs):
+        """
+        online: the tangent space references are recentered with data before projecting it, see adapt.
+        """
+        transforms_test, _ = transform_data(
             data,
             dataset_info=dataset_info,
             labels=None,
             transform_methods=self.transform_methods,
+            nodes=feature_nodes(self.columns_list),
+            recentering=self.recentering if online else None,
         )
         return data_normalization(
             selected_transformers_test(
                 self.clf,
-                transforms_test_df[self.columns_list],
+                transforms_test.select(self.columns_list),
             )
         )
 
+    def adapt(self, data, dataset_info: dict, **kwargs):
+        """
+        Moves the tangent space references of the selected nodes towards the covariances of data (geodesic running
+        mean, see OnlineRecentering), the labels are not needed.
+        """
+        if self.recentering is None:
+            self.recentering = OnlineRecentering(n_seen=len(data))
+        transform_data(
+            data,
+            dataset_info=dataset_info,
+            labels=None,
+            transform_methods=self.transform_methods,
+            nodes=feature_nodes(self.columns_list),
+            recentering=self.recentering,
+        )
+
 
 @dataclass
 class customized_function(ProcessingMethod):
     clf: Optional[Any] = None
-
-    def train(self, data, labels, **kwargs):
+    recentering: Optional[OnlineRecentering] = None
+
+    def train(
+        self,
+        data,
+        labels,
+        search: str = "grid",
+        time_budget: Optional[float] = None,
+        **kwargs,
+    ):
         (
             self.clf,
             accuracy,
             processing_name,
-        ) = customized_train(copy.deepcopy(data), labels)
+        ) = customized_train(
+            copy.deepcopy(data), labels, search=search, time_budget=time_budget
+        )
+        self.recentering = OnlineRecentering(n_seen=len(data))
         return accuracy
 
-    def test(self, data, **kwargs):
+    def test(self, data, online: bool = False, **kwargs):
+        """
+        online: the tangent space reference is recentered with data before projecting it, see adapt.
+        """
+        if online:
+            self.adapt(data)
         return data_normalization(customized_test(self.clf, data))
 
+    def adapt(self, data, **kwargs):
+        """
+        Moves the tangent space reference of clf towards the covariances of data (geodesic running mean, see
+        OnlineRecentering), the labels are not needed.
+        """
+        if self.recentering is None:
+            self.recentering = OnlineRecentering(n_seen=len(data))
+        self.recentering.update(self.clf, data)
+
 
 @dataclass
 class ShallowFBCSPNet_function(ProcessingMethod):
@@ -200,18 +266,28 @@ class diffE_function(ProcessingMethod):
 class feature_extraction_function(ProcessingMethod):
     clf: Optional[Any] = None
 
-    def train(self, data, labels, dataset_info: dict, subject_id: int, **kwargs):
-        data_simplified, labels_simplified = convert_into_independent_channels(
-            data, labels
-        )
-        features_df = by_frequency_band(data_simplified, dataset_info)
+    def train(
+        self,
+        data,
+        labels,
+        dataset_info: dict,
+        subject_id: int,
+        search: str = "grid",
+        time_budget: Optional[float] = None,
+        **kwargs,
+    ):
+        # The trials of previous folds are not computed again
+        features_df = trial_features_cache.by_frequency_band(data, dataset_info)
+        labels_simplified = np.repeat(labels, data.shape[1], axis=0)
         (
             self.clf,
             accuracy,
-        ) = extractions_train(features_df, labels_simplified)
+        ) = extractions_train(
+            features_df, labels_simplified, search=search, time_budget=time_budget
+        )
         return accuracy
 
     def test(self, data, dataset_info: dict, subject_id: int, **kwargs):
-        data_array_simplified, _ = convert_into_independent_channels(data, [1])
-        features_df = by_frequency_band(data_array_simplified, dataset_info)
+        # Not cached, the real-time trials are never seen again
+        features_df = trials_by_frequency_band(data, dataset_info)
         return data_normalization(extractions_test(self.clf, features_df))
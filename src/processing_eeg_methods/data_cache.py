@@ -0,0 +1,293 @@
+import contextlib
+import copy
+import functools
+import hashlib
+import json
+import os
+import tempfile
+import uuid
+import weakref
+from collections import OrderedDict
+from typing import Optional
+
+import joblib
+import numpy as np
+
+CACHE_VERSION: int = 1
+
+
+def file_hash(filepath: str, chunk_size: int = 1 << 20) -> str:
+    sha1 = hashlib.sha1()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def array_fingerprint(array) -> str:
+    """
+    Hash of the content, shape and dtype of an array, used to key in-memory caches of data that has no file.
+    """
+    array = np.ascontiguousarray(array)
+    sha1 = hashlib.sha1(f"{array.shape}{array.dtype.str}".encode())
+    sha1.update(array.data)
+    return sha1.hexdigest()
+
+
+def file_fingerprint(filepath: str) -> dict:
+    stat = os.stat(filepath)
+    return {
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "sha1": file_hash(filepath),
+    }
+
+
+def is_fingerprint_valid(filepath: str, fingerprint: dict) -> bool:
+    """
+    Checks if the file still matches the fingerprint saved with the cache.
+
+    The mtime and size are enough when they match. If the mtime changed (the file was copied or touched) the content
+    hash decides, so the cache is only invalidated when the content is really different.
+    """
+    if not os.path.exists(filepath):
+        return False
+    stat = os.stat(filepath)
+    if stat.st_size != fingerprint["size"]:
+        return False
+    if stat.st_mtime_ns == fingerprint["mtime_ns"]:
+        return True
+    return file_hash(filepath) == fingerprint["sha1"]
+
+
+@contextlib.contextmanager
+def _temporary_file(path: str, mode: str):
+    """
+    Opens a uniquely named temporary file next to path, and moves it to path once it's written. Several processes can
+    write the same cache at the same time (ex. load_subjects workers), the last complete file wins.
+    """
+    fd, temp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path) or ".",
+        prefix=f"{os.path.basename(path)}.",
+        suffix=".tmp",
+    )
+    try:
+        with os.fdopen(fd, mode) as f:
+            yield f
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def cache_paths(cache_prefix: str, array_names: list[str]) -> tuple[str, dict]:
+    info_path = f"{cache_prefix}.cache.json"
+    array_paths = {name: f"{cache_prefix}.{name}.npy" for name in array_names}
+    return info_path, array_paths
+
+
+def save_arrays_cache(
+    cache_prefix: str, arrays: dict, source_paths: list[str], info: dict = {}
+):
+    """
+    Saves the arrays as .npy files next to the source and writes the .cache.json with the fingerprints of the sources.
+
+    Parameters
+    ----------
+    cache_prefix: path without extension, ex. the CSV path without '.csv'
+    arrays: name -> np.ndarray, each one is saved as '{cache_prefix}.{name}.npy'
+    source_paths: files the arrays were created from, if any of them changes the cache is invalid
+    info: extra json-serializable information to keep with the arrays (event_dict, channels, ...)
+    """
+    info_path, array_paths = cache_paths(cache_prefix, list(arrays.keys()))
+    for name, array in arrays.items():
+        with _temporary_file(array_paths[name], "wb") as f:
+            np.save(f, np.ascontiguousarray(array))
+
+    cache_info = {
+        "version": CACHE_VERSION,
+        "arrays": list(arrays.keys()),
+        "sources": {
+            os.path.abspath(path): file_fingerprint(path) for path in source_paths
+        },
+        "info": info,
+    }
+    # The json is written last, so a half-written cache is never valid
+    with _temporary_file(info_path, "w") as f:
+        json.dump(cache_info, f)
+
+
+def load_arrays_cache(cache_prefix: str, mmap_mode: str = "c"):
+    """
+    Opens the cached arrays with np.load(mmap_mode=...) if the cache exists and its sources did not change.
+
+    The default mmap_mode "c" is copy-on-write, so the arrays can be modified in place (ex. threshold_for_bug)
+    without touching the file.
+
+    Returns
+    -------
+    (arrays, info) or None if the cache is missing or outdated.
+    """
+    info_path = f"{cache_prefix}.cache.json"
+    if not os.path.exists(info_path):
+        return None
+    with open(info_path) as f:
+        cache_info = json.load(f)
+    if cache_info.get("version") != CACHE_VERSION:
+        return None
+    for source_path, fingerprint in cache_info["sources"].items():
+        if not is_fingerprint_valid(source_path, fingerprint):
+            return None
+        mtime_ns = os.stat(source_path).st_mtime_ns
+        if mtime_ns != fingerprint["mtime_ns"]:
+            # Same content with a new mtime, keep it so the next load doesn't hash again
+            fingerprint["mtime_ns"] = mtime_ns
+            with _temporary_file(info_path, "w") as f:
+                json.dump(cache_info, f)
+
+    _, array_paths = cache_paths(cache_prefix, cache_info["arrays"])
+    if not all(os.path.exists(path) for path in array_paths.values()):
+        return None
+    arrays = {
+        name: np.load(path, mmap_mode=mmap_mode) for name, path in array_paths.items()
+    }
+    return arrays, cache_info["info"]
+
+
+def _value_fingerprint(value) -> str:
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return repr(value)
+    if isinstance(value, np.ndarray):
+        return array_fingerprint(value)
+    if isinstance(value, dict):
+        items = sorted(value.items(), key=lambda item: str(item[0]))
+        return repr([(str(key), _value_fingerprint(item)) for key, item in items])
+    if isinstance(value, (list, tuple)):
+        return repr([_value_fingerprint(item) for item in value])
+    if hasattr(value, "get_params") and not isinstance(value, type):
+        # Estimators: class and parameters, the fitted attributes are not part of the key
+        return repr(
+            (
+                type(value).__module__,
+                type(value).__qualname__,
+                _value_fingerprint(value.get_params(deep=False)),
+            )
+        )
+    return joblib.hash(value)
+
+
+# cache_id -> TransformerCache alive in this process, a cache (and what it holds) is freed with its last pipeline
+_transformer_caches: weakref.WeakValueDictionary = weakref.WeakValueDictionary()
+
+
+def _registered_transformer_cache(
+    cache_id: str, max_entries: int, spill_location: Optional[str]
+):
+    cache = _transformer_caches.get(cache_id)
+    if cache is None:
+        cache = TransformerCache(max_entries, spill_location, cache_id)
+    return cache
+
+
+class TransformerCache:
+    """
+    Memoizes the fitted transformer steps of sklearn Pipelines, given as Pipeline(..., memory=cache).
+
+    Pipeline calls cache(fit_transform_one) for each step except the last one, so the steps fitted by the candidates
+    and folds of a grid search are fitted once per fold: the key is the step class and parameters plus the
+    array_fingerprint of its input data (the fold), labels and fit parameters. Only the last step (ClfSwitcher) is
+    fitted for every candidate.
+
+    The results are kept in memory, in least recently used order. When there are more than max_entries, the oldest
+    is dropped, or written to spill_location (a directory) if given, and loaded back from there when it's needed
+    again.
+
+    Unlike joblib.Memory, clone(pipeline) keeps the same cache, and so does pickling it to the joblib workers
+    (one cache per process while its pipelines are alive, sharing the spill_location).
+
+    Parameters
+    ----------
+    max_entries: fitted steps kept in memory.
+    spill_location: directory for the entries evicted from memory, None to drop them.
+    cache_id: name shared by the copies of the cache in the worker processes.
+    """
+
+    # Pipeline's logging arguments, they don't change the result
+    _ignored_arguments = ("message_clsname", "message")
+
+    def __init__(
+        self,
+        max_entries: int = 64,
+        spill_location: Optional[str] = None,
+        cache_id: Optional[str] = None,
+    ):
+        self.max_entries = max_entries
+        self.spill_location = spill_location
+        self.cache_id = cache_id or uuid.uuid4().hex
+        self.entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        _transformer_caches.setdefault(self.cache_id, self)
+
+    def __deepcopy__(self, memo):
+        return self  # clone(pipeline) deep copies the memory parameter
+
+    def __reduce__(self):
+        return (
+            _registered_transformer_cache,
+            (self.cache_id, self.max_entries, self.spill_location),
+        )
+
+    def _spill_path(self, key: str) -> str:
+        return os.path.join(self.spill_location, f"{key}.joblib")
+
+    def _store(self, key: str, result):
+        self.entries[key] = result
+        while len(self.entries) > self.max_entries:
+            evicted_key, evicted = self.entries.popitem(last=False)
+            if self.spill_location is not None:
+                os.makedirs(self.spill_location, exist_ok=True)
+                with _temporary_file(self._spill_path(evicted_key), "wb") as f:
+                    joblib.dump(evicted, f)
+
+    def _load(self, key: str):
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        if self.spill_location is not None and os.path.exists(self._spill_path(key)):
+            result = joblib.load(self._spill_path(key))
+            self._store(key, result)
+            return result
+        return None
+
+    def cache(self, func, ignore: Optional[list] = None):
+        """
+        Same interface as joblib.Memory.cache, used by Pipeline.
+        """
+        ignored = set(self._ignored_arguments) | set(ignore or [])
+
+        @functools.wraps(func)
+        def cached_func(*args, **kwargs):
+            key_arguments = {
+                name: value for name, value in kwargs.items() if name not in ignored
+            }
+            sha1 = hashlib.sha1(f"{func.__module__}.{func.__qualname__}".encode())
+            sha1.update(_value_fingerprint([list(args), key_arguments]).encode())
+            key = sha1.hexdigest()
+
+            result = self._load(key)
+            if result is None:
+                self.misses += 1
+                result = func(*args, **kwargs)
+                self._store(key, result)
+            else:
+                self.hits += 1
+            # (Xt, fitted transformer): the transformer is copied, the pipelines can modify it afterwards (e.g. the
+            # reference of TangentSpace with OnlineRecentering)
+            return copy.deepcopy(result)
+
+        return cached_func
+
+    def clear(self):
+        self.entries.clear()
@@ -1,6 +1,6 @@
 import numpy as np
 from data_dataclass import ProcessingMethods, complete_experiment, probability_input
-from data_loaders import load_data_labels_based_on_dataset
+from data_loaders import load_subjects
 from data_utils import (
     convert_into_independent_channels,
     get_dataset_basic_info,
@@ -21,20 +21,18 @@ def pseudo_trial_exhaustive_training_and_testing(
     save_original_channels = dataset_info["#_channels"]
     save_original_trials = dataset_info["total_trials"]
 
-    for subject_id in range(29, 30):
+    for subject_id, data, labels in load_subjects(
+        dataset_info,
+        range(29, 30),
+        data_path,
+        selected_classes=selected_classes,
+        threshold_for_bug=0.00000001,  # could be any value, ex numpy.min
+    ):  # The next subjects are loaded while this one is trained
         print(subject_id)
 
         dataset_info["#_channels"] = save_original_channels
         dataset_info["total_trials"] = save_original_trials
 
-        epochs, data, labels = load_data_labels_based_on_dataset(
-            dataset_info,
-            subject_id,
-            data_path,
-            selected_classes=selected_classes,
-            threshold_for_bug=0.00000001,
-        )  # could be any value, ex numpy.min
-
         # Only if using independent channels:
         dataset_info["total_trials"] = save_original_trials * save_original_channels
         dataset_info["#_channels"] = 1
@@ -46,7 +44,7 @@ def pseudo_trial_exhaustive_training_and_testing(
         count_Kfolds: int = 0
         index_count: int = 0
         trial_index_count: int = 0
-        for train, test in cv.split(epochs, labels):
+        for train, test in cv.split(data, labels):
             print(
                 "******************************** Training ********************************"
             )
@@ -111,22 +109,20 @@ def trial_exhaustive_training_and_testing(
     data_path: str,
     selected_classes: list[int],
 ):
-    for subject_id in range(29, 30):
+    for subject_id, data, labels in load_subjects(
+        dataset_info,
+        range(29, 30),
+        data_path,
+        selected_classes=selected_classes,
+        threshold_for_bug=0.00000001,
+    ):  # The next subjects are loaded while this one is trained
         print(subject_id)
 
-        epochs, data, labels = load_data_labels_based_on_dataset(
-            dataset_info,
-            subject_id,
-            data_path,
-            selected_classes=selected_classes,
-            threshold_for_bug=0.00000001,
-        )
-
         cv = StratifiedKFold(n_splits=10, shuffle=True, random_state=42)
 
         count_Kfolds: int = 0
         trial_index_count: int = 0
-        for train, test in cv.split(epochs, labels):
+        for train, test in cv.split(data, labels):
             print(
                 "******************************** Training ********************************"
             )
@@ -156,7 +156,11 @@ class ProcessingMethods:
                 activated_methods.append(method_name)
         return activated_methods
 
-    def train(self, subject_id: int, data, labels, dataset_info: dict):
+    def train(self, subject_id: int, data, labels, dataset_info: dict, **kwargs):
+        """
+        kwargs: given to the train of every method, e.g. search="halving" and time_budget (seconds) for the
+        classifier search of the scikit-learn based ones.
+        """
 
         for method_name in vars(self):
             method = getattr(self, method_name)
@@ -168,11 +172,15 @@ class ProcessingMethods:
                     data=data,
                     labels=labels,
                     dataset_info=dataset_info,
+                    **kwargs,
                 )  # todo: Training accuracies are not reliable (its in reality a mini-testing inside the training), therefore it would be better to stop getting them and focus all the samples into pure training
                 method.training.timing = time.time() - start_time
 
-    def test(self, subject_id: int, data, dataset_info: dict):
+    def test(self, subject_id: int, data, dataset_info: dict, **kwargs):
         """
+        kwargs: given to the test of every method, e.g. online=True to recenter the tangent spaces of the methods
+        that support it with the trial before classifying it (see adapt).
+
         Returns
         -------
         Final list of probabilities, where each number represents each class.
@@ -185,10 +193,31 @@ class ProcessingMethods:
                 print(f"Testing {method_name}...")
                 start_time = time.time()
                 method.testing.probabilities = method.function.test(
-                    subject_id=subject_id, data=data, dataset_info=dataset_info
+                    subject_id=subject_id,
+                    data=data,
+                    dataset_info=dataset_info,
+                    **kwargs,
                 )
                 method.testing.timing = time.time() - start_time
 
+    def adapt(self, subject_id: int, data, dataset_info: dict, **kwargs):
+        """
+        Updates the activated methods that support it with new trials of the session (labeled or not) without
+        retraining them, e.g. the tangent space recentering of selected_transformers and customized.
+        """
+        for method_name in vars(self):
+            method = getattr(self, method_name)
+            if method.activation and (
+                type(method.function).adapt is not ProcessingMethod.adapt
+            ):
+                print(f"Adapting {method_name}...")
+                method.function.adapt(
+                    subject_id=subject_id,
+                    data=data,
+                    dataset_info=dataset_info,
+                    **kwargs,
+                )
+
     def voting_decision(
         self,  # Ensemble in real time
         voting_by_mode: bool = False,
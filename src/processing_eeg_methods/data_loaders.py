@@ -1,8 +1,14 @@
 import os
+import weakref
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+from typing import Optional
 
 import mne
 import numpy as np
 import pandas as pd
+from data_cache import load_arrays_cache, save_arrays_cache
 from data_utils import (
     class_selection,
     convert_into_independent_channels,
@@ -17,7 +23,7 @@ from data_utils import (
 #     Select_time_window,
 #     Transform_for_classificator,
 # )
-from mne import Epochs, EpochsArray, events_from_annotations, io
+from mne import EpochsArray, events_from_annotations, io
 from scipy import signal
 from scipy.io import loadmat
 from share import ROOT_VOTING_SYSTEM_PATH, datasets_basic_infos
@@ -26,12 +32,30 @@ from share import ROOT_VOTING_SYSTEM_PATH, datasets_basic_infos
 # from autoreject import AutoReject
 
 
+def read_epochs_windows(raw, events, tmin: float, tmax: float):
+    """
+    Reads only the [tmin, tmax] window after each event from a raw that is not preloaded, straight into a
+    preallocated (epochs, channels, samples) array. Same samples as mne.Epochs(raw, events, tmin=tmin, tmax=tmax):
+    the windows that don't fit in the recording are dropped, in_bounds tells which events were kept.
+    """
+    sfreq = raw.info["sfreq"]
+    start_offset = int(round(tmin * sfreq))
+    number_of_samples = int(round(tmax * sfreq)) - start_offset + 1
+    starts = events[:, 0] - raw.first_samp + start_offset
+    in_bounds = (starts >= 0) & (starts + number_of_samples <= raw.n_times)
+
+    data = np.empty((np.sum(in_bounds), len(raw.ch_names), number_of_samples))
+    for i_epoch, start in enumerate(starts[in_bounds]):
+        data[i_epoch] = raw.get_data(start=start, stop=start + number_of_samples)
+    return data, in_bounds
+
+
 def aguilera_dataset_loader(data_path: str, gamified: bool):  # typed
     # '1':'FP1', '2':'FP2', '3':'F3', '4':'F4', '5':'C3', '6':'C4', '7':'P3', '8':'P4', '9':'O1', '10':'O2', '11':'F7', '12':'F8', '13':'T7', '14':'T8', '15':'P7', '16':'P8', '17':'Fz', '18':'Cz', '19':'Pz', '20':'M1', '21':'M2', '22':'AFz', '23':'CPz', '24':'POz'
     # include=['Channel 3', 'Channel 4', 'Channel 5', 'Channel 6', 'Channel 7', 'Channel 8', 'Channel 11', 'Channel 12', 'Channel 13', 'Channel 14', 'Channel 15', 'Channel 16', 'Channel 17', 'Channel 18', 'Channel 19', 'Channel 23'] #this is the left and important middle
     raw = io.read_raw_edf(
-        data_path, preload=True, verbose=40, exclude=["Gyro 1", "Gyro 2", "Gyro 3"]
-    )
+        data_path, preload=False, verbose=40, exclude=["Gyro 1", "Gyro 2", "Gyro 3"]
+    )  # Only the header and annotations, the samples are read by read_epochs_windows
     if gamified:
         try:
             raw.rename_channels({"Fp1": "FP1", "Fp2": "FP2"})
@@ -111,17 +135,17 @@ def aguilera_dataset_loader(data_path: str, gamified: bool):  # typed
         events = events[3:]  # From the one that is not a command
 
     # Read epochs
-    epochs = Epochs(
-        raw, events, event_id, preload=True, tmin=0, tmax=1.4, baseline=(None, None)
-    )  # , detrend=1)#, decim=2) # Decim is for lowering the sample rate
+    events = events[np.isin(events[:, 2], list(event_id.values()))]
+    data, in_bounds = read_epochs_windows(raw, events, tmin=0, tmax=1.4)
+    data -= np.mean(data, axis=2, keepdims=True)  # baseline=(None, None)
     # epochs = ar.fit_transform(epochs)
     # epochs.average().plot()
-    label = epochs.events[:, -1]
+    label = events[in_bounds, -1]
     if extra_label:
         label = label - 1
     label = label - 1  # So it goes from 0 to 3
     event_dict = {"Avanzar": 0, "Retroceder": 1, "Derecha": 2, "Izquierda": 3}
-    return epochs, label, event_dict
+    return data, label, event_dict
 
 
 # def nieto_dataset_loader(root_dir: str, N_S: int):
@@ -157,37 +181,79 @@ def aguilera_dataset_loader(data_path: str, gamified: bool):  # typed
 #     return X, Y, event_dict
 
 
-def torres_dataset_loader(
-    filepath: str, subject_id: int
-):  # TODO: Flag or something to return all subjects
+TORRES_WORDS: int = 5
+# One subject has an extra epoch, the option was leaving one empty epoch to everyone or removing it.
+# I chose removing, that's why we don't capture it.
+TORRES_EPOCHS: int = 33
+# channel 0:13 because 14, 15, 16 are gyros and marker of start and end.
+TORRES_CHANNELS: int = 14
+
+
+def torres_subject_cache_prefix(filepath: str, subject_id: int) -> str:
+    return os.path.join(
+        os.path.dirname(filepath), "torres_subjects", f"S{subject_id:02d}"
+    )
+
+
+def split_torres_dataset_by_subject(filepath: str):
+    """
+    Parses the complete .mat once and saves each subject on its own, next to the .mat in torres_subjects/.
+
+    Each subject keeps the EEG channels of its epochs concatenated in a float32 (total samples, channels) array
+    and an epoch length index (words, epochs) because the epochs are irregular.
+    """
     EEG_nested_dict = loadmat(filepath, simplify_cells=True)
-    EEG_array = np.zeros(
-        (27, 5, 33, 463, 17)
-    )  # Subject, Word, Trial, Samples, Channels
+    os.makedirs(
+        os.path.join(os.path.dirname(filepath), "torres_subjects"), exist_ok=True
+    )
 
     for i_subject, subject in enumerate(EEG_nested_dict["S"]):
+        epoch_lengths = np.zeros((TORRES_WORDS, TORRES_EPOCHS), dtype=np.int32)
+        epochs_samples = []
         for i_word, word in enumerate(subject["Palabra"]):
-            for i_epoch, epoch in enumerate(word["Epoca"]):
-                if (
-                    i_epoch > 32
-                ):  # One subject has an extra epoch, the option was leaving one empty epoch to everyone or removing it.
-                    pass  # I chose removing, that's why we don't capture it.
-                else:
-                    EEG_array[
-                        i_subject, i_word, i_epoch, : epoch["SenalesEEG"].shape[0], :
-                    ] = epoch["SenalesEEG"]
-
-    # SELECT DATA
-    # word: 0 to 5. We extract all words, if you want to use less you can add that option as a list in "selected_classes"
-    # channel 0:13 because 14, 15, 16 are gyros and marker of start and end.
-    # EEG_array_selected_values is (word, trials, samples, channels)
-    EEG_array_selected_values = np.squeeze(EEG_array[subject_id - 1, 0:5, :, :, 0:14])
+            for i_epoch, epoch in enumerate(word["Epoca"][:TORRES_EPOCHS]):
+                epoch_lengths[i_word, i_epoch] = epoch["SenalesEEG"].shape[0]
+                epochs_samples.append(
+                    epoch["SenalesEEG"][:, :TORRES_CHANNELS].astype(np.float32)
+                )
+        save_arrays_cache(
+            torres_subject_cache_prefix(filepath, i_subject + 1),
+            {
+                "samples": np.concatenate(epochs_samples, axis=0),
+                "epoch_lengths": epoch_lengths,
+            },
+            source_paths=[filepath],
+        )
 
-    # reshape x in 3d data(Trials, Channels, Samples) and y in 1d data(Trials)
-    x = np.transpose(EEG_array_selected_values, (0, 1, 3, 2))
-    x = x.reshape(5 * 33, 14, 463)
+
+def torres_dataset_loader(filepath: str, subject_id: int):
+    """
+    Only reads the bytes of the chosen subject. The first call splits the .mat by subject, see split_torres_dataset_by_subject.
+    """
+    cache_prefix = torres_subject_cache_prefix(filepath, subject_id)
+    cache = load_arrays_cache(cache_prefix, mmap_mode="r")
+    if cache is None:
+        split_torres_dataset_by_subject(filepath)
+        cache = load_arrays_cache(cache_prefix, mmap_mode="r")
+    arrays, _ = cache
+
+    # x in 3d data(Trials, Channels, Samples) and y in 1d data(Trials), the trials are ordered by word
+    x = np.zeros(
+        (
+            TORRES_WORDS * TORRES_EPOCHS,
+            TORRES_CHANNELS,
+            datasets_basic_infos["torres"]["samples"],
+        ),
+        dtype=np.float32,
+    )
+    epoch_ends = np.cumsum(arrays["epoch_lengths"].ravel())
+    epoch_starts = epoch_ends - arrays["epoch_lengths"].ravel()
+    for i_trial, (epoch_start, epoch_end) in enumerate(zip(epoch_starts, epoch_ends)):
+        x[i_trial, :, : epoch_end - epoch_start] = arrays["samples"][
+            epoch_start:epoch_end
+        ].T
     y = [0, 1, 2, 3, 4]
-    y = np.repeat(y, 33, axis=0)
+    y = np.repeat(y, TORRES_EPOCHS, axis=0)
 
     event_dict = {
         "Arriba": 0,
@@ -199,6 +265,15 @@ def torres_dataset_loader(
     return x, y, event_dict
 
 
+def torres_all_subjects_loader(filepath: str):
+    """
+    Yields (subject_id, x, y, event_dict) one subject at a time, only the current one is kept in memory.
+    """
+    for subject_id in range(1, datasets_basic_infos["torres"]["subjects"] + 1):
+        x, y, event_dict = torres_dataset_loader(filepath, subject_id)
+        yield subject_id, x, y, event_dict
+
+
 def coretto_dataset_loader(filepath: str):
     """
     Load data from all .mat files, combine them, eliminate EOG signals, shuffle and seperate
@@ -288,13 +363,42 @@ def nguyen_2019_dataset_loader(folderpath: str):
     return x, y, event_dict
 
 
+def parse_braincommand_trial(trial_string: str) -> np.ndarray:
+    """
+    Parses one "time" cell of the braincommand CSV without eval.
+
+    The cell is a stringified list of samples, each sample being the list of channel values:
+    "[[ch0, ch1, ...], [ch0, ch1, ...], ...]". Returns the (time, channels) array.
+    """
+    number_of_samples = trial_string.count("[") - 1
+    values = np.fromstring(
+        trial_string.replace("[", " ").replace("]", " "), dtype=np.float64, sep=","
+    )
+    return values.reshape(number_of_samples, -1)
+
+
 def braincommand_dataset_loader(
-    filepath: str, subject_id: int, game_mode: str = "calibration2"
+    filepath: str,
+    subject_id: int,
+    game_mode: str = "calibration2",
+    use_cache: bool = True,
 ):
-    complete_information = pd.read_csv(
-        f"{filepath}/eeg_data_{game_mode}_sub{subject_id:02d}.csv"
-    )
-    x_list = list(complete_information["time"].apply(eval))
+    """
+    The CSV is parsed only the first time, the result is saved next to it as
+    eeg_data_{game_mode}_sub{NN}.data.npy/.label.npy and memory-mapped in the next calls.
+    If the CSV changes (mtime and hash) the cache is created again.
+    """
+    csv_path = f"{filepath}/eeg_data_{game_mode}_sub{subject_id:02d}.csv"
+    cache_prefix = os.path.splitext(csv_path)[0]
+    event_dict = {"Derecha": 0, "Izquierda": 1, "Arriba": 2, "Abajo": 3}
+
+    if use_cache:
+        cache = load_arrays_cache(cache_prefix)
+        if cache is not None:
+            arrays, _ = cache
+            return arrays["data"], arrays["label"].tolist(), event_dict
+
+    complete_information = pd.read_csv(csv_path)
     label = list(
         complete_information["class"][1:]
     )  # I'm removing the first one because is not a real trial.
@@ -311,7 +415,12 @@ def braincommand_dataset_loader(
     label_3 = label.count(3)
     print(f"label 3 is {label_3}")
 
-    x_array = np.array(x_list[1:])  # trials, time, channels
+    x_array = np.array(
+        [
+            parse_braincommand_trial(trial_string)
+            for trial_string in complete_information["time"][1:]
+        ]
+    )  # trials, time, channels
     x_array = x_array[
         :, :, :-9
     ]  # The last channels are accelerometer (x3), gyroscope (x3), validity, battery and counter
@@ -320,67 +429,231 @@ def braincommand_dataset_loader(
     # x_array, label = convert_to_epochs(x_array, label)
     x_array = data_normalization(x_array)
 
-    event_dict = {"Derecha": 0, "Izquierda": 1, "Arriba": 2, "Abajo": 3}
+    if use_cache:
+        save_arrays_cache(
+            cache_prefix,
+            {"data": x_array, "label": np.asarray(label, dtype=np.int64)},
+            source_paths=[csv_path],
+            info={"event_dict": event_dict},
+        )
     return x_array, label, event_dict
 
 
-def load_data_labels_based_on_dataset(
-    dataset_info: dict,
-    subject_id: int,
-    data_path: str,
-    selected_classes: list[int] = [],
-    transpose: bool = False,
-    normalize: bool = True,
-    threshold_for_bug: float = 0,
-    astype_value: str = "",
-    channels_independent: bool = False,
-):
+def get_subject_source_path(dataset_name: str, subject_id: int, data_path: str) -> str:
+    if "aguilera" in dataset_name:
+        return os.path.join(data_path, f"S{subject_id}.edf")
+    elif dataset_name == "coretto":
+        foldername = "S{:02d}".format(subject_id)
+        filename = foldername + "_EEG.mat"
+        return os.path.join(data_path, foldername, filename)
+    elif dataset_name == "torres":
+        filename = "Datasets/torres_dataset/IndividuosS1-S27(17columnas)-Epocas.mat"
+        return os.path.join(data_path, filename)
+    elif dataset_name == "ic_bci_2020":
+        foldername = "Training set"
+        filename = "Data_Sample{:02d}.mat".format(subject_id)
+        return os.path.join(data_path, foldername, filename)
+    elif dataset_name == "braincommand":
+        return f"{data_path}/eeg_data_calibration2_sub{subject_id:02d}.csv"
+    return data_path
+
+
+def load_subject_from_source(dataset_info: dict, subject_id: int, data_path: str):
     dataset_name = dataset_info["dataset_name"]
+    filepath = get_subject_source_path(dataset_name, subject_id, data_path)
 
     event_dict: dict = {}
     label: list = []
 
     if "aguilera" in dataset_name:
-        filename = f"S{subject_id}.edf"
-        filepath = os.path.join(data_path, filename)
         if "gamified" in dataset_name:
-            epochs, label, event_dict = aguilera_dataset_loader(filepath, True)
+            data, label, event_dict = aguilera_dataset_loader(filepath, True)
         else:
-            epochs, label, event_dict = aguilera_dataset_loader(filepath, False)
-        data = epochs.get_data()
+            data, label, event_dict = aguilera_dataset_loader(filepath, False)
     # elif dataset_name == "nieto":
     #     data, label, event_dict = nieto_dataset_loader(data_path, subject_id)
     elif dataset_name == "coretto":
-        foldername = "S{:02d}".format(subject_id)
-        filename = foldername + "_EEG.mat"
-        path = [data_path, foldername, filename]
-        filepath = os.path.join(*path)
         data, label, event_dict = coretto_dataset_loader(filepath)
     elif dataset_name == "torres":
-        filename = "Datasets/torres_dataset/IndividuosS1-S27(17columnas)-Epocas.mat"
-        filepath = os.path.join(data_path, filename)
         data, label, event_dict = torres_dataset_loader(filepath, subject_id)
     elif dataset_name == "ic_bci_2020":
-        foldername = "Training set"
-        filename = "Data_Sample{:02d}.mat".format(subject_id)
-        path = [data_path, foldername, filename]
-        filepath = os.path.join(*path)
         data, label, event_dict = ic_bci_2020_dataset_loader(filepath)
     elif dataset_name == "nguyen_2019":
         data, label, event_dict = nguyen_2019_dataset_loader(data_path, subject_id)
     elif dataset_name == "braincommand":
         data, label, event_dict = braincommand_dataset_loader(data_path, subject_id)
+    return data, label, event_dict
+
+
+def loader_cache_prefix(
+    dataset_name: str, subject_id: int, data_path: str
+) -> Optional[str]:
+    """
+    Prefix of the arrays cache the dataset loader keeps on its own (see save_arrays_cache), None if it doesn't have one.
+    """
+    filepath = get_subject_source_path(dataset_name, subject_id, data_path)
+    if dataset_name == "torres":
+        return torres_subject_cache_prefix(filepath, subject_id)
+    elif dataset_name == "braincommand":
+        return os.path.splitext(filepath)[0]
+    return None
+
+
+def epoch_store_prefix(dataset_info: dict, subject_id: int, data_path: str) -> str:
+    return os.path.join(
+        data_path,
+        "epoch_store",
+        f"{dataset_info['dataset_name']}_sub{subject_id:02d}",
+    )
+
+
+def load_subject_epoch_store(
+    dataset_info: dict, subject_id: int, data_path: str, normalize: bool = False
+):
+    """
+    Same output as load_subject_from_source, but the data is a np.memmap of the subject's epoch store.
+
+    The epoch store is the same format for every dataset: a contiguous (trials, channels, samples) array, the same
+    array after data_normalization, the labels and a json with the event_dict and the channel metadata. It is created
+    from the original files the first time and created again if those files change. Opening it doesn't read the data,
+    so many subjects can be opened at once and each CV fold only reads its own trials. With normalize=True the
+    normalized array is returned, so it is not copied to be normalized on every load.
+    The datasets whose loader has its own cache (torres, braincommand) are not stored a second time, their loader
+    is used directly. Neither is nguyen_2019, whose source is the whole dataset folder instead of a subject file.
+    """
+    dataset_name = dataset_info["dataset_name"]
+    if (
+        dataset_name == "nguyen_2019"
+        or loader_cache_prefix(dataset_name, subject_id, data_path) is not None
+    ):
+        data, label, event_dict = load_subject_from_source(
+            dataset_info, subject_id, data_path
+        )
+        if normalize:
+            data = data_normalization(data)
+        return data, label, event_dict
+
+    data_name = "normalized_data" if normalize else "data"
+    store_prefix = epoch_store_prefix(dataset_info, subject_id, data_path)
+    cache = load_arrays_cache(store_prefix)
+    # The stores written before the normalized array was kept are created again
+    if cache is not None and "normalized_data" in cache[0]:
+        arrays, info = cache
+        return arrays[data_name], arrays["label"], info["event_dict"]
+
+    data, label, event_dict = load_subject_from_source(
+        dataset_info, subject_id, data_path
+    )
+    os.makedirs(os.path.dirname(store_prefix), exist_ok=True)
+    save_arrays_cache(
+        store_prefix,
+        {
+            "data": data,
+            "normalized_data": data_normalization(data),
+            "label": np.asarray(label, dtype=np.int64),
+        },
+        source_paths=[get_subject_source_path(dataset_name, subject_id, data_path)],
+        info={
+            "dataset_name": dataset_name,
+            "event_dict": event_dict,
+            "channels_names": dataset_info["channels_names"],
+            "sample_rate": dataset_info["sample_rate"],
+        },
+    )
+    arrays, info = load_arrays_cache(store_prefix)
+    return arrays[data_name], arrays["label"], info["event_dict"]
+
+
+class LazyEpochsArray:
+    """
+    Takes the place of the mne.EpochsArray returned by load_data_labels_based_on_dataset.
+
+    Most methods only use the data and labels, so the EpochsArray (a copy of the data plus MNE's info validation)
+    is only created the first time something other than len, shape or events is used, ex. epochs.plot().
+    """
+
+    def __init__(self, data, label, event_dict: dict, dataset_info: dict):
+        self.shape = data.shape
+        self.events = np.column_stack(
+            (
+                np.arange(
+                    0,
+                    dataset_info["sample_rate"] * data.shape[0],
+                    dataset_info["sample_rate"],
+                ),
+                np.zeros(len(label), dtype=int),
+                np.array(label),
+            )
+        )
+        self._data = data
+        self._event_dict = event_dict
+        self._number_of_channels = dataset_info["#_channels"]
+        self._sample_rate = dataset_info["sample_rate"]
+        self._epochs = None
+
+    def __len__(self):
+        return self.shape[0]
+
+    def to_epochs(self) -> EpochsArray:
+        if self._epochs is None:
+            self._epochs = EpochsArray(
+                self._data,
+                info=mne.create_info(
+                    self._number_of_channels,
+                    sfreq=self._sample_rate,
+                    ch_types="eeg",
+                ),
+                events=self.events,
+                event_id=self._event_dict,
+                baseline=(None, None),
+            )
+        return self._epochs
+
+    def __getitem__(self, item):
+        return self.to_epochs()[item]
+
+    def __getattr__(self, name):
+        # Only for the names that exist in EpochsArray, so probes like hasattr(epochs, "fit") don't create it
+        if name.startswith("_") or not (
+            hasattr(EpochsArray, name)
+            or name in ("info", "event_id", "baseline", "drop_log", "selection")
+        ):
+            raise AttributeError(name)
+        return getattr(self.to_epochs(), name)
+
+
+def load_data_labels_based_on_dataset(
+    dataset_info: dict,
+    subject_id: int,
+    data_path: str,
+    selected_classes: list[int] = [],
+    transpose: bool = False,
+    normalize: bool = True,
+    threshold_for_bug: float = 0,
+    astype_value: str = "",
+    channels_independent: bool = False,
+    use_epoch_store: bool = True,
+):
+    if use_epoch_store:
+        # The store keeps the normalized data too, so it isn't copied here
+        data, label, event_dict = load_subject_epoch_store(
+            dataset_info, subject_id, data_path, normalize=normalize
+        )
+    else:
+        data, label, event_dict = load_subject_from_source(
+            dataset_info, subject_id, data_path
+        )
+        if normalize:
+            data = data_normalization(data)
 
     if transpose:
         data = np.transpose(data, (0, 2, 1))
-    if normalize:
-        data = data_normalization(data)
     if selected_classes:
         data, label, event_dict = class_selection(
             data, label, event_dict, selected_classes=selected_classes
         )
     if astype_value:
-        data = data.astype(astype_value)
+        data = data.astype(astype_value, copy=False)
     if threshold_for_bug:
         data[data < threshold_for_bug] = (
             threshold_for_bug  # To avoid the error "SVD did not convergence"
@@ -392,34 +665,110 @@ def load_data_labels_based_on_dataset(
         data = np.transpose(np.array([data]), (1, 0, 2))
         dataset_info["#_channels"] = 1
 
-    # Convert to epochs
-    events = np.column_stack(
-        (
-            np.arange(
-                0,
-                dataset_info["sample_rate"] * data.shape[0],
-                dataset_info["sample_rate"],
-            ),
-            np.zeros(len(label), dtype=int),
-            np.array(label),
-        )
-    )
-
-    epochs = EpochsArray(
-        data,
-        info=mne.create_info(
-            dataset_info["#_channels"],
-            sfreq=dataset_info["sample_rate"],
-            ch_types="eeg",
-        ),
-        events=events,
-        event_id=event_dict,
-        baseline=(None, None),
-    )
+    epochs = LazyEpochsArray(data, label, event_dict, dataset_info)
     label = epochs.events[:, 2].astype(np.int64)  # Repetition to keep the right format
     return epochs, data, label
 
 
+def load_subject_into_shared_memory(
+    dataset_info: dict, subject_id: int, data_path: str, load_kwargs: dict
+):
+    # Runs in the worker process, only the name of the shared memory block and the labels are pickled back.
+    _, data, label = load_data_labels_based_on_dataset(
+        dataset_info, subject_id, data_path, **load_kwargs
+    )
+    shared_data = shared_memory.SharedMemory(create=True, size=max(data.nbytes, 1))
+    np.ndarray(data.shape, dtype=data.dtype, buffer=shared_data.buf)[:] = data
+    shared_data.close()
+    # The main process unlinks it, otherwise the resource tracker reports it as leaked
+    resource_tracker.unregister(shared_data._name, "shared_memory")
+    return shared_data.name, data.shape, data.dtype.str, label
+
+
+def release_shared_memory(shared_data: shared_memory.SharedMemory):
+    shared_data.close()
+    shared_data.unlink()
+
+
+def take_subject_from_shared_memory(future):
+    # The data is a view on the shared memory block (no copy), the block is freed once the data and its views are
+    # garbage-collected.
+    shared_data_name, shape, dtype, label = future.result()
+    shared_data = shared_memory.SharedMemory(name=shared_data_name)
+    data = np.ndarray(shape, dtype=dtype, buffer=shared_data.buf)
+    weakref.finalize(data, release_shared_memory, shared_data)
+    return data, label
+
+
+def load_subjects(
+    dataset_info: dict,
+    subject_ids,
+    data_path: str,
+    prefetch: int = 2,
+    **load_kwargs,
+):
+    """
+    Yields (subject_id, data, label) like a loop over load_data_labels_based_on_dataset, but the subjects are loaded
+    in a process pool: while the current subject is used, the next `prefetch` subjects are already being loaded.
+    The data comes back from the workers through shared memory instead of being pickled, and is yielded as a view on
+    it: the shared memory is freed when the data (and any view of it) is garbage-collected.
+
+    load_kwargs are the same as load_data_labels_based_on_dataset (selected_classes, threshold_for_bug, ...).
+    """
+    subject_ids = list(subject_ids)
+    if load_kwargs.get("channels_independent"):
+        dataset_info["#_channels"] = (
+            1  # What load_data_labels_based_on_dataset does in the worker
+        )
+
+    if dataset_info["dataset_name"] == "torres" and subject_ids:
+        # The .mat is split once here, otherwise every worker would split it (all the subjects) on the first run
+        filepath = get_subject_source_path("torres", subject_ids[0], data_path)
+        if any(
+            load_arrays_cache(
+                torres_subject_cache_prefix(filepath, subject_id), mmap_mode="r"
+            )
+            is None
+            for subject_id in subject_ids
+        ):
+            split_torres_dataset_by_subject(filepath)
+
+    pending: deque = deque()
+    with ProcessPoolExecutor(max_workers=max(prefetch, 1)) as executor:
+
+        def submit_next():
+            subject_id = subject_ids[len(pending) + number_of_yielded]
+            pending.append(
+                (
+                    subject_id,
+                    executor.submit(
+                        load_subject_into_shared_memory,
+                        dataset_info.copy(),
+                        subject_id,
+                        data_path,
+                        load_kwargs,
+                    ),
+                )
+            )
+
+        number_of_yielded = 0
+        while len(pending) < min(prefetch + 1, len(subject_ids)):
+            submit_next()
+        try:
+            while pending:
+                subject_id, future = pending.popleft()
+                data, label = take_subject_from_shared_memory(future)
+                number_of_yielded += 1
+                if len(pending) + number_of_yielded < len(subject_ids):
+                    submit_next()
+                yield subject_id, data, label
+        finally:  # If the loop is left early, free what was already loaded
+            for _, future in pending:
+                future.cancel()
+                if not future.cancelled() and future.exception() is None:
+                    take_subject_from_shared_memory(future)
+
+
 if __name__ == "__main__":
     # Manual Inputs
     subject_id = 1  # Only two things I should be able to change
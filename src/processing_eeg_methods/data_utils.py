@@ -1,50 +1,68 @@
 import os
+import time
+import warnings
+from typing import Optional
 
 import numpy as np
 import pandas as pd
+from joblib import Parallel, delayed
 from share import ROOT_VOTING_SYSTEM_PATH
-from sklearn.base import BaseEstimator
-from sklearn.linear_model import RidgeClassifier, SGDClassifier
+from sklearn.base import BaseEstimator, clone
+from sklearn.discriminant_analysis import (
+    LinearDiscriminantAnalysis,
+    QuadraticDiscriminantAnalysis,
+)
+from sklearn.ensemble import AdaBoostClassifier, RandomForestClassifier
+from sklearn.exceptions import NotFittedError
+from sklearn.gaussian_process import GaussianProcessClassifier
+from sklearn.gaussian_process.kernels import RBF
+from sklearn.linear_model import LogisticRegression, RidgeClassifier, SGDClassifier
 from sklearn.model_selection import GridSearchCV, StratifiedKFold, train_test_split
+from sklearn.naive_bayes import GaussianNB
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.neural_network import MLPClassifier
+from sklearn.svm import SVC
+from sklearn.tree import DecisionTreeClassifier
+from sklearn.utils import resample
+from sklearn.utils.validation import check_is_fitted
 
-# from sklearn.linear_model import LogisticRegression
-# from sklearn.discriminant_analysis import LinearDiscriminantAnalysis
-# from sklearn.discriminant_analysis import QuadraticDiscriminantAnalysis
-# from sklearn.ensemble import AdaBoostClassifier, RandomForestClassifier
-# from sklearn.gaussian_process import GaussianProcessClassifier
-# from sklearn.gaussian_process.kernels import RBF
-# from sklearn.naive_bayes import GaussianNB
-# from sklearn.neighbors import KNeighborsClassifier
-# from sklearn.neural_network import MLPClassifier
-# from sklearn.svm import SVC
-# from sklearn.tree import DecisionTreeClassifier
+# Exhaustive grid search: only the cheap one
+default_classifiers = [RidgeClassifier()]
 
 # MDM() Always nan at the end
-classifiers = [  # The Good, Medium and Bad is decided on Torres dataset. This to avoid most of the processings.
-    # KNeighborsClassifier(3), # Good
-    # SVC(kernel='linear', probability=True), # Good
-    RidgeClassifier()
-    # GaussianProcessClassifier(1.0 * RBF(1.0), random_state=42), # Good # It doesn't have .coef
-    # DecisionTreeClassifier(max_depth=5, random_state=42), # Good # It doesn't have .coef
-    # RandomForestClassifier(max_depth=5, n_estimators=100, max_features=1, random_state=42), # Good It doesn't have .coef
-    # MLPClassifier(alpha=1, max_iter=1000, random_state=42), # Good
-    # AdaBoostClassifier(algorithm="SAMME", random_state=42), # Medium
-    # GaussianNB(), # Medium
-    # QuadraticDiscriminantAnalysis(), # Bad
-    # LinearDiscriminantAnalysis(), # Bad
-    # LogisticRegression(), # Good
+classifiers = [  # The Good, Medium and Bad is decided on Torres dataset. Searched with search="halving".
+    KNeighborsClassifier(3),  # Good
+    SVC(kernel="linear", probability=True),  # Good
+    RidgeClassifier(),
+    # Good # It doesn't have .coef
+    GaussianProcessClassifier(1.0 * RBF(1.0), random_state=42),
+    # Good # It doesn't have .coef
+    DecisionTreeClassifier(max_depth=5, random_state=42),
+    # Good It doesn't have .coef
+    RandomForestClassifier(
+        max_depth=5, n_estimators=100, max_features=1, random_state=42
+    ),
+    MLPClassifier(alpha=1, max_iter=1000, random_state=42),  # Good
+    AdaBoostClassifier(
+        random_state=42,
+        # The default of the pinned scikit-learn is "SAMME.R", newer ones only have SAMME (and no parameter)
+        **(
+            {"algorithm": "SAMME"}
+            if "algorithm" in AdaBoostClassifier().get_params()
+            else {}
+        ),
+    ),  # Medium
+    GaussianNB(),  # Medium
+    QuadraticDiscriminantAnalysis(),  # Bad
+    LinearDiscriminantAnalysis(),  # Bad
+    LogisticRegression(),  # Good
 ]
 
 
 def class_selection(dataX, dataY, event_dict: dict, selected_classes: list[int]):
-    dataX_selected: list = []
-    dataY_selected: list = []
-    for dataX_idx, dataY_idx in zip(dataX, dataY):
-        if dataY_idx in selected_classes:
-            dataX_selected.append(dataX_idx)
-            dataY_selected.append(dataY_idx)
-    dataX_selected_np = np.asarray(dataX_selected)
-    dataY_selected_df = pd.Series(dataY_selected)
+    selected_mask = np.isin(dataY, selected_classes)
+    dataX_selected_np = np.asarray(dataX)[selected_mask]
+    dataY_selected_df = pd.Series(np.asarray(dataY)[selected_mask])
 
     label_remap = {
         dataY_original: dataY_remap_idx
@@ -123,22 +141,176 @@ def get_dataset_basic_info(datasets_basic_infos: dict, dataset_name: str) -> dic
         return datasets_basic_infos[dataset_name]
 
 
-def get_best_classificator_and_test_accuracy(data, labels, estimators):
-    param_grid = []
-    for classificator in classifiers:
-        param_grid.append({"clf__estimator": [classificator]})
+def search_candidates(search: str) -> list:
+    """
+    Classifiers tried by get_best_classificator_and_test_accuracy with that search.
+    """
+    if search == "halving":
+        return classifiers
+    elif search == "grid":
+        return default_classifiers
+    raise Exception(
+        f"Not supported search named '{search}', choose from 'grid' or 'halving'"
+    )
+
+
+def _halving_fold_score(
+    estimators, classificator, data, labels, train, test, deadline: Optional[float]
+) -> float:
+    if deadline is not None and time.time() > deadline:
+        return np.nan  # Out of time, the candidate is not scored in this rung
+    estimator = clone(estimators).set_params(clf__estimator=clone(classificator))
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")  # e.g. collinear variables of QDA
+        try:
+            estimator.fit(data[train], labels[train])
+        except (ValueError, np.linalg.LinAlgError):
+            return -np.inf  # Like GridSearchCV's error_score, it's never selected
+        return estimator.score(data[test], labels[test])
+
+
+def successive_halving_search(
+    data,
+    labels,
+    estimators,
+    candidates: list,
+    cv,
+    factor: int = 3,
+    time_budget: Optional[float] = None,
+    n_jobs: int = -1,
+    random_state: int = 42,
+) -> tuple[BaseEstimator, float]:
+    """
+    Successive halving (same schedule as sklearn's HalvingGridSearchCV with resource="n_samples"): all the
+    candidates are cross-validated on a small subsample of each training fold, only the best 1/factor go on to the
+    next rung, with factor times more samples, and the last rung uses all of them. Expensive candidates that are bad
+    on small budgets are dropped early. All the (candidate, fold) fits of a rung run in parallel.
+
+    Parameters
+    ----------
+    data
+    labels
+    estimators: Pipeline whose "clf" step is a ClfSwitcher.
+    candidates: classifiers for clf__estimator.
+    cv: splitter, the test folds are never subsampled.
+    factor
+    time_budget: seconds for the whole search, e.g. per subject. Once it's over, the fits not started yet are
+    skipped and the best candidate of the last complete rung is kept. The first rung always completes.
+    n_jobs
+    random_state: of the subsamples.
+
+    Returns
+    -------
+    The best pipeline refitted on all the data, and its mean cross-validated accuracy on the last rung it was scored.
+    """
+    data = np.asarray(data)
+    labels = np.asarray(labels)
+    start = time.time()
+    folds = list(cv.split(data, labels))
+    n_classes = len(np.unique(labels))
+
+    n_rungs = 1 + int(np.floor(np.log(len(candidates)) / np.log(factor) + 1e-9))
+    max_resources = min(len(train) for train, _ in folds)
+    # Enough samples for every class in every rung, like HalvingGridSearchCV's min_resources="smallest"
+    min_resources = max(max_resources // factor ** (n_rungs - 1), 2 * n_classes)
+
+    remaining = list(range(len(candidates)))
+    best_index, best_score = remaining[0], np.nan
+    for rung in range(n_rungs):
+        n_samples = min(min_resources * factor**rung, max_resources)
+        if rung == n_rungs - 1:
+            n_samples = max_resources
+        rung_folds = [
+            (
+                resample(
+                    train,
+                    replace=False,
+                    n_samples=n_samples,
+                    stratify=labels[train],
+                    random_state=random_state + rung,
+                ),
+                test,
+            )
+            for train, test in folds
+        ]
+        deadline = None if (time_budget is None or rung == 0) else start + time_budget
+        scores = Parallel(n_jobs=n_jobs)(
+            delayed(_halving_fold_score)(
+                estimators, candidates[index], data, labels, train, test, deadline
+            )
+            for index in remaining
+            for train, test in rung_folds
+        )
+        scores = np.reshape(scores, (len(remaining), len(rung_folds))).mean(axis=1)
+        if np.isnan(scores).any():
+            # The budget ran out in this rung, the candidates that happened to finish are not ranked against the
+            # winner of the last complete rung
+            break
+        order = np.argsort(-scores, kind="stable")
+        best_index, best_score = remaining[order[0]], scores[order[0]]
+        print(
+            f"Rung {rung}: {len(remaining)} candidates on {n_samples} samples, best "
+            f"{candidates[best_index]} ({best_score:.3f})"
+        )
+        remaining = [
+            remaining[position]
+            for position in order[: max(1, int(np.ceil(len(remaining) / factor)))]
+        ]
+        if time_budget is not None and time.time() - start > time_budget:
+            break
+
+    best_estimator = clone(estimators).set_params(
+        clf__estimator=clone(candidates[best_index])
+    )
+    best_estimator.fit(data, labels)
+    return best_estimator, best_score
 
+
+def get_best_classificator_and_test_accuracy(
+    data,
+    labels,
+    estimators,
+    search: str = "grid",
+    time_budget: Optional[float] = None,
+    n_jobs: int = -1,
+):
+    """
+    Parameters
+    ----------
+    data
+    labels
+    estimators: Pipeline whose "clf" step is a ClfSwitcher.
+    search: "grid", exhaustive GridSearchCV over default_classifiers. "halving", successive halving over the whole
+    classifiers zoo, within time_budget seconds if given (see successive_halving_search).
+    time_budget
+    n_jobs: cores used for the candidates and folds of either search.
+    """
+    candidates = search_candidates(search)
     cv = StratifiedKFold(n_splits=4, shuffle=True, random_state=42)
-    clf = GridSearchCV(
-        estimator=estimators, param_grid=param_grid, cv=cv
-    )  # https://stackoverflow.com/questions/52580023/how-to-get-the-best-estimator-parameters-out-from-pipelined-gridsearch-and-cro
-    clf.fit(data, labels)
+    if search == "halving":
+        best_estimator, acc = successive_halving_search(
+            data,
+            labels,
+            estimators,
+            candidates,
+            cv,
+            time_budget=time_budget,
+            n_jobs=n_jobs,
+        )
+    else:
+        param_grid = []
+        for classificator in candidates:
+            param_grid.append({"clf__estimator": [classificator]})
 
-    acc = clf.best_score_
+        clf = GridSearchCV(
+            estimator=estimators, param_grid=param_grid, cv=cv, n_jobs=n_jobs
+        )  # https://stackoverflow.com/questions/52580023/how-to-get-the-best-estimator-parameters-out-from-pipelined-gridsearch-and-cro
+        clf.fit(data, labels)
+        best_estimator, acc = clf.best_estimator_, clf.best_score_
 
     if acc <= 0.25:
         acc = np.nan
-    return clf.best_estimator_, acc
+    return best_estimator, acc
 
 
 def convert_into_independent_channels(data, labels):
@@ -171,11 +343,23 @@ class ClfSwitcher(BaseEstimator):
         self.estimator.fit(X, y)
         return self
 
+    def __sklearn_is_fitted__(self):
+        # The fitted attributes are the ones of the switched estimator
+        try:
+            check_is_fitted(self.estimator)
+        except NotFittedError:
+            return False
+        return True
+
     def predict(self, X, y=None):
         return self.estimator.predict(X)
 
     def predict_proba(self, X):
-        return self.estimator._predict_proba_lr(X)
+        if hasattr(self.estimator, "predict_proba"):
+            return self.estimator.predict_proba(X)
+        return self.estimator._predict_proba_lr(
+            X
+        )  # RidgeClassifier, SGDClassifier(loss="hinge")
 
     def score(self, X, y):
         return self.estimator.score(X, y)
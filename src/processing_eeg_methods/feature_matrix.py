@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+
+
+class FeatureMatrix:
+    """
+    [rows x features] table built block of columns by block of columns in one preallocated float32 array, instead of
+    a pd.concat per block (which copies the whole table every time).
+
+    The capacity doubles when it's full, so the array is only copied a few times however many blocks are added.
+    column_index maps each column name to its position: the selected columns are taken with numpy indexing and the
+    array goes directly to SelectKBest and the pipelines. to_dataframe is for reporting.
+
+    Parameters
+    ----------
+    n_rows
+    n_columns: initial capacity, e.g. the number of columns of a previous matrix built the same way.
+    dtype
+    """
+
+    def __init__(self, n_rows: int, n_columns: int = 64, dtype=np.float32):
+        self._array = np.empty((n_rows, max(n_columns, 1)), dtype=dtype)
+        self.columns: list[str] = []
+        self.column_index: dict = {}
+
+    @property
+    def array(self) -> np.ndarray:
+        return self._array[:, : len(self.columns)]
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self._array.shape[0], len(self.columns)
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self.array, dtype=dtype)
+
+    def add(self, columns: list[str], values):
+        """
+        Parameters
+        ----------
+        columns: names of the new columns.
+        values: [rows x columns], or [rows] for a single column.
+        """
+        values = np.asarray(values).reshape(self._array.shape[0], len(columns))
+        start = len(self.columns)
+        end = start + len(columns)
+        if end > self._array.shape[1]:
+            grown = np.empty(
+                (self._array.shape[0], max(end, 2 * self._array.shape[1])),
+                dtype=self._array.dtype,
+            )
+            grown[:, :start] = self._array[:, :start]
+            self._array = grown
+        self._array[:, start:end] = values
+        for position, column in enumerate(columns, start):
+            self.column_index[column] = position
+        self.columns.extend(columns)
+
+    def positions(self, columns) -> np.ndarray:
+        return np.fromiter(
+            (self.column_index[column] for column in columns),
+            dtype=np.intp,
+            count=len(columns),
+        )
+
+    def select(self, columns) -> np.ndarray:
+        """
+        [rows x len(columns)] values of the given columns, in that order.
+        """
+        return self._array[:, self.positions(columns)]
+
+    def to_dataframe(self) -> pd.DataFrame:
+        return pd.DataFrame(self.array, columns=self.columns)
@@ -1,13 +1,13 @@
 import bisect
 import itertools
+from functools import lru_cache
 
-import dit
 import librosa
 import numpy as np
-import statsmodels.api as sm
-from dit.other import tsallis_entropy
+from numba import njit, prange
+from scipy import fft as sp_fft
 from scipy import signal
-from sklearn.metrics import mutual_info_score
+from scipy.spatial import cKDTree
 from statsmodels import tsa
 
 ################################################
@@ -27,27 +27,51 @@ def filt_data(eegData, lowcut, highcut, fs, order=7):
     return filt_eegData
 
 
+##########
+# Bin of each sample, as np.histogram(x, edges) would count it (the last bin includes the right edge)
+# 	edges: increasing bin edges, shared by all the samples
+# Returns the bin indices and the mask of the samples inside the edges
+# With evenly spaced edges (np.arange) the bins are computed arithmetically, only the samples next to an edge (where
+# rounding errors could matter) go through searchsorted, which is much slower for unsorted data.
+def binIndices(eegData, edges):
+    inside = (eegData >= edges[0]) & (eegData <= edges[-1])
+    widths = np.diff(edges)
+    if np.allclose(widths, widths[0]):
+        position = (eegData - edges[0]) / widths[0]
+        indices = np.floor(position).astype(np.intp)
+        near_edge = np.abs(position - np.round(position)) < 1e-6
+        indices[near_edge] = (
+            np.searchsorted(edges, eegData[near_edge], side="right") - 1
+        )
+        # Outside samples are not counted, but keep them at the same index as searchsorted
+        indices[eegData < edges[0]] = -1
+        indices[eegData > edges[-1]] = len(edges) - 1
+    else:
+        indices = np.searchsorted(edges, eegData, side="right") - 1
+    indices[eegData == edges[-1]] = len(edges) - 2
+    return indices, inside
+
+
 #########
 # remove short bursts / spikes
+# 	z: 2D np array [chans x samples] of 0 and 1, modified in place
+# Run-length encoding of each row: the runs (from the second sample) shorter than n + 1 samples are set to 0, except
+# the last run of the row, then the first sample is set to 0 if it's an isolated 1.
 def fcnRemoveShortEvents(z, n):
-    for chan in range(z.shape[0]):
-        # check for too-short suppressions
-        ct = 0
-        i0 = 1
-        i1 = 1
-        for i in range(2, len(z[chan, :])):
-            if z[chan, i] == z[chan, i - 1]:
-                ct = ct + 1
-                i1 = i
-            else:
-                if ct < n:
-                    z[chan, i0:i1] = 0
-                    z[chan, i1] = 0  # nasty little bug
-                ct = 0
-                i0 = i
-                i1 = i
-        if z[chan, 0] == 1 and z[chan, 1] == 0:
-            z[chan, 0] = 0
+    z_rest = z[:, 1:]
+    changes = z_rest[:, 1:] != z_rest[:, :-1]
+    run_ids = np.zeros(z_rest.shape, dtype=np.int64)
+    np.cumsum(changes, axis=1, out=run_ids[:, 1:])
+    last_run_ids = run_ids[:, -1:]
+    # Unique id of each run in the whole array to get all the run lengths with one bincount
+    run_ids_all = (
+        run_ids
+        + np.concatenate(([0], np.cumsum(last_run_ids[:, 0] + 1)[:-1]))[:, np.newaxis]
+    )
+    run_lengths = np.bincount(run_ids_all.ravel(), minlength=1)
+    short_runs = (run_lengths[run_ids_all] - 1 < n) & (run_ids != last_run_ids)
+    z_rest[short_runs] = 0
+    z[(z[:, 0] == 1) & (z[:, 1] == 0), 0] = 0
     return z
 
 
@@ -112,26 +136,70 @@ def burst_supression_detection(x, fs, suppression_threshold=10):
     return bursts, supressions
 
 
+##########
+# Bursts and suppressions of all the channels and epochs at once, detected as in burst_supression_detection
+# 	eegData: 3D np array [chans x ms x epochs]
+# The intervals are kept as flat arrays, (rows, starts, ends) where row = chan * epochs + epoch, so the burst
+# features below derive their values from one detection instead of detecting again for each feature.
+class BurstSuppression:
+    def __init__(self, eegData, fs, suppression_threshold=10, endIdx=500):
+        n_chans, n_samples, n_epochs = eegData.shape
+        self.shape = (n_chans, n_epochs)
+        self.n_samples = n_samples
+        # CALCULATE ENVELOPE, [chans x epochs x ms]
+        e = np.abs(signal.hilbert(np.moveaxis(eegData, 1, -1), axis=-1))
+        # same as smooth(e,Fs/4) in MATLAB, apply 1/2 second smoothing
+        kernel = np.ones(int(fs / 4)) / (fs / 4)
+        ME = signal.convolve(e, kernel[np.newaxis, np.newaxis, :], mode="same")
+        # DETECT SUPRESSIONS
+        # apply threshold
+        z = (ME < suppression_threshold).reshape(-1, n_samples)
+        # remove too-short suppression segments
+        z = fcnRemoveShortEvents(z, fs / 2)
+        # remove too-short burst segments
+        b = fcnRemoveShortEvents(1 - z, fs / 2)
+        z = 1 - b
+
+        # The changes of z alternate, so each interval ends at the next change of the same row
+        rows, changes = np.nonzero(np.diff(z, axis=1))
+        went_high = z[rows, changes + 1] == 1
+        ends = np.full(len(changes), endIdx)
+        same_row = rows[1:] == rows[:-1]
+        ends[:-1][same_row] = changes[1:][same_row]
+        self.bursts = (rows[went_high], changes[went_high], ends[went_high])
+        self.suppressions = (rows[~went_high], changes[~went_high], ends[~went_high])
+
+    def count(self, intervals):
+        rows, _, _ = intervals
+        return np.bincount(rows, minlength=np.prod(self.shape)).reshape(self.shape)
+
+    def lengthStats(self, intervals):
+        # Mean and std of the lengths of each row, 0 if the row doesn't have intervals
+        rows, starts, ends = intervals
+        lengths = ends - starts
+        counts = np.bincount(rows, minlength=np.prod(self.shape))
+        with np.errstate(invalid="ignore"):
+            mean = np.bincount(rows, lengths, minlength=len(counts)) / counts
+            std = np.sqrt(
+                np.bincount(rows, (lengths - mean[rows]) ** 2, minlength=len(counts))
+                / counts
+            )
+        return (
+            np.nan_to_num(mean).reshape(self.shape),
+            np.nan_to_num(std).reshape(self.shape),
+        )
+
+
 ##########
 # Coherence in the Delta Band
 def CoherenceDelta(eegData, i, j, fs=100):
-    nfft = eegData.shape[1]
-    f, Cxy = signal.coherence(
-        eegData[i, :, :], eegData[j, :, :], fs=fs, nfft=nfft, axis=0
-    )  # , window=np.hanning(nfft))
-    out = np.mean(Cxy[np.all([f >= 0.5, f <= 4], axis=0)], axis=0)
-    return out
+    return ChannelPairConnectivity(eegData, fs, pairs=[(i, j)]).coherence()[0]
 
 
 ##########
 # Cross Correlation
 def crossCorrelation(eegData, i, j):
-    out = np.zeros(eegData.shape[2])
-    for epoch in range(eegData.shape[2]):
-        ccor = np.correlate(eegData[i, :, epoch], eegData[j, :, epoch], mode="full")
-        absccor = np.abs(ccor)
-        out[epoch] = (np.max(absccor) - np.mean(absccor)) / np.std(absccor)
-    return out
+    return ChannelPairConnectivity(eegData, pairs=[(i, j)]).crossCorrelation()[0][0]
 
 
 ################################################
@@ -139,49 +207,149 @@ def crossCorrelation(eegData, i, j):
 ################################################
 
 
+##########
+# Histograms of all the channels and epochs at once, with the same bin edges np.arange(bin_min + 1, bin_max, binWidth)
+# 	eegData: 3D np array [chans x ms x epochs]
+# The samples are binned with binIndices and counted with one bincount of the flattened (chan, epoch, bin) index, the
+# samples outside the edges are not counted, like np.histogram. All the entropies are computed from the same counts.
+class HistogramEntropy:
+    def __init__(self, eegData, bin_min, bin_max, binWidth):
+        self.binWidth = binWidth
+        edges = np.arange(bin_min + 1, bin_max, binWidth)
+        n_bins = len(edges) - 1
+        n_chans, _, n_epochs = eegData.shape
+        indices, inside = binIndices(eegData, edges)
+        histograms = (np.arange(n_chans)[:, None, None] * n_epochs) + np.arange(
+            n_epochs
+        )
+        self.counts = np.bincount(
+            (histograms * n_bins + indices)[inside],
+            minlength=n_chans * n_epochs * n_bins,
+        ).reshape(n_chans, n_epochs, n_bins)
+        total = self.counts.sum(axis=-1, keepdims=True)
+        # Empty histograms (all the samples outside the edges) end up with 0 entropy instead of nan
+        self.prob = self.counts / np.maximum(total, 1)
+
+    # Sum of prob ** order over the non-empty bins, as the empty ones are not part of the distribution.
+    # It's 1 for the empty histograms, so all their entropies are 0.
+    def powerSum(self, order):
+        nz = self.prob > 0
+        power_sum = np.power(
+            self.prob, order, where=nz, out=np.zeros_like(self.prob)
+        ).sum(axis=-1)
+        power_sum[~nz.any(axis=-1)] = 1
+        return power_sum
+
+    # -sum(p * log2(p)), the entropy in bits of the discrete distribution
+    def discreteShannon(self):
+        nz = self.prob > 0
+        return -np.sum(
+            self.prob * np.log2(self.prob, where=nz, out=np.zeros_like(self.prob)),
+            axis=-1,
+        )
+
+    # -sum(p * log2(p / binWidth)), the Shannon entropy of the density
+    def shannon(self):
+        return self.discreteShannon() + np.log2(self.binWidth) * self.prob.sum(axis=-1)
+
+    # (1 - sum(p ** q)) / (q - 1), the Shannon entropy in nats for q = 1 (as dit.other.tsallis_entropy)
+    def tsallis(self, orders=[1]):
+        H = []
+        for order in orders:
+            if order == 1:
+                H.append(self.discreteShannon() * np.log(2))
+            else:
+                H.append((1 - self.powerSum(order)) / (order - 1))
+        return H
+
+    # log2(sum(p ** alpha)) / (1 - alpha), the Shannon entropy in bits for alpha = 1
+    def renyi(self, orders=[2]):
+        H = []
+        for order in orders:
+            if order == 1:
+                H.append(self.discreteShannon())
+            else:
+                H.append(np.log2(self.powerSum(order)) / (1 - order))
+        return H
+
+
 ##########
 # Extract the Shannon Entropy
 # threshold the signal and make it discrete, normalize it and then compute entropy
 def shannonEntropy(eegData, bin_min, bin_max, binWidth):
-    H = np.zeros((eegData.shape[0], eegData.shape[2]))
-    for chan in range(H.shape[0]):
-        for epoch in range(H.shape[1]):
-            counts, binCenters = np.histogram(
-                eegData[chan, :, epoch], bins=np.arange(bin_min + 1, bin_max, binWidth)
-            )
-            nz = counts > 0
-            prob = counts[nz] / np.sum(counts[nz])
-            H[chan, epoch] = -np.dot(prob, np.log2(prob / binWidth))
-    return H
+    return HistogramEntropy(eegData, bin_min, bin_max, binWidth).shannon()
 
 
 ##########
 # Extract the tsalis Entropy
+# Returns a list with the [chans x epochs] entropy of each order
 def tsalisEntropy(eegData, bin_min, bin_max, binWidth, orders=[1]):
-    H = [np.zeros((eegData.shape[0], eegData.shape[2]))] * len(orders)
-    for chan in range(H[0].shape[0]):
-        for epoch in range(H[0].shape[1]):
-            counts, bins = np.histogram(
-                eegData[chan, :, epoch], bins=np.arange(-200 + 1, 200, 2)
-            )
-            dist = dit.Distribution(
-                [str(bc).zfill(5) for bc in bins[:-1]], counts / sum(counts)
-            )
-            for ii, order in enumerate(orders):
-                H[ii][chan, epoch] = tsallis_entropy(dist, order)
+    return HistogramEntropy(eegData, bin_min, bin_max, binWidth).tsallis(orders)
+
+
+##########
+# Extract the Renyi Entropy
+# Returns a list with the [chans x epochs] entropy of each order
+def renyiEntropy(eegData, bin_min, bin_max, binWidth, orders=[2]):
+    return HistogramEntropy(eegData, bin_min, bin_max, binWidth).renyi(orders)
+
+
+##########
+# Hann window, mel filterbank and DCT-II matrix of mfccFeatures, built only once per parameters
+# Same defaults as librosa.feature.mfcc (center=True with zero padding, slaney mel filters, orthonormal DCT)
+@lru_cache(maxsize=None)
+def mfccMatrices(fs, n_samples, n_mfcc=20, n_fft=2048, hop_length=512, n_mels=128):
+    window = signal.get_window("hann", n_fft)
+    n_frames = 1 + n_samples // hop_length
+    mel_basis = librosa.filters.mel(sr=fs, n_fft=n_fft, n_mels=n_mels)
+    dct_basis = sp_fft.dct(np.eye(n_mels), type=2, norm="ortho", axis=0)[:n_mfcc]
+    return window, n_frames, mel_basis.T, dct_basis.T
+
+
+##########
+# Cepstrum Coefficients of each row, averaged over the STFT frames
+# 	xV: 2D np array [n x samples]
+# STFT -> power -> mel -> log (librosa.power_to_db, top_db=80) -> DCT as matrix products on blocks of rows, the frames
+# of a block are strided views of the zero padded rows. Each frame is the same as librosa.feature.mfcc.
+# Returns [n x n_mfcc]
+def mfccFeatures(
+    xV,
+    fs,
+    n_mfcc=20,
+    n_fft=2048,
+    hop_length=512,
+    n_mels=128,
+    top_db=80.0,
+    block_size=1024,
+):
+    xV = np.asarray(xV, dtype=np.float64)
+    n_signals, n_samples = xV.shape
+    window, n_frames, mel_basis, dct_basis = mfccMatrices(
+        fs, n_samples, n_mfcc, n_fft, hop_length, n_mels
+    )
+    H = np.empty((n_signals, n_mfcc))
+    for start in range(0, n_signals, block_size):
+        padded = np.pad(
+            xV[start : start + block_size], ((0, 0), (n_fft // 2, n_fft // 2))
+        )
+        frames = np.lib.stride_tricks.sliding_window_view(padded, n_fft, axis=1)[
+            :, ::hop_length
+        ][:, :n_frames]
+        power = np.abs(sp_fft.rfft(frames * window, axis=-1, workers=-1)) ** 2
+        log_mel = 10 * np.log10(np.maximum(power @ mel_basis, 1e-10))
+        log_mel = np.maximum(log_mel, log_mel.max(axis=(1, 2), keepdims=True) - top_db)
+        H[start : start + block_size] = (log_mel @ dct_basis).mean(axis=1)
     return H
 
 
 ##########
-# Cepstrum Coefficients (n=2)
+# Cepstrum Coefficients (n=2) of each channel and epoch, averaged over the frames
+# 	eegData: 3D np array [chans x ms x epochs]
+# Returns [chans x epochs x order]
 def mfcc(eegData, fs, order=2):
-    H = np.zeros((eegData.shape[0], eegData.shape[2], order))
-    for chan in range(H.shape[0]):
-        for epoch in range(H.shape[1]):
-            H[chan, epoch, :] = librosa.feature.mfcc(
-                y=np.asfortranarray(eegData[chan, :, epoch]), sr=fs
-            )[0:order].T
-    return H
+    n_chans, n_samples, n_epochs = eegData.shape
+    H = mfccFeatures(np.moveaxis(eegData, 2, 1).reshape(-1, n_samples), fs, order)
+    return H.reshape(n_chans, n_epochs, order)
 
 
 ##########
@@ -215,6 +383,62 @@ def hFD(a, k_max):  # Higuchi FD
     return p[0]
 
 
+##########
+# Higuchi FD of every row at once, same result as antropy.higuchi_fd (k from 1 to kmax, included)
+# 	xV: np array [... x ms], the FD is computed along the last axis
+# It's the same algorithm compiled with numba (as antropy does), but the loop over the rows is inside the kernel
+# instead of one Python call per row, and the rows are split between threads.
+def higuchiFD(xV, kmax=10):
+    xV = np.ascontiguousarray(xV, dtype=np.float64)
+    return _higuchiFD(xV.reshape(-1, xV.shape[-1]), int(kmax)).reshape(xV.shape[:-1])
+
+
+@njit(parallel=True, cache=True)
+def _higuchiFD(xV, kmax):
+    n_signals, n_times = xV.shape
+    x_reg = np.log(1.0 / np.arange(1, kmax + 1))
+    x_reg = x_reg - x_reg.mean()
+    out = np.empty(n_signals)
+    for row in prange(n_signals):
+        y_reg = np.empty(kmax)
+        for k in range(1, kmax + 1):
+            lk = 0.0
+            for m in range(k):
+                n_max = (n_times - 1 - m) // k
+                lm = 0.0
+                for j in range(1, n_max + 1):
+                    lm += abs(xV[row, m + j * k] - xV[row, m + (j - 1) * k])
+                lk += lm / n_max
+            # Mean over m of the normalised lengths, lm * (n_times - 1) / (k * n_max) / k
+            lk = lk * (n_times - 1) / (k**3)
+            y_reg[k - 1] = np.log(lk) if lk > 0 else -np.inf
+        # Slope of the least squares line of log(L(k)) against log(1/k)
+        out[row] = ((y_reg - y_reg.mean()) * x_reg).sum() / (x_reg * x_reg).sum()
+    return out
+
+
+##########
+# Sums of squares of the signal, its first difference and its second difference along axis, all the signals at once.
+# They are the moments the Hjorth parameters are made of, shared by hjorthParameters and get_features_probs.hjorth
+# 	dxV: first difference if it was already computed
+# 	pad_first_difference: the first difference starts with the first sample of the signal (as in pyeeg)
+def hjorthSquareSums(xV, axis=1, dxV=None, pad_first_difference=False):
+    xV = np.moveaxis(np.asarray(xV, dtype=np.float64), axis, -1)
+    if dxV is None:
+        dxV = np.diff(xV, axis=-1)
+    else:
+        dxV = np.moveaxis(np.asarray(dxV, dtype=np.float64), axis, -1)
+    if pad_first_difference:
+        dxV = np.concatenate([xV[..., :1], dxV], axis=-1)
+    ddxV = np.diff(dxV, axis=-1)
+    # einsum doesn't create the squared arrays
+    return (
+        np.einsum("...i,...i->...", xV, xV),
+        np.einsum("...i,...i->...", dxV, dxV),
+        np.einsum("...i,...i->...", ddxV, ddxV),
+    )
+
+
 ##########
 # Hjorth Mobility
 # Hjorth Complexity
@@ -223,12 +447,11 @@ def hFD(a, k_max):  # Higuchi FD
 # Assuming signals have mean 0
 # Mobility = sqrt( mean(dx^2) / mean(x^2) )
 def hjorthParameters(xV):
-    dxV = np.diff(xV, axis=1)
-    ddxV = np.diff(dxV, axis=1)
-
-    mx2 = np.mean(np.square(xV), axis=1)
-    mdx2 = np.mean(np.square(dxV), axis=1)
-    mddx2 = np.mean(np.square(ddxV), axis=1)
+    n = xV.shape[1]
+    sx2, sdx2, sddx2 = hjorthSquareSums(xV, axis=1)
+    mx2 = sx2 / n
+    mdx2 = sdx2 / (n - 1)
+    mddx2 = sddx2 / (n - 2)
 
     mob = mdx2 / mx2
     complexity = np.sqrt((mddx2 / mdx2) / mob)
@@ -239,94 +462,182 @@ def hjorthParameters(xV):
     return mobility, complexity
 
 
+##########
+# Biased autocovariance (divided by the number of samples) of each row, lags 0 to max_lag, from one zero-padded FFT
+# 	xV: 2D np array [n x samples]
+def autocovariance(xV, max_lag):
+    n_samples = xV.shape[1]
+    centered = xV - xV.mean(axis=1, keepdims=True)
+    n_fft = sp_fft.next_fast_len(2 * n_samples - 1, real=True)
+    spectra = np.fft.rfft(centered, n=n_fft, axis=1)
+    autocovariances = np.fft.irfft(np.abs(spectra) ** 2, n=n_fft, axis=1)
+    return autocovariances[:, : max_lag + 1] / n_samples
+
+
+##########
+# Time delay for the embeddings, first zero crossing of the autocorrelation of each row
+# 	xV: 2D np array [signals x ms]
+# The first minimum of the time-delayed mutual information was too noisy with the short epochs,
+# the autocorrelation of all the rows comes from one FFT.
+def embeddingDelay(xV, max_delay=200):
+    n_samples = xV.shape[1]
+    max_delay = max(1, min(max_delay, n_samples - 1))
+    crossed = autocovariance(xV, max_delay)[:, 1:] <= 0
+    # Rows that don't cross zero use max_delay
+    return np.where(crossed.any(axis=1), np.argmax(crossed, axis=1) + 1, max_delay)
+
+
 ##########
 # false nearest neighbor descriptor
-def falseNearestNeighbor(eegData, fast=True):
-    # Average Mutual Information
-    # There exist good arguments that if the time delayed mutual
-    # information exhibits a marked minimum at a certain value of tex2html_wrap_inline6553,
-    # then this is a good candidate for a reasonable time delay.
-    npts = 1000  # not sure about this?
-    maxdims = 50
-    max_delay = (
-        2  # max_delay = 200  # TODO: need to use 200, but also need to speed this up
+# 	eegData: 3D np array [chans x ms x epochs]
+# Minimum embedding dimension (Kennel et al., 1992). For each dimension d the delay embeddings of every signal are
+# built with stride tricks, and the nearest neighbour of each point is found with one cKDTree for all the signals
+# (each signal is moved far away from the others by an extra coordinate, and the neighbours of other signals are
+# dropped, so the result of a signal doesn't depend on the batch). The neighbour is false if adding the dimension d + 1 increases the distance more than distance_thresh
+# times, or if it gets further than attractor_thresh times the std of the signal. The result is the first dimension with less than false_fraction false neighbours, maxdims if none.
+# Only n_queries points of each signal look for their neighbour, all the points can be the neighbour.
+def falseNearestNeighbor(
+    eegData,
+    max_delay=200,
+    maxdims=10,
+    distance_thresh=10,
+    attractor_thresh=2,
+    false_fraction=0.1,
+    n_queries=100,
+):
+    xV = np.moveaxis(np.asarray(eegData, dtype=np.float64), 1, -1)
+    out = embeddingDimension(
+        xV.reshape(-1, xV.shape[-1]),
+        max_delay,
+        maxdims,
+        distance_thresh,
+        attractor_thresh,
+        false_fraction,
+        n_queries,
     )
-    distance_thresh = 0.5
+    return out.reshape(xV.shape[:-1]).astype(np.float64)
+
+
+# Same as falseNearestNeighbor for a 2D np array [signals x ms]
+def embeddingDimension(
+    xV,
+    max_delay=200,
+    maxdims=10,
+    distance_thresh=10,
+    attractor_thresh=2,
+    false_fraction=0.1,
+    n_queries=100,
+):
+    n_signals, n_samples = xV.shape
+    delays = embeddingDelay(xV, max_delay)
+    # The embeddings of maxdims + 1 dimensions must keep more than 2 * delay + 2 points, so each point has a
+    # neighbour of its own signal outside the Theiler window
+    delays = np.minimum(delays, max(1, (n_samples - 3) // (maxdims + 2)))
+    dimensions = np.full(n_signals, maxdims)
+    spread = np.ptp(xV) + 1
+    attractor_sizes = np.maximum(np.std(xV, axis=1), np.finfo(float).tiny)
+    for delay in np.unique(delays):
+        signals = np.flatnonzero(delays == delay)
+        n_points = n_samples - maxdims * delay
+        if n_points <= 2 * delay + 2:
+            continue  # Too short to embed, they keep maxdims
+        # [signals x points x maxdims + 1], y[s, t, d] = x[s, t + d * delay]
+        y = np.lib.stride_tricks.sliding_window_view(
+            xV[signals], maxdims * delay + 1, axis=1
+        )[:, :n_points, ::delay]
+        query_points = np.linspace(0, n_points - 1, min(n_queries, n_points)).astype(
+            np.int64
+        )
+        for d in range(1, maxdims):
+            # The signal index as an extra coordinate, further than any distance inside a signal
+            offsets = np.arange(len(signals)) * spread * np.sqrt(d + 1) * 2
+            points = np.concatenate(
+                [
+                    y[:, :, :d],
+                    np.broadcast_to(
+                        offsets[:, None, None], (len(signals), n_points, 1)
+                    ),
+                ],
+                axis=2,
+            ).reshape(-1, d + 1)
+            # The fraction of false neighbours is estimated from n_queries points of each signal.
+            # Their nearest neighbour must not be one of the points next to them in time (Theiler window of
+            # delay points). At most 2 * delay + 1 of the nearest points are inside the window, so one of the
+            # 2 * delay + 2 nearest (all of its own signal, n_points > 2 * delay + 2) is outside.
+            queries = (
+                np.arange(len(signals))[:, np.newaxis] * n_points + query_points
+            ).ravel()
+            distances, neighbours = cKDTree(points).query(
+                points[queries], k=2 * delay + 2, workers=-1
+            )
+            # cKDTree pads missing neighbours with len(points), never take them nor the ones of other signals
+            valid = (neighbours < len(points)) & (
+                neighbours // n_points == (queries // n_points)[:, np.newaxis]
+            )
+            first_outside = np.argmax(
+                valid & (np.abs(neighbours - queries[:, np.newaxis]) > delay), axis=1
+            )
+            rows = np.arange(len(queries))
+            distances = np.maximum(
+                distances[rows, first_outside], 0.0000001
+            )  # essentially 0 just silence the error
+            neighbours = neighbours[rows, first_outside]
+            next_coordinate = y[:, :, d].reshape(-1)
+            next_distances = np.abs(
+                next_coordinate[queries] - next_coordinate[neighbours]
+            )
+            # Second criterion of Kennel et al., the neighbour in d + 1 dimensions is far compared to the size
+            # of the attractor (the std of the signal), that's what happens with noise
+            false = (next_distances / distances > distance_thresh) | (
+                np.sqrt(np.square(distances) + np.square(next_distances))
+                / np.repeat(attractor_sizes[signals], len(query_points))
+                > attractor_thresh
+            )
+            settled = false.reshape(len(signals), -1).mean(axis=1) < false_fraction
+            dimensions[signals[settled]] = d
+            signals = signals[~settled]
+            y = y[~settled]
+            if len(signals) == 0:
+                break
+    return dimensions
 
-    out = np.zeros((eegData.shape[0], eegData.shape[2]))
-    for chan in range(eegData.shape[0]):
-        for epoch in range(eegData.shape[2]):
-            if fast:
-                out[chan, epoch] = 0
-            else:
-                cur_eegData = eegData[chan, :, epoch]
-                lagidx = 0  # we are looking for the index of the lag that makes the signal maximally uncorrelated to the original
-                # # minNMI = 1  # normed_mutual_info is from 1 (perfectly correlated) to 0 (not at all correlated)
-                # # for lag in range(1, max_delay):
-                # #     x = cur_eegData[:-lag]
-                # #     xlag = cur_eegData[lag:]
-                # #     # convert float data into histogram bins
-                # #     nbins = int(np.floor(1 + np.log2(len(x)) + 0.5))
-                # #     x_discrete = np.histogram(x, bins=nbins)[0]
-                # #     xlag_discrete = np.histogram(xlag, bins=nbins)[0]
-                # #     cNMI = normed_mutual_info(x_discrete, xlag_discrete)
-                # #     if cNMI < minNMI:
-                # #         minNMI = cNMI
-                # #         lagidx = lag
-                # nearest neighbors part
-                knn = int(
-                    max(2, 6 * lagidx)
-                )  # heuristic (number of nearest neighbors to look up)
-                m = 1  # lagidx + 1
-
-                # y is the embedded version of the signal
-                y = np.zeros((maxdims + 1, npts))
-                for d in range(maxdims + 1):
-                    tmp = cur_eegData[d * m : d * m + npts]
-                    y[d, : tmp.shape[0]] = tmp
-
-                nnd = np.ones((npts, maxdims))
-                nnz = np.zeros((npts, maxdims))
-
-                # see where it tends to settle
-                for d in range(1, maxdims):
-                    for k in range(0, npts):
-                        # get the distances to all points in the window (distance given embedding dimension)
-                        dists = []
-                        for nextpt in range(1, knn + 1):
-                            if k + nextpt < npts:
-                                dists.append(
-                                    np.linalg.norm(y[:d, k] - y[:d, k + nextpt])
-                                )
-                        if len(dists) > 0:
-                            minIdx = np.argmin(dists)
-                            if dists[minIdx] == 0:
-                                dists[minIdx] = (
-                                    0.0000001  # essentially 0 just silence the error
-                                )
-                            nnd[k, d - 1] = dists[minIdx]
-                            nnz[k, d - 1] = np.abs(
-                                y[d + 1, k] - y[d + 1, minIdx + 1 + k]
-                            )
-                # aggregate results
-                mindim = np.mean(nnz / nnd > distance_thresh, axis=0) < 0.1
-                # get the index of the first occurence of the value true
-                # (a 1 in the binary representation of true and false)
-                out[chan, epoch] = np.argmax(mindim)
 
-    return out
+##########
+# Yule-Walker AR coefficients of each row
+# 	xV: 2D np array [n x samples]
+# The Yule-Walker equations of all the rows are solved at once with the Levinson-Durbin recursion, from the biased
+# autocovariance (same as statsmodels yule_walker with method="mle"). x[t] = sum_k coefficients[k] * x[t - k - 1]
+# Returns [n x order] coefficients and the [n] variance of the innovations. Constant rows have 0 coefficients.
+def yuleWalker(xV, order=2):
+    xV = np.asarray(xV, dtype=np.float64)
+    order = min(order, xV.shape[1] - 1)
+    r = autocovariance(xV, order)
+    coefficients = np.zeros((xV.shape[0], order))
+    error = r[:, 0].copy()
+    valid = error > np.finfo(float).tiny
+    error[~valid] = 1
+    for k in range(order):
+        reflection = (
+            r[:, k + 1] - np.sum(coefficients[:, :k] * r[:, k:0:-1], axis=1)
+        ) / error
+        reflection[~valid] = 0
+        coefficients[:, :k] -= reflection[:, None] * coefficients[:, k - 1 :: -1][:, :k]
+        coefficients[:, k] = reflection
+        error *= 1 - reflection**2
+    error[~valid] = 0
+    return coefficients, error
 
 
 ##########
-# ARMA coefficients
+# AR coefficients (Yule-Walker) of each channel and epoch
+# 	eegData: 3D np array [chans x ms x epochs]
+# Returns [chans x epochs x order]
 def arma(eegData, order=2):
-    H = np.zeros((eegData.shape[0], eegData.shape[2], order))
-    for chan in range(H.shape[0]):
-        for epoch in range(H.shape[1]):
-            arma_mod = sm.tsa.ARMA(eegData[chan, :, epoch], order=(order, order))
-            arma_res = arma_mod.fit(trend="nc", disp=-1)
-            H[chan, epoch, :] = arma_res.arparams
-    return H
+    n_chans, n_samples, n_epochs = eegData.shape
+    coefficients, _ = yuleWalker(
+        np.moveaxis(eegData, 2, 1).reshape(-1, n_samples), order
+    )
+    return coefficients.reshape(n_chans, n_epochs, -1)
 
 
 ################################################
@@ -334,23 +645,60 @@ def arma(eegData, order=2):
 ################################################
 
 
+##########
+# Power spectral density, computed once and shared by the spectral features below
+# 	eegData: np array, the PSD is computed along axis (the time axis)
+# 	nperseg: None for the periodogram of the whole signal, otherwise Welch with segments of nperseg samples
+# The frequencies are in the last axis of the returned PSD
+def powerSpectrum(eegData, fs, axis=0, nperseg=None):
+    if nperseg is None:
+        freqs, powers = signal.periodogram(eegData, fs, axis=axis)
+    else:
+        freqs, powers = signal.welch(eegData, fs, nperseg=nperseg, axis=axis)
+    return freqs, np.moveaxis(powers, axis, -1)
+
+
+##########
+# Spectral features from a PSD of powerSpectrum, the bands are selected by masking the frequency bins
+# Band power, mean over all the bins of the PSD that is zero outside the band.
+# It replaces filtering the band and taking the mean of its periodogram.
+def psdBandPower(freqs, powers, lowcut, highcut):
+    band = (freqs >= lowcut) & (freqs <= highcut)
+    return np.sum(powers[..., band], axis=-1) / len(freqs)
+
+
+# α/δ Ratio
+def psdRatio(freqs, powers):
+    powers_alpha = psdBandPower(freqs, powers, 8, 12)  # alpha (8–12 Hz)
+    powers_delta = psdBandPower(freqs, powers, 0.5, 4)  # delta (0.5–4 Hz)
+    return powers_alpha / powers_delta
+
+
+# Frequency of the bin with the median power
+def psdMedianFreq(freqs, powers):
+    return freqs[np.argsort(powers, axis=-1)[..., powers.shape[-1] // 2]]
+
+
+# Spectral edge, frequency below which there is the edge fraction of the power
+def psdSpectralEdge(freqs, powers, edge=0.95):
+    cumulative_powers = np.cumsum(powers, axis=-1)
+    return freqs[
+        np.argmax(cumulative_powers >= edge * cumulative_powers[..., -1:], axis=-1)
+    ]
+
+
 ##########
 # median frequency
 def medianFreq(eegData, fs):
-    H = np.zeros((eegData.shape[0], eegData.shape[2]))
-    for chan in range(H.shape[0]):
-        freqs, powers = signal.periodogram(eegData[chan, :, :], fs, axis=0)
-        H[chan, :] = freqs[np.argsort(powers, axis=0)[len(powers) // 2]]
-    return H
+    freqs, powers = powerSpectrum(eegData, fs, axis=1)
+    return psdMedianFreq(freqs, powers)
 
 
 ##########
 # calculate band power
 def bandPower(eegData, lowcut, highcut, fs):
-    eegData_band = filt_data(eegData, lowcut, highcut, fs, order=7)
-    freqs, powers = signal.periodogram(eegData_band, fs, axis=0)
-    bandPwr = np.mean(powers, axis=0)
-    return bandPwr
+    freqs, powers = powerSpectrum(eegData, fs, axis=0)
+    return psdBandPower(freqs, powers, lowcut, highcut)
 
 
 ##########
@@ -363,9 +711,10 @@ def eegStd(eegData):
 ##########
 # α/δ Ratio
 def eegRatio(eegData, fs):
-    # calculate the power
-    powers_alpha = bandPower(eegData, 8, 12, fs)  # alpha (8–12 Hz)
-    powers_delta = bandPower(eegData, 0.5, 4, fs)  # delta (0.5–4 Hz)
+    # calculate the power, both bands from the same PSD
+    freqs, powers = powerSpectrum(eegData, fs, axis=0)
+    powers_alpha = psdBandPower(freqs, powers, 8, 12)  # alpha (8–12 Hz)
+    powers_delta = psdBandPower(freqs, powers, 0.5, 4)  # delta (0.5–4 Hz)
     ratio_res = np.sum(powers_alpha, axis=0) / np.sum(powers_delta, axis=0)
     return np.expand_dims(ratio_res, axis=0)
 
@@ -399,181 +748,166 @@ def eegVoltage(eegData, voltage=20):
 
 
 ##########
-# Spikes
-def spikeNum(eegData):
-    H = np.zeros((eegData.shape[0], eegData.shape[2]))
-    for chan in range(H.shape[0]):
-        for epoch in range(H.shape[1]):
-            mean = np.mean(eegData[chan, :, epoch])
-            std = np.std(eegData[chan, :, epoch])
-            H[chan, epoch] = len(
-                signal.find_peaks(
-                    abs(eegData[chan, :, epoch] - mean), 3 * std, epoch, width=7
-                )[0]
+# Spikes of all the channels and epochs at once
+# 	eegData: 3D np array [chans x ms x epochs]
+# The spikes are the peaks of abs(x - mean) higher than stdAway * std. Each row (chan * epochs + epoch) is divided by
+# its std and all the rows go to one find_peaks call, one after the other with a +inf sample between them: no peak
+# can be found in the separators (higher than the height range) and the prominences and widths of the peaks stop at
+# them, as they would at the borders of a single row. The spikes of width >= minNumSamples are the long spikes, the
+# narrower ones are the short (sharp) spikes.
+class SpikeDetection:
+    def __init__(self, eegData, minNumSamples=7, stdAway=3):
+        n_chans, n_samples, n_epochs = eegData.shape
+        self.shape = (n_chans, n_epochs)
+        self.n_samples = n_samples
+        xV = np.moveaxis(eegData, 2, 1).reshape(-1, n_samples)
+        std = np.maximum(np.std(xV, axis=1, keepdims=True), np.finfo(float).tiny)
+        separated = np.full((xV.shape[0], n_samples + 1), np.inf)
+        separated[:, :n_samples] = np.abs(xV - np.mean(xV, axis=1, keepdims=True)) / std
+        peaks, properties = signal.find_peaks(
+            separated.ravel(), height=(stdAway, np.finfo(float).max), width=1
+        )
+        self.rows, self.peaks = np.divmod(peaks, n_samples + 1)
+        self.long = properties["widths"] >= minNumSamples
+
+    def count(self, spikes):
+        return (
+            np.bincount(self.rows[spikes], minlength=np.prod(self.shape))
+            .reshape(self.shape)
+            .astype(np.float64)
+        )
+
+    # Number of long spikes and of short spikes
+    def counts(self):
+        return self.count(self.long), self.count(~self.long)
+
+    # Sum over the long spikes of the mean of eegData_subband in the samples [idx - 7, idx - 1) before the spike and
+    # [idx + 1, idx + 7) after it, from the cumulative sums of the rows. The windows are cut at the borders of the
+    # rows, the empty ones don't add anything.
+    def burstMeans(self, eegData_subband):
+        xV = np.moveaxis(eegData_subband, 2, 1).reshape(-1, self.n_samples)
+        cumsums = np.zeros((xV.shape[0], self.n_samples + 1))
+        np.cumsum(xV, axis=1, out=cumsums[:, 1:])
+        rows, peaks = self.rows[self.long], self.peaks[self.long]
+        means = []
+        for starts, ends in [(peaks - 7, peaks - 1), (peaks + 1, peaks + 7)]:
+            starts = np.clip(starts, 0, self.n_samples)
+            ends = np.clip(ends, 0, self.n_samples)
+            lengths = ends - starts
+            sums = cumsums[rows, ends] - cumsums[rows, starts]
+            window_means = np.divide(
+                sums, lengths, out=np.zeros(len(sums)), where=lengths > 0
             )
-    return H
+            means.append(
+                np.bincount(rows, window_means, minlength=np.prod(self.shape)).reshape(
+                    self.shape
+                )
+            )
+        preBurst, postBurst = means
+        return preBurst, postBurst
+
+    # Long and short spike counts, and the pre/post burst means of eegData_subband if given
+    def features(self, eegData_subband=None):
+        spikes, shortSpikes = self.counts()
+        if eegData_subband is None:
+            return spikes, shortSpikes
+        preBurst, postBurst = self.burstMeans(eegData_subband)
+        return spikes, shortSpikes, preBurst, postBurst
+
+
+##########
+# Spikes
+# 	spikeDetection: SpikeDetection of eegData, to share it between the spike features
+def spikeNum(eegData, minNumSamples=7, stdAway=3, spikeDetection=None):
+    if spikeDetection is None:
+        spikeDetection = SpikeDetection(eegData, minNumSamples, stdAway)
+    return spikeDetection.count(spikeDetection.long)
 
 
 ##########
 # Delta Burst after spike
-def burstAfterSpike(eegData, eegData_subband, minNumSamples=7, stdAway=3):
-    H = np.zeros((eegData.shape[0], eegData.shape[2]))
-    for chan in range(H.shape[0]):
-        for epoch in range(H.shape[1]):
-            preBurst = 0
-            postBurst = 0
-            mean = np.mean(eegData[chan, :, epoch])
-            std = np.std(eegData[chan, :, epoch])
-            idxList = signal.find_peaks(
-                abs(eegData[chan, :, epoch] - mean),
-                stdAway * std,
-                epoch,
-                width=minNumSamples,
-            )[0]
-            for idx in idxList:
-                preBurst += np.mean(eegData_subband[chan, idx - 7 : idx - 1, epoch])
-                postBurst += np.mean(eegData_subband[chan, idx + 1 : idx + 7, epoch])
-            H[chan, epoch] = postBurst - preBurst
-    return H
+def burstAfterSpike(
+    eegData, eegData_subband, minNumSamples=7, stdAway=3, spikeDetection=None
+):
+    if spikeDetection is None:
+        spikeDetection = SpikeDetection(eegData, minNumSamples, stdAway)
+    preBurst, postBurst = spikeDetection.burstMeans(eegData_subband)
+    return postBurst - preBurst
 
 
 ##########
 # Sharp spike
-def shortSpikeNum(eegData, minNumSamples=7, stdAway=3):
-    H = np.zeros((eegData.shape[0], eegData.shape[2]))
-    for chan in range(H.shape[0]):
-        for epoch in range(H.shape[1]):
-            mean = np.mean(eegData[chan, :, epoch])
-            std = np.std(eegData[chan, :, epoch])
-            longSpikes = set(
-                signal.find_peaks(
-                    abs(eegData[chan, :, epoch] - mean), 3 * std, epoch, width=7
-                )[0]
-            )
-            shortSpikes = set(
-                signal.find_peaks(
-                    abs(eegData[chan, :, epoch] - mean), 3 * std, epoch, width=1
-                )[0]
-            )
-            H[chan, epoch] = len(shortSpikes.difference(longSpikes))
-    return H
+def shortSpikeNum(eegData, minNumSamples=7, stdAway=3, spikeDetection=None):
+    if spikeDetection is None:
+        spikeDetection = SpikeDetection(eegData, minNumSamples, stdAway)
+    return spikeDetection.count(~spikeDetection.long)
 
 
 ##########
 # Number of Bursts
-def numBursts(eegData, fs):
-    bursts = []
-    supressions = []
-    for epoch in range(eegData.shape[2]):
-        epochBurst, epochSupressions = burst_supression_detection(
-            eegData[:, :, epoch], fs, suppression_threshold=10
-        )  # ,low=30,high=49)
-        bursts.append(epochBurst)
-        supressions.append(epochSupressions)
-    # Number of Bursts
-    numBursts_res = np.zeros((eegData.shape[0], eegData.shape[2]))
-    for chan in range(numBursts_res.shape[0]):
-        for epoch in range(numBursts_res.shape[1]):
-            numBursts_res[chan, epoch] = len(bursts[epoch][chan])
-    return numBursts_res
+# 	burstSuppression: BurstSuppression of eegData, to share it between the burst features
+def numBursts(eegData, fs, burstSuppression=None):
+    if burstSuppression is None:
+        burstSuppression = BurstSuppression(eegData, fs, suppression_threshold=10)
+    return burstSuppression.count(burstSuppression.bursts).astype(np.float64)
 
 
 ##########
 # Burst length μ and σ
-def burstLengthStats(eegData, fs):
-    bursts = []
-    supressions = []
-    for epoch in range(eegData.shape[2]):
-        epochBurst, epochSupressions = burst_supression_detection(
-            eegData[:, :, epoch], fs, suppression_threshold=10
-        )  # ,low=30,high=49)
-        bursts.append(epochBurst)
-        supressions.append(epochSupressions)
-    # Number of Bursts
-    burstMean_res = np.zeros((eegData.shape[0], eegData.shape[2]))
-    burstStd_res = np.zeros((eegData.shape[0], eegData.shape[2]))
-    for chan in range(burstMean_res.shape[0]):
-        for epoch in range(burstMean_res.shape[1]):
-            burstMean_res[chan, epoch] = np.mean(
-                [burst[1] - burst[0] for burst in bursts[epoch][chan]]
-            )
-            burstStd_res[chan, epoch] = np.std(
-                [burst[1] - burst[0] for burst in bursts[epoch][chan]]
-            )
-    burstMean_res = np.nan_to_num(burstMean_res)
-    burstStd_res = np.nan_to_num(burstStd_res)
-    return burstMean_res, burstStd_res
+def burstLengthStats(eegData, fs, burstSuppression=None):
+    if burstSuppression is None:
+        burstSuppression = BurstSuppression(eegData, fs, suppression_threshold=10)
+    return burstSuppression.lengthStats(burstSuppression.bursts)
 
 
 ##########
 # Burst band powers (δ, α, θ, β, γ)
-def burstBandPowers(eegData, lowcut, highcut, fs, order=7):
-    band_burst_powers = np.zeros((eegData.shape[0], eegData.shape[2]))
-    bursts = []
-    supressions = []
-    for epoch in range(eegData.shape[2]):
-        epochBurst, epochSupressions = burst_supression_detection(
-            eegData[:, :, epoch], fs, suppression_threshold=10
-        )  # ,low=30,high=49)
-        bursts.append(epochBurst)
-        supressions.append(epochSupressions)
+def burstBandPowers(eegData, lowcut, highcut, fs, order=7, burstSuppression=None):
+    if burstSuppression is None:
+        burstSuppression = BurstSuppression(eegData, fs, suppression_threshold=10)
     eegData_band = filt_data(eegData, lowcut, highcut, fs, order=7)
-    for epoch, epochBursts in enumerate(bursts):
-        for chan, chanBursts in enumerate(epochBursts):
-            epochPowers = []
-            for burst in chanBursts:
-                if burst[1] == eegData.shape[1]:
-                    burstData = eegData_band[:, burst[0] :, epoch]
-                else:
-                    burstData = eegData_band[:, burst[0] : burst[1], epoch]
-                freqs, powers = signal.periodogram(burstData, fs, axis=1)
-                epochPowers.append(np.mean(powers, axis=1))
-            band_burst_powers[chan, epoch] = np.mean(epochPowers)
-    return band_burst_powers
+    # The mean of the periodogram of x is len(x) * var(x) / (fs * (len(x) // 2 + 1)) (Parseval),
+    # so the power of every burst comes from cumulative sums instead of one periodogram per burst.
+    cumsum = np.zeros((eegData.shape[0], eegData.shape[1] + 1, eegData.shape[2]))
+    cumsum_squares = np.zeros_like(cumsum)
+    np.cumsum(eegData_band, axis=1, out=cumsum[:, 1:])
+    np.cumsum(np.square(eegData_band), axis=1, out=cumsum_squares[:, 1:])
+
+    rows, starts, ends = burstSuppression.bursts
+    ends = np.minimum(ends, eegData.shape[1])
+    epochs = rows % burstSuppression.shape[1]
+    lengths = ends - starts
+    sums = cumsum[:, ends, epochs] - cumsum[:, starts, epochs]
+    sums_squares = cumsum_squares[:, ends, epochs] - cumsum_squares[:, starts, epochs]
+    variances = np.maximum(sums_squares / lengths - np.square(sums / lengths), 0)
+    # Mean over the channels of each burst, then mean over the bursts of each channel and epoch
+    powers = np.mean(lengths * variances / (fs * (lengths // 2 + 1)), axis=0)
+    counts = np.bincount(rows, minlength=np.prod(burstSuppression.shape))
+    with np.errstate(invalid="ignore"):
+        band_burst_powers = np.bincount(rows, powers, minlength=len(counts)) / counts
+    return band_burst_powers.reshape(burstSuppression.shape)
 
 
 ##########
 # Number of Suppressions
-def numSuppressions(eegData, fs, suppression_threshold=10):
-    bursts = []
-    supressions = []
-    for epoch in range(eegData.shape[2]):
-        epochBurst, epochSupressions = burst_supression_detection(
-            eegData[:, :, epoch], fs, suppression_threshold=suppression_threshold
-        )  # ,low=30,high=49)
-        bursts.append(epochBurst)
-        supressions.append(epochSupressions)
-    numSupprs_res = np.zeros((eegData.shape[0], eegData.shape[2]))
-    for chan in range(numSupprs_res.shape[0]):
-        for epoch in range(numSupprs_res.shape[1]):
-            numSupprs_res[chan, epoch] = len(supressions[epoch][chan])
-    return numSupprs_res
+def numSuppressions(eegData, fs, suppression_threshold=10, burstSuppression=None):
+    if burstSuppression is None:
+        burstSuppression = BurstSuppression(
+            eegData, fs, suppression_threshold=suppression_threshold
+        )
+    return burstSuppression.count(burstSuppression.suppressions).astype(np.float64)
 
 
 ##########
 # Suppression length μ and σ
-def suppressionLengthStats(eegData, fs, suppression_threshold=10):
-    bursts = []
-    supressions = []
-    for epoch in range(eegData.shape[2]):
-        epochBurst, epochSupressions = burst_supression_detection(
-            eegData[:, :, epoch], fs, suppression_threshold=suppression_threshold
-        )  # ,low=30,high=49)
-        bursts.append(epochBurst)
-        supressions.append(epochSupressions)
-    supressionMean_res = np.zeros((eegData.shape[0], eegData.shape[2]))
-    supressionStd_res = np.zeros((eegData.shape[0], eegData.shape[2]))
-    for chan in range(supressionMean_res.shape[0]):
-        for epoch in range(supressionMean_res.shape[1]):
-            supressionMean_res[chan, epoch] = np.mean(
-                [suppr[1] - suppr[0] for suppr in supressions[epoch][chan]]
-            )
-            supressionStd_res[chan, epoch] = np.std(
-                [suppr[1] - suppr[0] for suppr in supressions[epoch][chan]]
-            )
-    supressionMean_res = np.nan_to_num(supressionMean_res)
-    supressionStd_res = np.nan_to_num(supressionStd_res)
-    return supressionMean_res, supressionStd_res
+def suppressionLengthStats(
+    eegData, fs, suppression_threshold=10, burstSuppression=None
+):
+    if burstSuppression is None:
+        burstSuppression = BurstSuppression(
+            eegData, fs, suppression_threshold=suppression_threshold
+        )
+    return burstSuppression.lengthStats(burstSuppression.suppressions)
 
 
 ################################################
@@ -581,25 +915,148 @@ def suppressionLengthStats(eegData, fs, suppression_threshold=10):
 ################################################
 
 
+##########
+# Connectivity of all the channel pairs at once
+# 	eegData: 3D np array [chans x ms x epochs]
+# 	pairs: [pairs x 2] channel indices, all the combinations of 2 channels by default
+# 	fs: sampling rate, with the default 1 the lags are in samples
+# The FFT of each channel is computed once and shared by every pair. The features are (pairs, epochs) arrays,
+# with the pairs in the order of self.pairs. The pairs are processed in chunks of at most chunk_values values
+# (pairs x epochs x samples of each intermediate array) to limit memory, whatever the number of epochs.
+class ChannelPairConnectivity:
+    def __init__(self, eegData, fs=1, pairs=None, chunk_values=2**24):
+        self.data = np.moveaxis(np.asarray(eegData, dtype=np.float64), 1, -1)
+        self.fs = fs
+        if pairs is None:
+            pairs = list(itertools.combinations(range(eegData.shape[0]), 2))
+        self.pairs = np.array(pairs, dtype=np.int64).reshape(-1, 2)
+        self.chunk_values = chunk_values
+
+    # samples: length of each pair and epoch in the intermediate arrays
+    def pairChunks(self, samples):
+        pair_chunk_size = max(1, self.chunk_values // (self.data.shape[1] * samples))
+        for start in range(0, len(self.pairs), pair_chunk_size):
+            chunk = self.pairs[start : start + pair_chunk_size]
+            yield slice(start, start + len(chunk)), chunk[:, 0], chunk[:, 1]
+
+    # Cross-spectral densities [freqs x epochs x pairs] of self.pairs and power spectral densities
+    # [freqs x epochs x chans] of the bins between lowcut and highcut, only the requested pairs are computed.
+    # Same Welch estimate as signal.csd(..., nfft=n_samples) (hann segments of 256 samples with half overlap),
+    # without the scaling, which cancels in the coherence.
+    def crossSpectra(self, lowcut, highcut, nperseg=256):
+        n_samples = self.data.shape[-1]
+        nperseg = min(nperseg, n_samples)
+        step = nperseg - nperseg // 2
+        n_segments = (n_samples - nperseg // 2) // step
+        segments = np.lib.stride_tricks.sliding_window_view(
+            self.data, nperseg, axis=-1
+        )[:, :, ::step][:, :, :n_segments]
+        segments = segments - segments.mean(axis=-1, keepdims=True)
+        freqs = np.fft.rfftfreq(n_samples, 1 / self.fs)
+        band = (freqs >= lowcut) & (freqs <= highcut)
+        spectra = np.fft.rfft(
+            segments * signal.get_window("hann", nperseg), n=n_samples, axis=-1
+        )[..., band]
+        psd = np.einsum("cesf->fec", np.abs(spectra) ** 2) / n_segments
+        csd = np.zeros(
+            (spectra.shape[-1], self.data.shape[1], len(self.pairs)), complex
+        )
+        for chunk, ii, jj in self.pairChunks(n_segments * spectra.shape[-1]):
+            csd[..., chunk] = (
+                np.einsum("pesf,pesf->fep", np.conj(spectra[ii]), spectra[jj])
+                / n_segments
+            )
+        return freqs[band], csd, psd
+
+    # Coherence - δ, mean of the coherence over the bins between lowcut and highcut
+    def coherence(self, lowcut=0.5, highcut=4):
+        _, csd, psd = self.crossSpectra(lowcut, highcut)
+        ii, jj = self.pairs[:, 0], self.pairs[:, 1]
+        Cxy = np.abs(csd) ** 2 / (psd[..., ii] * psd[..., jj])
+        return np.mean(Cxy, axis=0).T
+
+    # Cross-correlation magnitude, (max - mean) / std of the absolute full cross-correlation,
+    # and Cross-correlation lag, time in seconds of its maximum (positive if the first channel is delayed).
+    def crossCorrelation(self):
+        n_samples = self.data.shape[-1]
+        n_fft = sp_fft.next_fast_len(2 * n_samples - 1, real=True)
+        spectra = np.fft.rfft(self.data, n=n_fft, axis=-1)
+        magnitude = np.zeros((len(self.pairs), self.data.shape[1]))
+        lag = np.zeros_like(magnitude)
+        for chunk, ii, jj in self.pairChunks(n_fft):
+            ccor = np.fft.irfft(spectra[ii] * np.conj(spectra[jj]), n=n_fft, axis=-1)
+            # Same order as np.correlate(x, y, mode="full"), lags from -(n_samples - 1) to n_samples - 1
+            absccor = np.abs(
+                np.concatenate(
+                    [ccor[..., n_fft - n_samples + 1 :], ccor[..., :n_samples]],
+                    axis=-1,
+                )
+            )
+            magnitude[chunk] = (
+                np.max(absccor, axis=-1) - np.mean(absccor, axis=-1)
+            ) / np.std(absccor, axis=-1)
+            lag[chunk] = (np.argmax(absccor, axis=-1) - (n_samples - 1)) / self.fs
+        return magnitude, lag
+
+    # Mutual information of the 2D histograms, same as mutual_info_score of np.histogram2d in calculate2Chan_MI.
+    # Each channel is binned once, then only the non-empty cells of each joint histogram are counted.
+    def mutualInformation(self, bin_min=-200, bin_max=200, binWidth=2):
+        edges = np.arange(bin_min + 1, bin_max, binWidth)
+        n_bins = len(edges) - 1
+        indices, inside = binIndices(self.data, edges)
+        n_epochs, n_samples = self.data.shape[1:]
+        mi = np.zeros((len(self.pairs), n_epochs))
+        for chunk, ii, jj in self.pairChunks(n_samples):
+            valid = inside[ii] & inside[jj]
+            histograms = np.arange(len(ii) * n_epochs).reshape(len(ii), n_epochs, 1)
+            cells, counts = np.unique(
+                ((histograms * n_bins + indices[ii]) * n_bins + indices[jj])[valid],
+                return_counts=True,
+            )
+            histogram, row_cell = np.divmod(cells, n_bins * n_bins)
+            row, col = np.divmod(row_cell, n_bins)
+            # Marginals of each histogram, from its own cells as the contingency sums
+            total = np.bincount(histogram, counts, minlength=len(ii) * n_epochs)
+            _, row_inverse = np.unique(histogram * n_bins + row, return_inverse=True)
+            _, col_inverse = np.unique(histogram * n_bins + col, return_inverse=True)
+            pi = np.bincount(row_inverse, counts)[row_inverse]
+            pj = np.bincount(col_inverse, counts)[col_inverse]
+            contingency_sum = total[histogram]
+            contingency_nm = counts / contingency_sum
+            cell_mi = contingency_nm * (
+                np.log(counts) - np.log(pi * pj) + np.log(contingency_sum)
+            )
+            cell_mi[np.abs(cell_mi) < np.finfo(cell_mi.dtype).eps] = 0
+            mi[chunk] = np.clip(
+                np.bincount(histogram, cell_mi, minlength=len(ii) * n_epochs),
+                0,
+                None,
+            ).reshape(len(ii), n_epochs)
+        return mi
+
+    # All the pair features, name -> (pairs, epochs)
+    def features(self):
+        magnitude, lag = self.crossCorrelation()
+        return {
+            "coherence_delta": self.coherence(),
+            "cross_correlation_magnitude": magnitude,
+            "cross_correlation_lag": lag,
+            "mutual_information": self.mutualInformation(),
+        }
+
+
 ##########
 # Coherence - δ
 def coherence(eegData, fs):
-    coh_res = []
-    for ii, jj in itertools.combinations(range(eegData.shape[0]), 2):
-        coh_res.append(CoherenceDelta(eegData, ii, jj, fs=fs))
-    coh_res = np.array(coh_res)
-    return coh_res
+    return ChannelPairConnectivity(eegData, fs).coherence()
 
 
 ##########
 # Mutual information
 def calculate2Chan_MI(eegData, ii, jj, bin_min=-200, bin_max=200, binWidth=2):
-    H = np.zeros(eegData.shape[2])
-    bins = np.arange(bin_min + 1, bin_max, binWidth)
-    for epoch in range(eegData.shape[2]):
-        c_xy = np.histogram2d(eegData[ii, :, epoch], eegData[jj, :, epoch], bins)[0]
-        H[epoch] = mutual_info_score(None, None, contingency=c_xy)
-    return H
+    return ChannelPairConnectivity(eegData, pairs=[(ii, jj)]).mutualInformation(
+        bin_min, bin_max, binWidth
+    )[0]
 
 
 ##########
@@ -616,19 +1073,13 @@ def calcGrangerCausality(eegData, ii, jj):
 
 ##########
 # Cross-correlation Magnitude
-def crossCorrMag(eegData, ii, jj):
-    crossCorr_res = []
-    for ii, jj in itertools.combinations(range(eegData.shape[0]), 2):
-        crossCorr_res.append(crossCorrelation(eegData, ii, jj))
-    crossCorr_res = np.array(crossCorr_res)
-    return crossCorr_res
+def crossCorrMag(eegData, ii=None, jj=None):
+    # ii and jj are not used, all the pairs are computed
+    return ChannelPairConnectivity(eegData).crossCorrelation()[0]
 
 
 ##########
 # Cross-correlation Lag
-def corrCorrLag(eegData, ii, jj, fs=100):
-    crossCorrLag_res = []
-    for ii, jj in itertools.combinations(range(eegData.shape[0]), 2):
-        crossCorrLag_res.append(corrCorrLag(eegData, ii, jj, fs))
-    crossCorrLag_res = np.array(crossCorrLag_res)
-    return crossCorrLag_res
+def corrCorrLag(eegData, ii=None, jj=None, fs=100):
+    # ii and jj are not used, all the pairs are computed
+    return ChannelPairConnectivity(eegData, fs).crossCorrelation()[1]
@@ -1,12 +1,12 @@
 import time
+from collections import OrderedDict
+from typing import Optional
 
-import antropy as ant
 import features_extraction.EEGExtract as eeg
-import mne
-import numpy
 import numpy as np
 import pandas as pd
-from data_loaders import load_data_labels_based_on_dataset
+from data_cache import array_fingerprint
+from data_loaders import load_subjects
 from data_utils import (
     ClfSwitcher,
     convert_into_independent_channels,
@@ -15,7 +15,9 @@ from data_utils import (
     get_input_data_path,
     standard_saving_path,
 )
-from scipy import signal
+from feature_matrix import FeatureMatrix
+from filter_bank import get_filter_bank
+from joblib import Parallel, delayed, effective_n_jobs
 from scipy.stats import kurtosis, skew
 from share import datasets_basic_infos
 from sklearn.model_selection import StratifiedKFold
@@ -25,85 +27,78 @@ from sklearn.pipeline import Pipeline
 
 
 def get_entropy(data):
-    entropy_trial = []
-    for data_trial in data:
-        entropy_trial.append(ant.higuchi_fd(data_trial))
-    return entropy_trial
+    # Higuchi FD of all the rows at once, same values as antropy.higuchi_fd
+    return eeg.higuchiFD(data)
 
 
 def hjorth(X, D=None):
-    """Compute Hjorth mobility and complexity of a time series from either two
+    """Compute Hjorth mobility and complexity of time series from either two
     cases below:
-        1. X, the time series of type list (default)
-        2. D, a first order differential sequence of X (if D is provided,
+        1. X, the time series, one per row if it's a (n, samples) array
+        2. D, first order differential sequences of X (if D is provided,
            recommended to speed up)
 
     In case 1, D is computed using Numpy's Difference function.
 
-    Notes
-    -----
-    To speed up, it is recommended to compute D before calling this function
-    because D may also be used by other functions whereas computing it here
-    again will slow down.
+    All the rows are computed at once by EEGExtract.hjorthSquareSums.
 
     Parameters
     ----------
 
     X
-        list
+        array-like (samples,) or (n, samples)
 
-        a time series
+        the time series
 
     D
-        list
+        array-like (samples - 1,) or (n, samples - 1)
 
-        first order differential sequence of a time series
+        first order differential sequences of the time series
 
     Returns
     -------
 
-    As indicated in return line
-
-    Hjorth mobility and complexity
+    Hjorth mobility and complexity, arrays with one value per time series
 
     """
+    X = np.asarray(X, dtype=np.float64)
+    n = X.shape[-1]
 
-    if D is None:
-        D = numpy.diff(X)
-        D = D.tolist()
-
-    D.insert(0, X[0])  # pad the first difference
-    D = numpy.array(D)
-
-    n = len(X)
-
-    M2 = float(sum(D**2)) / n
-    TP = sum(numpy.array(X) ** 2)
-    M4 = 0
-    for i in range(1, len(D)):
-        M4 += (D[i] - D[i - 1]) ** 2
+    # The first difference is padded with the first sample
+    TP, D2, M4 = eeg.hjorthSquareSums(X, axis=-1, dxV=D, pad_first_difference=True)
+    M2 = D2 / n
     M4 = M4 / n
 
-    return numpy.sqrt(M2 / TP), numpy.sqrt(
-        float(M4) * TP / M2 / M2
+    return np.sqrt(M2 / TP), np.sqrt(
+        M4 * TP / M2 / M2
     )  # Hjorth Mobility and Complexity
 
 
 def get_hjorth(data):
-    Mobility_trial = []
-    Complexity_trial = []
-    for data_trial in data:
-        Mobility, Complexity = hjorth(data_trial)
-        Mobility_trial.append(Mobility)
-        Complexity_trial.append(Complexity)
-    return Mobility_trial, Complexity_trial
+    return hjorth(data)
 
 
 def get_ratio(data, Fs):
-    ratio_trial = []
-    for data_trial in data:
-        ratio_trial.append(eeg.eegRatio(data_trial, fs=Fs))
-    return ratio_trial
+    # One periodogram per row, alpha and delta powers are taken from it
+    freqs, powers = eeg.powerSpectrum(data, Fs, axis=-1)
+    return eeg.psdRatio(freqs, powers)[:, np.newaxis]
+
+
+def get_false_nearest_neighbor(data):
+    # Minimum embedding dimension of each row, KD-tree false nearest neighbours
+    return eeg.embeddingDimension(data)
+
+
+def get_autoregressive(data, order=2):
+    # Yule-Walker AR coefficients of each row, [rows x order]
+    coefficients, _ = eeg.yuleWalker(data, order)
+    return coefficients
+
+
+def get_mfcc(data, Fs, order=2):
+    # Cepstral coefficients of each row averaged over the frames, [rows x order]. The STFT is sized for the EEG
+    # trials (about 1 s windows), not for the librosa audio defaults.
+    return eeg.mfccFeatures(data, Fs, n_mfcc=order, n_fft=256, hop_length=64, n_mels=40)
 
 
 def get_lyapunov(data):
@@ -112,7 +107,38 @@ def get_lyapunov(data):
     return lyapunov_values
 
 
-def by_frequency_band(data, dataset_info: dict):
+# Features computed by get_extractions, in the order of the columns
+EXTRACTIONS: tuple = (
+    "entropy",
+    "hjorth",
+    "ratio",
+    "lyapunov",
+    "false_nearest_neighbor",
+    "autoregressive",
+    "mfcc",
+    "std",
+    "mean",
+    "kurtosis",
+    "skew",
+    "variance",
+)
+
+
+def get_frequency_ranges(sample_rate: float) -> dict:
+    return {
+        "delta": [0, 3],
+        "theta": [3, 7],
+        "alpha": [7, 13],
+        "beta 1": [13, 16],
+        "beta 2": [16, 20],
+        "beta 3": [20, 35],
+        "gamma": [35, np.floor(sample_rate / 2) - 1],
+    }
+
+
+def by_frequency_band(
+    data, dataset_info: dict, filtered_by_band=None, extractions: tuple = EXTRACTIONS
+):
     """
     This code contains functions for feature extraction from EEG data and classification of brain activity.
 
@@ -121,91 +147,241 @@ def by_frequency_band(data, dataset_info: dict):
     data
     Gets converted from [epochs, chans, ms] to [chans x ms x epochs] # Todo: it got like 1, 2, 0: but I think it should be 0, 2, 1
     dataset_info
+    filtered_by_band: (bands, epochs, chans, samples) data already split with the bands of get_frequency_ranges,
+    e.g. from StreamingFilterBank.get_window in the live sessions. If None, data is filtered offline (zero-phase).
+    extractions: features computed for each band, see get_extractions.
 
     Returns
     -------
-
+    FeatureMatrix, one row per row of data and the get_extractions columns of the complete signal and each band.
     """
-    frequency_ranges: dict = {
-        "delta": [0, 3],
-        "theta": [3, 7],
-        "alpha": [7, 13],
-        "beta 1": [13, 16],
-        "beta 2": [16, 20],
-        "beta 3": [20, 35],
-        "gamma": [35, np.floor(dataset_info["sample_rate"] / 2) - 1],
-    }
-    features_df = get_extractions(data, dataset_info, "complete")
-    for frequency_bandwidth_name, frequency_bandwidth in frequency_ranges.items():
-        print(frequency_bandwidth)
-        iir_params = dict(order=8, ftype="butter")
-        filt = mne.filter.create_filter(
-            data,
-            dataset_info["sample_rate"],
-            l_freq=frequency_bandwidth[0],
-            h_freq=frequency_bandwidth[1],
-            method="iir",
-            iir_params=iir_params,
-            verbose=True,
-        )
-        filtered = signal.sosfiltfilt(filt["sos"], data)
-        filtered = filtered.astype("float64")
-        features_array_ind = get_extractions(
-            filtered, dataset_info, frequency_bandwidth_name
+    frequency_ranges: dict = get_frequency_ranges(dataset_info["sample_rate"])
+    features = get_extractions(data, dataset_info, "complete", extractions=extractions)
+    if filtered_by_band is None:
+        filtered_by_band = get_filter_bank(
+            dataset_info["sample_rate"], frequency_ranges
+        ).apply(data)
+    for frequency_bandwidth_name, filtered in zip(frequency_ranges, filtered_by_band):
+        get_extractions(
+            filtered, dataset_info, frequency_bandwidth_name, features, extractions
         )
-        features_df = pd.concat([features_df, features_array_ind], axis=1)
-    return features_df
+    return features
 
 
-def get_extractions(data, dataset_info: dict, frequency_bandwidth_name):
+def trials_by_frequency_band(
+    data, dataset_info: dict, extractions: tuple = EXTRACTIONS
+) -> FeatureMatrix:
+    """
+    by_frequency_band of each channel of each trial on its own, one row per channel of each trial.
+
+    Parameters
+    ----------
+    data: [epochs, chans, samples]
+    """
+    data_independent_channels, _ = convert_into_independent_channels(
+        data, np.zeros(len(data))
+    )
+    return by_frequency_band(
+        data_independent_channels, dataset_info, extractions=extractions
+    )
+
+
+def _by_frequency_band_of_trials(
+    data, dataset_info: dict, extractions: tuple
+) -> tuple[np.ndarray, list]:
+    features = trials_by_frequency_band(data, dataset_info, extractions)
+    return features.array.reshape(len(data), data.shape[1], -1), features.columns
+
+
+def features_configuration(dataset_info: dict, extractions: tuple) -> tuple:
+    """
+    What the features of a trial depend on besides its data: the sample rate, the frequency bands and the
+    extractions.
+    """
+    return (
+        dataset_info["sample_rate"],
+        tuple(
+            (band, tuple(float(limit) for limit in frequency_range))
+            for band, frequency_range in get_frequency_ranges(
+                dataset_info["sample_rate"]
+            ).items()
+        ),
+        tuple(extractions),
+    )
+
+
+class TrialFeaturesCache:
+    """
+    trials_by_frequency_band features of every trial, computed only once.
+
+    The EEGExtract features are unsupervised and each channel of a trial is processed on its own, so the features of
+    a trial don't depend on the other trials of the fold. Each trial is keyed by the features_configuration and the
+    fingerprint of its data, so the folds of a cross-validation only compute the trials they haven't seen before
+    and slice the rest from the cache.
+
+    It's meant for training, the trials of the real-time sessions are never seen twice: use trials_by_frequency_band.
+
+    Parameters
+    ----------
+    max_trials: trials kept, the least recently used ones are dropped first.
+    """
+
+    def __init__(self, max_trials: int = 10000):
+        self.max_trials = max_trials
+        # (configuration, trial fingerprint) -> [chans x features]
+        self.features: OrderedDict = OrderedDict()
+        self.columns: dict = {}  # configuration -> columns
+
+    def clear(self):
+        self.features.clear()
+        self.columns.clear()
+
+    def by_frequency_band(
+        self,
+        data,
+        dataset_info: dict,
+        n_jobs: int = -1,
+        extractions: tuple = EXTRACTIONS,
+    ):
+        """
+        Same output as trials_by_frequency_band(data), one row per channel of each trial.
+
+        Parameters
+        ----------
+        data: [epochs, chans, samples]
+        dataset_info
+        n_jobs: processes used for the trials that are not in the cache yet.
+        extractions
+        """
+        configuration = features_configuration(dataset_info, extractions)
+        keys = [(configuration, array_fingerprint(trial)) for trial in data]
+        missing = list(
+            {
+                key: i_trial
+                for i_trial, key in enumerate(keys)
+                if key not in self.features
+            }.items()
+        )
+        trial_features = {
+            key: self.features[key] for key in keys if key in self.features
+        }
+        for key in trial_features:
+            self.features.move_to_end(key)
+        if missing:
+            missing_trials = data[[i_trial for _, i_trial in missing]]
+            n_jobs = min(effective_n_jobs(n_jobs), len(missing_trials))
+            if n_jobs == 1:
+                computed = [
+                    _by_frequency_band_of_trials(
+                        missing_trials, dataset_info, extractions
+                    )
+                ]
+            else:
+                computed = Parallel(n_jobs=n_jobs)(
+                    delayed(_by_frequency_band_of_trials)(
+                        trials, dataset_info, extractions
+                    )
+                    for trials in np.array_split(missing_trials, n_jobs)
+                )
+            self.columns[configuration] = computed[0][1]
+            for (key, _), features in zip(
+                missing, np.concatenate([features for features, _ in computed])
+            ):
+                trial_features[key] = features
+                self.features[key] = features
+            while len(self.features) > self.max_trials:
+                self.features.popitem(last=False)
+
+        columns = self.columns[configuration]
+        features = FeatureMatrix(len(keys) * data.shape[1], len(columns))
+        features.add(columns, np.concatenate([trial_features[key] for key in keys]))
+        return features
+
+
+# Shared by the __main__ and feature_extraction_function.train, trials already seen by any of them are not computed
+# again
+trial_features_cache = TrialFeaturesCache()
+
+
+def get_extractions(
+    data,
+    dataset_info: dict,
+    frequency_bandwidth_name,
+    features: FeatureMatrix = None,
+    extractions: tuple = EXTRACTIONS,
+) -> FeatureMatrix:
+    """
+    Features of each row of data, added to features (a new FeatureMatrix if None) with the columns
+    f"{frequency_bandwidth_name}_{feature}".
+
+    extractions: the ones of EXTRACTIONS to compute.
+    """
     # To use EEGExtract, the data must be [chans x ms x epochs]
-    entropy_values = np.array(get_entropy(data))
-    Mobility_values, Complexity_values = get_hjorth(data)
-    ratio_values = np.array(get_ratio(data, dataset_info["sample_rate"])).transpose()[
-        0
-    ]  # α/δ Ratio
-    lyapunov_values = np.array(get_lyapunov(data)[0])
-    std_values = eeg.eegStd(data)
-    mean_values = np.mean(data, axis=1)
-    kurtosis_values = kurtosis(data, axis=1, bias=True)
-    skew_values = skew(data, axis=1, bias=True)
-    variance_values = np.var(data, axis=1)
-
-    feature_array = [
-        entropy_values,
-        np.array(Mobility_values),
-        np.array(Complexity_values),
-        ratio_values,
-        lyapunov_values,
-        std_values,
-        mean_values,
-        kurtosis_values,
-        skew_values,
-        variance_values,
-    ]
+    feature_array: list = []
+    column_name: list = []
+    if "entropy" in extractions:
+        feature_array.append(np.array(get_entropy(data)))
+        column_name.append("entropy_values")
+    if "hjorth" in extractions:
+        Mobility_values, Complexity_values = get_hjorth(data)
+        feature_array += [np.array(Mobility_values), np.array(Complexity_values)]
+        column_name += ["Mobility_values", "Complexity_values"]
+    if "ratio" in extractions:
+        feature_array.append(
+            np.array(get_ratio(data, dataset_info["sample_rate"])).transpose()[0]
+        )  # α/δ Ratio
+        column_name.append("ratio")
+    if "lyapunov" in extractions:
+        feature_array.append(np.array(get_lyapunov(data)[0]))
+        column_name.append("lyapunov")
+    if "false_nearest_neighbor" in extractions:
+        feature_array.append(get_false_nearest_neighbor(data))
+        column_name.append("false_nearest_neighbor")
+    if "autoregressive" in extractions:
+        autoregressive_values = get_autoregressive(data)
+        feature_array += list(autoregressive_values.T)
+        column_name += [
+            f"autoregressive_{num}" for num in range(autoregressive_values.shape[1])
+        ]
+    if "mfcc" in extractions:
+        mfcc_values = get_mfcc(data, dataset_info["sample_rate"])
+        feature_array += list(mfcc_values.T)
+        column_name += [f"mfcc_{num}" for num in range(mfcc_values.shape[1])]
+    if "std" in extractions:
+        feature_array.append(eeg.eegStd(data))
+        column_name.append("std_values")
+    if "mean" in extractions:
+        feature_array.append(np.mean(data, axis=1))
+        column_name.append("mean_values")
+    if "kurtosis" in extractions:
+        feature_array.append(kurtosis(data, axis=1, bias=True))
+        column_name.append("kurtosis_values")
+    if "skew" in extractions:
+        feature_array.append(skew(data, axis=1, bias=True))
+        column_name.append("skew_values")
+    if "variance" in extractions:
+        feature_array.append(np.var(data, axis=1))
+        column_name.append("variance_values")
 
     # feature_array[np.isfinite(feature_array) == False] = 0
 
-    column_name = [
-        f"{frequency_bandwidth_name}_entropy_values",
-        f"{frequency_bandwidth_name}_Mobility_values",
-        f"{frequency_bandwidth_name}_Complexity_values",
-        f"{frequency_bandwidth_name}_ratio",
-        f"{frequency_bandwidth_name}_lyapunov",
-        f"{frequency_bandwidth_name}_std_values",
-        f"{frequency_bandwidth_name}_mean_values",
-        f"{frequency_bandwidth_name}_kurtosis_values",
-        f"{frequency_bandwidth_name}_skew_values",
-        f"{frequency_bandwidth_name}_variance_values",
-    ]
-
-    feature_df = pd.DataFrame(feature_array).transpose()
-    feature_df.columns = column_name
+    column_name = [f"{frequency_bandwidth_name}_{name}" for name in column_name]
 
-    return feature_df
+    if features is None:
+        features = FeatureMatrix(len(data), len(column_name))
+    features.add(column_name, np.column_stack(feature_array))
+    return features
 
 
-def extractions_train(features_df, labels):
+def extractions_train(
+    features: FeatureMatrix,
+    labels,
+    search: str = "grid",
+    time_budget: Optional[float] = None,
+):
+    """
+    search, time_budget: classifier search, see get_best_classificator_and_test_accuracy.
+    """
     # So far, it works slightly better if all features are given
     # X_SelectKBest = SelectKBest(f_classif, k=50)
     # X_new = X_SelectKBest.fit_transform(features_df, labels)
@@ -213,25 +389,29 @@ def extractions_train(features_df, labels):
     # features_df = pd.DataFrame(X_new, columns=columns_list)
 
     classifier, acc = get_best_classificator_and_test_accuracy(
-        features_df, labels, Pipeline([("clf", ClfSwitcher())])
+        features.array,
+        labels,
+        Pipeline([("clf", ClfSwitcher())]),
+        search=search,
+        time_budget=time_budget,
     )
     return classifier, acc  # , columns_list
 
 
-def extractions_test(clf, features_df):
+def extractions_test(clf, features: FeatureMatrix):
     """
     This is what the real-time BCI will call.
     Parameters
     ----------
     clf : classifier trained for the specific subject
-    features_df: features extracted from the data
+    features: features extracted from the data, one row per channel
 
     Returns Array of classification with 4 floats representing the target classification
     -------
 
     """
 
-    array = clf.predict_proba(features_df)
+    array = clf.predict_proba(features.array)
     array = np.asarray([np.nanmean(array, axis=0)])  # Mean over columns
     return array
 
@@ -256,16 +436,19 @@ if __name__ == "__main__":
         mean_accuracy_per_subject: list = []
         results_df = pd.DataFrame()
 
-        for subject_id in range(29, 30):
+        for subject_id, data_original, labels_original in load_subjects(
+            dataset_info, range(29, 30), data_path
+        ):  # The next subjects are loaded while this one is trained
             print(subject_id)
             with open(
                 saving_txt_path,
                 "a",
             ) as f:
                 f.write(f"Subject: {subject_id}\n\n")
-            epochs, data_original, labels_original = load_data_labels_based_on_dataset(
-                dataset_info, subject_id, data_path
-            )
+
+            # The features of each trial are computed by the first training fold that has it, the next folds take
+            # their slices. The test trials are computed as in the real-time sessions, inside the testing time.
+            trial_features_cache.clear()
 
             # Do cross-validation
             cv = StratifiedKFold(n_splits=10, shuffle=True, random_state=42)
@@ -278,10 +461,12 @@ if __name__ == "__main__":
                     "******************************** Training ********************************"
                 )
                 start = time.time()
-                data_train, labels_train = convert_into_independent_channels(
-                    data_original[train], labels_original[train]
+                features_train = trial_features_cache.by_frequency_band(
+                    data_original[train], dataset_info
+                )
+                labels_train = np.repeat(
+                    labels_original[train], data_original.shape[1], axis=0
                 )
-                features_train = by_frequency_band(data_train, dataset_info)
                 clf, accuracy = extractions_train(features_train, labels_train)
                 training_time.append(time.time() - start)
                 with open(
@@ -297,20 +482,11 @@ if __name__ == "__main__":
 
                 for epoch_number in test:
                     start = time.time()
-                    # Convert independent channels to pseudo-trials
-                    data_test, labels_test = convert_into_independent_channels(
-                        np.asarray([data_original[epoch_number]]),
-                        labels_original[epoch_number],
+                    # One pseudo-trial per channel, extractions_test does the mean over them
+                    features_test = trials_by_frequency_band(
+                        np.asarray([data_original[epoch_number]]), dataset_info
                     )
-
-                    probs_by_channel = []
-                    for pseudo_trial in range(len(data_test)):
-                        features_test = by_frequency_band(
-                            np.asarray([data_test[pseudo_trial]]), dataset_info
-                        )
-                        array = extractions_test(clf, features_test)  # [columns_list])
-                        probs_by_channel.append(array)
-                    array = np.nanmean(probs_by_channel, axis=0)  # Mean over columns
+                    array = extractions_test(clf, features_test)  # [columns_list])
                     end = time.time()
 
                     testing_time.append(end - start)
@@ -0,0 +1,162 @@
+from functools import lru_cache
+
+import mne
+import numpy as np
+from scipy import signal
+
+
+@lru_cache(maxsize=None)
+def get_band_sos(sample_rate: float, l_freq: float, h_freq: float) -> np.ndarray:
+    """
+    8th order Butterworth designed by MNE, only once per (sample_rate, band) in the whole process.
+    """
+    iir_params = dict(order=8, ftype="butter")
+    filt = mne.filter.create_filter(
+        None,
+        sample_rate,
+        l_freq=l_freq,
+        h_freq=h_freq,
+        method="iir",
+        iir_params=iir_params,
+        verbose=False,
+    )
+    return filt["sos"]
+
+
+class FilterBank:
+    """
+    Splits the data in frequency bands with zero-phase IIR filters (sosfiltfilt).
+
+    Parameters
+    ----------
+    sample_rate
+    frequency_ranges: band name -> [l_freq, h_freq], same as the frequency_ranges dicts of the processing methods.
+    """
+
+    def __init__(self, sample_rate: float, frequency_ranges: dict):
+        self.sample_rate = sample_rate
+        self.band_names = list(frequency_ranges.keys())
+        self.sos = [
+            get_band_sos(sample_rate, float(l_freq), float(h_freq))
+            for l_freq, h_freq in frequency_ranges.values()
+        ]
+
+    def apply(self, data, out=None) -> np.ndarray:
+        """
+        Filters the last axis of data for every band.
+
+        Returns
+        -------
+        (bands, *data.shape) float64 array. If out is given the result is written there.
+        """
+        if out is None:
+            out = np.empty((len(self.sos),) + np.shape(data), dtype=np.float64)
+        for i_band, sos in enumerate(self.sos):
+            out[i_band] = signal.sosfiltfilt(sos, data, axis=-1)
+        return out
+
+
+@lru_cache(maxsize=None)
+def _get_filter_bank(sample_rate: float, frequency_ranges_items: tuple) -> FilterBank:
+    return FilterBank(sample_rate, dict(frequency_ranges_items))
+
+
+def get_filter_bank(sample_rate: float, frequency_ranges: dict) -> FilterBank:
+    """
+    Memoized FilterBank, the same object is returned for the same sample rate and bands.
+    """
+    return _get_filter_bank(
+        sample_rate,
+        tuple(
+            (band_name, (float(l_freq), float(h_freq)))
+            for band_name, (l_freq, h_freq) in frequency_ranges.items()
+        ),
+    )
+
+
+class StreamingFilterBank:
+    """
+    Causal version of FilterBank for the live sessions. The sosfilt state (zi) of every band and channel is kept
+    between chunks, so each incoming sample is filtered only once, and the last window_size samples of every band
+    are kept in a ring buffer.
+    Unlike FilterBank.apply it's not zero-phase, the bands are delayed by the filters' group delay.
+
+    Parameters
+    ----------
+    sample_rate
+    frequency_ranges: band name -> [l_freq, h_freq], same as FilterBank.
+    n_channels
+    window_size: samples returned by get_window, usually the length of the trials used in training.
+    """
+
+    def __init__(
+        self,
+        sample_rate: float,
+        frequency_ranges: dict,
+        n_channels: int,
+        window_size: int,
+    ):
+        self.filter_bank = get_filter_bank(sample_rate, frequency_ranges)
+        self.band_names = self.filter_bank.band_names
+        self.n_channels = n_channels
+        self.window_size = window_size
+        self.reset()
+
+    def reset(self):
+        self.zi = None
+        self.buffer = np.zeros(
+            (len(self.band_names), self.n_channels, self.window_size), dtype=np.float64
+        )
+        self.raw_buffer = np.zeros(
+            (self.n_channels, self.window_size), dtype=np.float64
+        )
+        self.position = 0  # Where the next sample is written
+        self.n_samples_seen = 0
+
+    @property
+    def is_full(self) -> bool:
+        return self.n_samples_seen >= self.window_size
+
+    def push(self, chunk) -> np.ndarray:
+        """
+        Filters a new chunk of [chans x samples] and stores it in the ring buffer.
+
+        Returns
+        -------
+        (bands, chans, samples) the filtered chunk.
+        """
+        chunk = np.asarray(chunk, dtype=np.float64)
+        if self.zi is None:
+            # Steady state for the first sample, otherwise the filters start with the step response of the DC offset
+            self.zi = [
+                signal.sosfilt_zi(sos)[:, np.newaxis, :]
+                * chunk[np.newaxis, :, 0, np.newaxis]
+                for sos in self.filter_bank.sos
+            ]
+        filtered = np.empty((len(self.band_names),) + chunk.shape, dtype=np.float64)
+        for i_band, sos in enumerate(self.filter_bank.sos):
+            filtered[i_band], self.zi[i_band] = signal.sosfilt(
+                sos, chunk, axis=-1, zi=self.zi[i_band]
+            )
+
+        # Only the last window_size samples can end up in the buffer
+        n_samples = chunk.shape[-1]
+        kept = min(n_samples, self.window_size)
+        indices = (
+            self.position + n_samples - kept + np.arange(kept)
+        ) % self.window_size
+        self.buffer[:, :, indices] = filtered[:, :, n_samples - kept :]
+        self.raw_buffer[:, indices] = chunk[:, n_samples - kept :]
+        self.position = (self.position + n_samples) % self.window_size
+        self.n_samples_seen += n_samples
+        return filtered
+
+    def get_window(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns
+        -------
+        (bands, chans, window_size) last filtered samples and (chans, window_size) same samples without filtering,
+        both from the oldest to the newest sample. Before is_full the oldest samples are zeros.
+        """
+        order = (self.position + np.arange(self.window_size)) % self.window_size
+        return self.buffer[:, :, order], self.raw_buffer[:, order]
@@ -1,14 +1,17 @@
 import time
 from collections import OrderedDict
+from typing import Optional
 
 import numpy as np
 import pandas as pd
+from data_cache import TransformerCache
 from data_loaders import load_data_labels_based_on_dataset
 from data_utils import (
     ClfSwitcher,
     get_best_classificator_and_test_accuracy,
     get_dataset_basic_info,
     get_input_data_path,
+    search_candidates,
     standard_saving_path,
 )
 from pyriemann.estimation import Covariances
@@ -21,7 +24,17 @@ from sklearn.pipeline import Pipeline
 # todo: do the deap thing about the FFT: https://github.com/tongdaxu/EEG_Emotion_Classifier_DEAP/blob/master/Preprocess_Deap.ipynb
 
 
-def customized_train(data, labels):  # v1
+def customized_train(
+    data, labels, search: str = "grid", time_budget: Optional[float] = None
+):  # v1
+    """
+    search, time_budget: classifier search, see get_best_classificator_and_test_accuracy.
+    """
+    # With several candidates, Covariances and TangentSpace are fitted once per fold of the search, not once per
+    # candidate. The cache only lives for this training.
+    transformers_cache = (
+        TransformerCache() if len(search_candidates(search)) > 1 else None
+    )
 
     estimators = OrderedDict()
     # Do not use 'Vect' transform, most of the time is nan or 0.25 if anything.
@@ -29,16 +42,21 @@ def customized_train(data, labels):  # v1
     # estimators['XdawnCov + TS'] = Pipeline([("XdawnCova", XdawnCovariances(estimator='oas')), ("ts", TangentSpace()), ('clf', ClfSwitcher())]) #noqa
     # estimators['CSP'] = Pipeline( [ ("CSP", CSP(n_components=4, reg=None, log=True, norm_trace=False)), ('clf', ClfSwitcher())]) # Get into cov.py and do copy='auto' https://stackoverflow.com/questions/76431070/mne-valueerror-data-copying-was-not-requested-by-copy-none-but-it-was-require #noqa
     estimators["Cova + TS"] = Pipeline(
-        [("Cova", Covariances()), ("ts", TangentSpace()), ("clf", ClfSwitcher())]
+        [("Cova", Covariances()), ("ts", TangentSpace()), ("clf", ClfSwitcher())],
+        memory=transformers_cache,
     )  # This is probably the best one, at least for Torres
 
     accuracy_list = []
     classifiers_list = []
     for name, clf in estimators.items():
         print(name)
-        classifier, acc = get_best_classificator_and_test_accuracy(data, labels, clf)
+        classifier, acc = get_best_classificator_and_test_accuracy(
+            data, labels, clf, search=search, time_budget=time_budget
+        )
         accuracy_list.append(acc)
         classifiers_list.append(classifier)
+    if transformers_cache is not None:
+        transformers_cache.clear()  # The trained pipeline keeps a reference to it
     print(estimators.keys())
     print(accuracy_list)
     return (
@@ -1,8 +1,9 @@
 import time
+from typing import Optional
 
-import mne
 import numpy as np
 import pandas as pd
+from band_covariances import BandCovariances, transform_band
 from data_loaders import load_data_labels_based_on_dataset
 from data_utils import (
     ClfSwitcher,
@@ -11,11 +12,14 @@ from data_utils import (
     get_input_data_path,
     standard_saving_path,
 )
+from feature_matrix import FeatureMatrix
+from filter_bank import get_filter_bank
 from mne.decoding import CSP
+from online_recentering import OnlineRecentering
 from pyriemann.estimation import Covariances, ERPCovariances, XdawnCovariances
 from pyriemann.tangentspace import TangentSpace
-from scipy import signal
 from share import ROOT_VOTING_SYSTEM_PATH, datasets_basic_infos
+from sklearn.base import clone
 from sklearn.feature_selection import SelectKBest, f_classif
 from sklearn.model_selection import StratifiedKFold
 from sklearn.pipeline import Pipeline
@@ -26,9 +30,57 @@ from sklearn.pipeline import Pipeline
 threshold_for_bug = 0.00000001  # could be any value, ex numpy.min
 
 
+def get_frequency_ranges(sample_rate: float) -> dict:
+    return {
+        "complete": [0, int(sample_rate / 2) - 1],
+        "delta": [0, 3],
+        "theta": [3, 7],
+        "alpha": [7, 13],
+        "beta 1": [13, 16],
+        "beta 2": [16, 20],
+        "beta 3": [20, 35],
+        "gamma": [35, int(sample_rate / 2) - 1],
+    }
+
+
+def feature_nodes(columns) -> set:
+    """
+    (band, transform) nodes of transform_data that the columns f"{band}_{transform}_{num}" come from, e.g. the
+    columns_list chosen by SelectKBest. Neither the band names nor the transform names have underscores.
+    """
+    return {tuple(column.rsplit("_", 1)[0].split("_", 1)) for column in columns}
+
+
 def transform_data(
-    data, dataset_info: dict, labels=None, transform_methods: dict = {}
-) -> tuple[pd.DataFrame, dict]:
+    data,
+    dataset_info: dict,
+    labels=None,
+    transform_methods: Optional[dict] = None,
+    filtered_by_band=None,
+    nodes=None,
+    recentering: OnlineRecentering = None,
+) -> tuple[FeatureMatrix, dict]:
+    """
+    Parameters
+    ----------
+    data: [epochs, chans, samples]
+    dataset_info
+    labels: if given the transforms are fitted, otherwise the ones in transform_methods are used.
+    transform_methods: (band, transform) -> fitted pipeline, each band has its own fit. If None (to fit them), a new
+    dict.
+    filtered_by_band: (bands, epochs, chans, samples) data already split with the bands of get_frequency_ranges,
+    e.g. from StreamingFilterBank.get_window in the live sessions. If None, data is filtered offline (zero-phase).
+    nodes: (band, transform) pairs to compute, e.g. feature_nodes(columns_list) at test time. The bands without
+    nodes are not even filtered. If None, all of them.
+    recentering: online mode, the tangent space references of transform_methods are moved towards the trials of data
+    (geodesic running mean) before projecting them. Only without labels.
+
+    Returns
+    -------
+    features_matrix, transform_methods. features_matrix is a float32 FeatureMatrix, one row per epoch and columns
+    f"{band}_{transform}_{num}", use features_matrix.select(columns) or features_matrix.to_dataframe() to get the
+    columns.
+    """
     features: dict = {
         # Do not use 'Vect' transform, most of the time is nan or 0.25 if anything.
         "ERPcova": Pipeline(
@@ -44,62 +96,86 @@ def transform_data(
             [("Cova", Covariances()), ("ts", TangentSpace())]
         ),  # Add TangentSpace, otherwise the dimensions are not 2D.
     }
-    frequency_ranges: dict = {
-        "complete": [0, int(dataset_info["sample_rate"] / 2) - 1],
-        "delta": [0, 3],
-        "theta": [3, 7],
-        "alpha": [7, 13],
-        "beta 1": [13, 16],
-        "beta 2": [16, 20],
-        "beta 3": [20, 35],
-        "gamma": [35, int(dataset_info["sample_rate"] / 2) - 1],
-    }
+    frequency_ranges: dict = get_frequency_ranges(dataset_info["sample_rate"])
+    if nodes is None:
+        nodes = {
+            (frequency_bandwidth_name, feature_name)
+            for frequency_bandwidth_name in frequency_ranges
+            for feature_name in features
+        }
+    used_bands = [
+        frequency_bandwidth_name
+        for frequency_bandwidth_name in frequency_ranges
+        if any(band == frequency_bandwidth_name for band, _ in nodes)
+    ]
+
+    if transform_methods is None:
+        transform_methods = {}
+    features_matrix = FeatureMatrix(len(data))
 
-    features_df = pd.DataFrame()
+    if filtered_by_band is None:
+        filtered_by_band = get_filter_bank(
+            dataset_info["sample_rate"],
+            {band: frequency_ranges[band] for band in used_bands},
+        ).apply(data)
+    else:
+        # Copy, the threshold below modifies it in place
+        bands_index = [list(frequency_ranges).index(band) for band in used_bands]
+        filtered_by_band = np.array(
+            np.asarray(filtered_by_band)[bands_index], dtype=np.float64
+        )
+    filtered_by_band[filtered_by_band < threshold_for_bug] = (
+        threshold_for_bug  # To avoid the error "SVD did not convergence"
+    )
+
+    # The covariances of each band are computed once for all its transforms
+    band_covariances = {
+        band: BandCovariances(filtered)
+        for band, filtered in zip(used_bands, filtered_by_band)
+    }
 
     for feature_name, feature_method in features.items():
-        if labels is not None:
-            transform_methods[feature_name] = Pipeline([(feature_name, feature_method)])
-        for frequency_bandwidth_name, frequency_bandwidth in frequency_ranges.items():
-            print(frequency_bandwidth)
-            iir_params = dict(order=8, ftype="butter")
-            filt = mne.filter.create_filter(
-                data,
-                dataset_info["sample_rate"],
-                l_freq=frequency_bandwidth[0],
-                h_freq=frequency_bandwidth[1],
-                method="iir",
-                iir_params=iir_params,
-                verbose=True,
-            )
-            filtered = signal.sosfiltfilt(filt["sos"], data)
-            filtered[filtered < threshold_for_bug] = (
-                threshold_for_bug  # To avoid the error "SVD did not convergence"
-            )
+        for frequency_bandwidth_name, covariances in band_covariances.items():
+            node = (frequency_bandwidth_name, feature_name)
+            if node not in nodes:
+                continue
             if labels is not None:
-                X_features = transform_methods[feature_name].fit_transform(
-                    filtered, labels
+                transform_methods[node] = Pipeline(
+                    [(feature_name, clone(feature_method))]
                 )
-            else:
-                X_features = transform_methods[feature_name].transform(filtered)
+            X_features = transform_band(
+                transform_methods[node], covariances, labels, recentering
+            )
             print("Combined space has", X_features.shape[1], "features")
             column_name = [
                 f"{frequency_bandwidth_name}_{feature_name}_{num}"
                 for num in range(0, X_features.shape[1])
             ]
-            temp_features_df = pd.DataFrame(X_features, columns=column_name)
-            features_df = pd.concat([features_df, temp_features_df], axis=1)
-    return features_df, transform_methods
+            features_matrix.add(column_name, X_features)
+    if recentering is not None and labels is None:
+        recentering.advance(len(data))
+    return features_matrix, transform_methods
 
 
-def selected_transformers_train(features_df, labels):
+def selected_transformers_train(
+    features: FeatureMatrix,
+    labels,
+    search: str = "grid",
+    time_budget: Optional[float] = None,
+):
+    """
+    search, time_budget: classifier search, see get_best_classificator_and_test_accuracy.
+    """
     X_SelectKBest = SelectKBest(f_classif, k=100)
-    X_new = X_SelectKBest.fit_transform(features_df, labels)
-    columns_list = X_SelectKBest.get_feature_names_out()
-    features_df = pd.DataFrame(X_new, columns=columns_list)
+    X_new = X_SelectKBest.fit_transform(features.array, labels)
+    columns_list = list(np.asarray(features.columns)[X_SelectKBest.get_support()])
 
     classifier, acc = get_best_classificator_and_test_accuracy(
-        features_df, labels, Pipeline([("clf", ClfSwitcher())])
+        X_new,
+        labels,
+        Pipeline([("clf", ClfSwitcher())]),
+        search=search,
+        time_budget=time_budget,
     )
     return classifier, acc, columns_list
 
@@ -110,7 +186,8 @@ def selected_transformers_test(clf, features_df):
     Parameters
     ----------
     clf : classifier trained for the specific subject
-    features_df: one epoch, the current one that represents the intention of movement of the user.
+    features_df: [epochs x columns_list] features of one epoch, the current one that represents the intention of
+    movement of the user, e.g. features.select(columns_list).
 
     Returns Array of classification with 4 floats representing the target classification
     -------
@@ -164,12 +241,12 @@ if __name__ == "__main__":
                     "******************************** Training ********************************"
                 )
                 start = time.time()
-                features_train_df, transform_methods = transform_data(
+                features_train, transform_methods = transform_data(
                     data[train], dataset_info=dataset_info, labels=labels[train]
                 )
 
                 clf, accuracy, columns_list = selected_transformers_train(
-                    features_train_df, labels[train]
+                    features_train, labels[train]
                 )
                 training_time.append(time.time() - start)
                 with open(
@@ -184,14 +261,15 @@ if __name__ == "__main__":
                 testing_time = []
                 for epoch_number in test:
                     start = time.time()
-                    features_test_df, _ = transform_data(
+                    features_test, _ = transform_data(
                         np.asarray([data[epoch_number]]),
                         dataset_info=dataset_info,
                         labels=None,
                         transform_methods=transform_methods,
+                        nodes=feature_nodes(columns_list),
                     )
                     array = selected_transformers_test(
-                        clf, features_test_df[columns_list]
+                        clf, features_test.select(columns_list)
                     )
                     end = time.time()
                     testing_time.append(end - start)
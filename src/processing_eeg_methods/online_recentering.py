@@ -0,0 +1,91 @@
+from typing import Any, Optional
+
+import numpy as np
+from pyriemann.tangentspace import TangentSpace
+from sklearn.pipeline import Pipeline
+
+
+def _spd_power(C, power: float) -> np.ndarray:
+    eigenvalues, eigenvectors = np.linalg.eigh(C)
+    return (eigenvectors * eigenvalues**power) @ eigenvectors.T
+
+
+def geodesic_riemann(A, B, alpha: float) -> np.ndarray:
+    """
+    Point at alpha of the affine-invariant geodesic from A (alpha=0) to B (alpha=1), A^½ (A^-½ B A^-½)^alpha A^½.
+    """
+    A_sqrt = _spd_power(A, 0.5)
+    A_invsqrt = _spd_power(A, -0.5)
+    return A_sqrt @ _spd_power(A_invsqrt @ B @ A_invsqrt, alpha) @ A_sqrt
+
+
+def tangent_space_inputs(pipeline: Pipeline, X) -> tuple[Optional[TangentSpace], Any]:
+    """
+    First TangentSpace step of the pipeline (nested pipelines included) and its input for X, (None, None) if the
+    pipeline doesn't have one.
+    """
+    for _, step in pipeline.steps:
+        if isinstance(step, Pipeline):
+            tangent_space, X_step = tangent_space_inputs(step, X)
+            if tangent_space is not None:
+                return tangent_space, X_step
+            X = step.transform(X)
+        elif isinstance(step, TangentSpace):
+            return step, X
+        else:
+            X = step.transform(X)
+    return None, None
+
+
+class OnlineRecentering:
+    """
+    Keeps the reference point (reference_) of fitted TangentSpace steps up to date with the trials that arrive after
+    training, labeled or not, instead of retraining to follow a drifting session.
+
+    The reference is a geodesic running mean: the covariance C of the n-th trial moves it to
+    geodesic_riemann(reference, C, 1 / n), O(C³) per trial instead of the O(N·C³) of a new Riemannian mean. The
+    projections that follow use the updated reference.
+
+    Parameters
+    ----------
+    n_seen: trials the references were estimated from, usually the training trials.
+    memory: if given, the weight of a new trial is never smaller than 1 / memory, so the reference keeps following
+    the session (an exponential forgetting of the old trials) instead of converging.
+    """
+
+    def __init__(self, n_seen: int, memory: Optional[int] = None):
+        self.n_seen = n_seen
+        self.memory = memory
+
+    def weights(self, n_trials: int) -> np.ndarray:
+        """
+        Geodesic steps of the next n_trials trials.
+        """
+        counts = self.n_seen + np.arange(1, n_trials + 1)
+        if self.memory is not None:
+            counts = np.minimum(counts, self.memory)
+        return 1 / counts
+
+    def recenter(self, tangent_space: TangentSpace, covariances, weights=None):
+        """
+        Moves tangent_space.reference_ towards each of the covariances, one after the other. It doesn't count the trials,
+        call advance once the references of all the tangent spaces fed by the same trials are updated.
+        """
+        if weights is None:
+            weights = self.weights(len(covariances))
+        reference = tangent_space.reference_
+        for covariance, weight in zip(covariances, weights):
+            reference = geodesic_riemann(reference, covariance, weight)
+        tangent_space.reference_ = reference
+
+    def advance(self, n_trials: int):
+        self.n_seen += n_trials
+
+    def update(self, pipeline: Pipeline, X):
+        """
+        Recenters the TangentSpace of the pipeline with the trials X, the raw input of the pipeline.
+        """
+        tangent_space, covariances = tangent_space_inputs(pipeline, X)
+        if tangent_space is not None:
+            self.recenter(tangent_space, covariances)
+        self.advance(len(X))
@@ -0,0 +1,56 @@
+import copy
+
+import numpy as np
+from band_covariances import BandCovariances, oas_shrinkage, transform_band
+from mne.decoding import CSP
+from pyriemann.estimation import Covariances, ERPCovariances, XdawnCovariances
+from pyriemann.tangentspace import TangentSpace
+from sklearn.covariance import oas
+from sklearn.pipeline import Pipeline
+
+pipelines: dict = {
+    "ERPcova": Pipeline(
+        [("ERPcova", ERPCovariances(estimator="oas")), ("ts", TangentSpace())]
+    ),
+    "XdawnCova": Pipeline(
+        [("XdawnCova", XdawnCovariances(estimator="oas")), ("ts", TangentSpace())]
+    ),
+    "CSP": Pipeline(
+        [("Vectorizer", CSP(n_components=4, reg=None, log=True, norm_trace=False))]
+    ),
+    "Cova": Pipeline([("Cova", Covariances()), ("ts", TangentSpace())]),
+}
+
+
+def test_oas_shrinkage_matches_sklearn():
+    X = np.random.default_rng(42).normal(size=(3, 5, 100))
+    centered = X - X.mean(axis=-1, keepdims=True)
+    covariances = centered @ centered.transpose(0, 2, 1) / 100
+
+    shrunk = oas_shrinkage(covariances, 100)
+
+    for trial, expected in zip(X, shrunk):
+        np.testing.assert_allclose(oas(trial.T)[0], expected)
+
+
+def test_transform_band_matches_pipelines():
+    rng = np.random.default_rng(42)
+    labels = np.repeat(np.arange(4), 10)
+    X = rng.normal(size=(40, 6, 200)) + 0.3
+    X[labels == 1, :, 50:80] += 1
+    X_test = rng.normal(size=(3, 6, 200))
+
+    for name, pipeline in pipelines.items():
+        expected = Pipeline([(name, copy.deepcopy(pipeline))])
+        cached = Pipeline([(name, copy.deepcopy(pipeline))])
+
+        np.testing.assert_allclose(
+            transform_band(cached, BandCovariances(X), labels),
+            expected.fit_transform(X, labels),
+            atol=1e-10,
+        )
+        np.testing.assert_allclose(
+            transform_band(cached, BandCovariances(X_test)),
+            expected.transform(X_test),
+            atol=1e-10,
+        )
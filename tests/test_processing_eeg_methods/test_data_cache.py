@@ -0,0 +1,167 @@
+import gc
+import os
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+
+import data_cache
+import numpy as np
+import pandas as pd
+from data_cache import TransformerCache, load_arrays_cache, save_arrays_cache
+from data_loaders import braincommand_dataset_loader, parse_braincommand_trial
+from data_utils import ClfSwitcher
+from pyriemann.estimation import Covariances
+from pyriemann.tangentspace import TangentSpace
+from sklearn.base import clone
+from sklearn.linear_model import LogisticRegression, RidgeClassifier
+from sklearn.model_selection import GridSearchCV, StratifiedKFold
+from sklearn.naive_bayes import GaussianNB
+from sklearn.pipeline import Pipeline
+
+
+def test_parse_braincommand_trial():
+    trial = [[1.5, -2.0, 3e-3], [4.0, 5.25, -6.0]]
+    np.testing.assert_array_equal(parse_braincommand_trial(str(trial)), trial)
+
+
+def test_arrays_cache_is_invalidated_when_source_changes(tmp_path):
+    source_path = tmp_path / "source.csv"
+    source_path.write_text("a,b\n1,2\n")
+    cache_prefix = str(tmp_path / "source")
+    data = np.arange(24, dtype=np.float64).reshape(2, 3, 4)
+    save_arrays_cache(cache_prefix, {"data": data}, source_paths=[str(source_path)])
+
+    arrays, _ = load_arrays_cache(cache_prefix)
+    assert isinstance(arrays["data"], np.memmap)
+    np.testing.assert_array_equal(arrays["data"], data)
+
+    stat = os.stat(source_path)
+    os.utime(source_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert load_arrays_cache(cache_prefix) is not None  # Same content, new mtime
+
+    source_path.write_text("a,b\n1,3\n")
+    assert load_arrays_cache(cache_prefix) is None
+
+
+def test_arrays_cache_concurrent_writers(tmp_path):
+    source_path = tmp_path / "source.csv"
+    source_path.write_text("a,b\n1,2\n")
+    cache_prefix = str(tmp_path / "source")
+    data = np.arange(10**5, dtype=np.float64)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        for future in [
+            executor.submit(
+                save_arrays_cache,
+                cache_prefix,
+                {"data": data},
+                source_paths=[str(source_path)],
+            )
+            for _ in range(8)
+        ]:
+            future.result()
+
+    arrays, _ = load_arrays_cache(cache_prefix)
+    np.testing.assert_array_equal(arrays["data"], data)
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_braincommand_loader_uses_cache(tmp_path):
+    rng = np.random.default_rng(42)
+    trials = [rng.normal(size=(5, 8 + 9)).round(4) for _ in range(4)]
+    pd.DataFrame(
+        {
+            "time": [str([[0.0] * 17])] + [str(trial.tolist()) for trial in trials],
+            "class": [0, 0, 1, 2, 3],
+        }
+    ).to_csv(tmp_path / "eeg_data_calibration2_sub01.csv", index=False)
+
+    data, label, _ = braincommand_dataset_loader(str(tmp_path), 1)
+    cached_data, cached_label, _ = braincommand_dataset_loader(str(tmp_path), 1)
+
+    assert data.shape == (4, 8, 5)
+    assert label == cached_label == [0, 1, 2, 3]
+    np.testing.assert_array_equal(data, cached_data)
+
+
+class CountingCovariances(Covariances):
+    fits = 0
+
+    def fit(self, X, y=None):
+        CountingCovariances.fits += 1
+        return super().fit(X, y)
+
+
+def test_transformer_cache_fits_the_steps_once_per_fold():
+    rng = np.random.default_rng(42)
+    labels = np.repeat(np.arange(2), 20)
+    data = rng.normal(size=(len(labels), 4, 100))
+    data[labels == 1, :2] *= 2
+    cache = TransformerCache()
+    pipeline = Pipeline(
+        [
+            ("Cova", CountingCovariances()),
+            ("ts", TangentSpace()),
+            ("clf", ClfSwitcher()),
+        ],
+        memory=cache,
+    )
+    search = GridSearchCV(
+        pipeline,
+        param_grid=[
+            {"clf__estimator": [classifier]}
+            for classifier in [RidgeClassifier(), GaussianNB(), LogisticRegression()]
+        ],
+        cv=StratifiedKFold(n_splits=4, shuffle=True, random_state=42),
+    )
+    CountingCovariances.fits = 0
+
+    search.fit(data, labels)
+
+    assert CountingCovariances.fits == 4 + 1  # The folds and the refit on all the data
+    assert cache.misses == 2 * (4 + 1)
+    assert cache.hits == 2 * 4 * 2
+    # The pipelines get their own copy of the cached steps
+    fitted = search.best_estimator_.named_steps["ts"]
+    assert all(fitted is not ts for _, ts in cache.entries.values())
+    assert pickle.loads(pickle.dumps(cache)) is cache
+
+
+def test_transformer_cache_is_freed_with_its_pipelines():
+    cache = TransformerCache()
+    cache_id = cache.cache_id
+    pipeline = Pipeline([("Cova", Covariances()), ("clf", ClfSwitcher())], memory=cache)
+    del cache
+    assert data_cache._transformer_caches.get(cache_id) is pipeline.memory
+
+    del pipeline
+    gc.collect()
+    assert data_cache._transformer_caches.get(cache_id) is None
+
+
+def test_transformer_cache_spills_to_disk(tmp_path):
+    rng = np.random.default_rng(42)
+    cache = TransformerCache(max_entries=1, spill_location=str(tmp_path))
+    pipeline = Pipeline(
+        [
+            ("Cova", CountingCovariances()),
+            ("ts", TangentSpace()),
+            ("clf", ClfSwitcher()),
+        ],
+        memory=cache,
+    )
+    labels = np.repeat(np.arange(2), 10)
+    first = rng.normal(size=(len(labels), 4, 100))
+    second = rng.normal(size=(len(labels), 4, 100))
+    CountingCovariances.fits = 0
+
+    clone(pipeline).fit(first, labels)
+    clone(pipeline).fit(second, labels)
+    assert len(cache.entries) == 1
+    assert len(list(tmp_path.glob("*.joblib"))) == 3
+
+    refitted = clone(pipeline).fit(first, labels)  # From the disk
+    assert CountingCovariances.fits == 2
+    np.testing.assert_allclose(
+        refitted.named_steps["ts"].reference_,
+        TangentSpace().fit(Covariances().fit_transform(first)).reference_,
+    )
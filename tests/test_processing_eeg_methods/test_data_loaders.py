@@ -0,0 +1,180 @@
+import gc
+import os
+from concurrent.futures import Future
+from multiprocessing import resource_tracker, shared_memory
+
+import mne
+import numpy as np
+import pandas as pd
+import pytest
+from data_loaders import (
+    load_data_labels_based_on_dataset,
+    load_subject_epoch_store,
+    load_subject_from_source,
+    load_subjects,
+    read_epochs_windows,
+    take_subject_from_shared_memory,
+    torres_dataset_loader,
+)
+from data_utils import data_normalization
+from scipy.io import savemat
+from share import datasets_basic_infos
+
+
+def test_torres_loader_reads_one_subject(tmp_path):
+    rng = np.random.default_rng(42)
+    subjects = np.empty((2,), dtype=object)
+    for i_subject in range(2):
+        words = np.empty((5,), dtype=object)
+        for i_word in range(5):
+            epochs = np.empty((34,), dtype=object)  # One extra epoch, it is removed
+            for i_epoch in range(34):
+                epochs[i_epoch] = {
+                    "SenalesEEG": rng.normal(size=(400 + i_epoch, 17)).round(3)
+                }
+            words[i_word] = {"Epoca": epochs}
+        subjects[i_subject] = {"Palabra": words}
+    filepath = str(tmp_path / "IndividuosS1-S27(17columnas)-Epocas.mat")
+    savemat(filepath, {"S": subjects})
+
+    x, y, _ = torres_dataset_loader(filepath, 2)
+
+    assert x.shape == (165, 14, 463)
+    assert x.dtype == np.float32
+    np.testing.assert_array_equal(y, np.repeat([0, 1, 2, 3, 4], 33))
+    last_epoch = subjects[1]["Palabra"][4]["Epoca"][32]["SenalesEEG"]
+    np.testing.assert_allclose(x[-1, :, :432], last_epoch[:, :14].T, rtol=1e-6)
+    assert not x[-1, :, 432:].any()
+    assert os.path.exists(tmp_path / "torres_subjects" / "S01.samples.npy")
+
+
+def test_epoch_store_matches_source(tmp_path):
+    rng = np.random.default_rng(42)
+    os.makedirs(tmp_path / "Training set")
+    savemat(
+        tmp_path / "Training set" / "Data_Sample01.mat",
+        {
+            "epo_train": {
+                "x": rng.normal(size=(795, 64, 10)),
+                "y": np.eye(5)[rng.integers(0, 5, size=10)].T,
+            }
+        },
+    )
+    dataset_info = datasets_basic_infos["ic_bci_2020"]
+
+    data, label, event_dict = load_subject_from_source(dataset_info, 1, str(tmp_path))
+    load_subject_epoch_store(dataset_info, 1, str(tmp_path))  # Creates the store
+    stored_data, stored_label, stored_event_dict = load_subject_epoch_store(
+        dataset_info, 1, str(tmp_path)
+    )
+
+    assert isinstance(stored_data, np.memmap)
+    assert stored_data.shape == (10, 64, 795)
+    np.testing.assert_array_equal(stored_data, data)
+    np.testing.assert_array_equal(stored_label, label)
+    assert stored_event_dict == event_dict
+
+    _, normalized_data, _ = load_data_labels_based_on_dataset(
+        dataset_info, 1, str(tmp_path)
+    )
+    assert isinstance(normalized_data, np.memmap)  # Normalized when the store was built
+    np.testing.assert_array_equal(normalized_data, data_normalization(data))
+
+
+def test_read_epochs_windows_matches_mne_epochs(tmp_path):
+    pytest.importorskip("edfio")
+    rng = np.random.default_rng(42)
+    info = mne.create_info(
+        [f"Channel {i}" for i in range(1, 25)] + ["Gyro 1", "Gyro 2", "Gyro 3"],
+        sfreq=500,
+        ch_types="eeg",
+    )
+    raw = mne.io.RawArray(rng.normal(scale=1e-5, size=(27, 500 * 30)), info)
+    raw.set_annotations(
+        mne.Annotations(
+            onset=[1, 5, 9, 13, 28.9],  # The last one doesn't fit in the recording
+            duration=0,
+            description=["a", "b", "a", "c", "b"],
+        )
+    )
+    filepath = str(tmp_path / "S1.edf")
+    mne.export.export_raw(filepath, raw, verbose=40)
+
+    raw = mne.io.read_raw_edf(filepath, exclude=["Gyro 1", "Gyro 2", "Gyro 3"])
+    events, event_id = mne.events_from_annotations(raw)
+    data, in_bounds = read_epochs_windows(raw, events, tmin=0, tmax=1.4)
+    epochs = mne.Epochs(
+        raw, events, event_id, preload=True, tmin=0, tmax=1.4, baseline=None
+    )
+
+    np.testing.assert_array_equal(in_bounds, [True, True, True, True, False])
+    np.testing.assert_array_equal(events[in_bounds], epochs.events)
+    np.testing.assert_allclose(data, epochs.get_data())
+
+
+def test_load_subjects_matches_serial_loading(tmp_path):
+    rng = np.random.default_rng(42)
+    for subject_id in [1, 2, 3]:
+        trials = [rng.normal(size=(350, 17)).round(4) for _ in range(9)]
+        pd.DataFrame(
+            {
+                "time": [str(trial.tolist()) for trial in trials],
+                "class": [0, 0, 1, 2, 3, 0, 1, 2, 3],
+            }
+        ).to_csv(tmp_path / f"eeg_data_calibration2_sub{subject_id:02d}.csv")
+    dataset_info = datasets_basic_infos["braincommand"]
+
+    loaded_subjects = list(
+        load_subjects(dataset_info, [1, 2, 3], str(tmp_path), prefetch=2)
+    )
+
+    assert [subject_id for subject_id, _, _ in loaded_subjects] == [1, 2, 3]
+    for subject_id, data, label in loaded_subjects:
+        _, expected_data, expected_label = load_data_labels_based_on_dataset(
+            dataset_info, subject_id, str(tmp_path)
+        )
+        np.testing.assert_array_equal(data, expected_data)
+        np.testing.assert_array_equal(label, expected_label)
+
+
+def test_subject_from_shared_memory_is_freed_with_its_data():
+    expected_data = np.arange(24, dtype=np.float64).reshape(2, 3, 4)
+    shared_data = shared_memory.SharedMemory(create=True, size=expected_data.nbytes)
+    np.ndarray(expected_data.shape, dtype=np.float64, buffer=shared_data.buf)[:] = (
+        expected_data
+    )
+    shared_data.close()
+    resource_tracker.unregister(shared_data._name, "shared_memory")
+    future: Future = Future()
+    future.set_result((shared_data.name, expected_data.shape, "<f8", [0, 1]))
+
+    data, label = take_subject_from_shared_memory(future)
+    assert not data.flags.owndata  # No copy out of the shared memory
+    first_trial = data[0]
+    del data
+    gc.collect()
+
+    np.testing.assert_array_equal(first_trial, expected_data[0])  # Views keep it alive
+    del first_trial
+    gc.collect()
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=shared_data.name)
+
+
+def test_epoch_store_skips_loaders_with_cache(tmp_path):
+    rng = np.random.default_rng(42)
+    trials = [rng.normal(size=(350, 17)).round(4) for _ in range(5)]
+    pd.DataFrame(
+        {"time": [str(trial.tolist()) for trial in trials], "class": [0, 0, 1, 2, 3]}
+    ).to_csv(tmp_path / "eeg_data_calibration2_sub01.csv")
+    dataset_info = datasets_basic_infos["braincommand"]
+
+    data, label, _ = load_subject_epoch_store(dataset_info, 1, str(tmp_path))
+    cached_data, cached_label, _ = load_subject_epoch_store(
+        dataset_info, 1, str(tmp_path)
+    )
+
+    assert isinstance(cached_data, np.memmap)  # The loader's own cache
+    np.testing.assert_array_equal(cached_data, data)
+    np.testing.assert_array_equal(cached_label, label)
+    assert not os.path.exists(tmp_path / "epoch_store")
@@ -1,11 +1,22 @@
+import data_utils
+import numpy as np
 import pytest
 from data_utils import (
+    ClfSwitcher,
+    get_best_classificator_and_test_accuracy,
     get_dataset_basic_info,
     probabilities_to_answer,
     standard_saving_path,
+    successive_halving_search,
 )
 from numpy import array
 from share import datasets_basic_infos
+from sklearn.dummy import DummyClassifier
+from sklearn.linear_model import RidgeClassifier
+from sklearn.model_selection import StratifiedKFold
+from sklearn.naive_bayes import GaussianNB
+from sklearn.pipeline import Pipeline
+from sklearn.utils.validation import check_is_fitted
 
 
 @pytest.mark.parametrize(
@@ -69,3 +80,85 @@ def test_standard_saving_path():
         )[-63:]
         == "Results/braincommand/processing_name/version_name_3.file_ending"
     )
+
+
+def separable_features(n_trials: int = 120):
+    rng = np.random.default_rng(42)
+    labels = np.repeat(np.arange(3), n_trials // 3)
+    data = rng.normal(size=(n_trials, 10))
+    data[:, 0] += 3 * labels
+    return data, labels
+
+
+def test_successive_halving_search():
+    data, labels = separable_features()
+    candidates = [DummyClassifier(), RidgeClassifier(), GaussianNB()]
+    cv = StratifiedKFold(n_splits=4, shuffle=True, random_state=42)
+
+    best_estimator, acc = successive_halving_search(
+        data, labels, Pipeline([("clf", ClfSwitcher())]), candidates, cv, n_jobs=1
+    )
+
+    assert not isinstance(best_estimator.named_steps["clf"].estimator, DummyClassifier)
+    assert acc > 0.8
+    assert best_estimator.predict_proba(data).shape == (len(labels), 3)
+
+
+def test_successive_halving_search_time_budget():
+    data, labels = separable_features()
+    candidates = [DummyClassifier(), RidgeClassifier(), GaussianNB()]
+    cv = StratifiedKFold(n_splits=4, shuffle=True, random_state=42)
+
+    # Only the first rung, on a subsample, is always run
+    best_estimator, acc = successive_halving_search(
+        data,
+        labels,
+        Pipeline([("clf", ClfSwitcher())]),
+        candidates,
+        cv,
+        time_budget=0,
+        n_jobs=1,
+    )
+
+    assert acc > 0.7
+    check_is_fitted(best_estimator)
+
+
+def test_get_best_classificator_unknown_search():
+    data, labels = separable_features()
+    with pytest.raises(Exception, match="Not supported search"):
+        get_best_classificator_and_test_accuracy(
+            data, labels, Pipeline([("clf", ClfSwitcher())]), search="random"
+        )
+
+
+def test_successive_halving_search_keeps_the_last_complete_rung(monkeypatch):
+    data, labels = separable_features()
+    candidates = [DummyClassifier(), RidgeClassifier(), GaussianNB()]
+    cv = StratifiedKFold(n_splits=4, shuffle=True, random_state=42)
+    pipeline = Pipeline([("clf", ClfSwitcher())])
+    first_rung_estimator, first_rung_acc = successive_halving_search(
+        data, labels, pipeline, candidates, cv, factor=2, time_budget=0, n_jobs=1
+    )
+    first_rung_winner = next(
+        candidate
+        for candidate in candidates
+        if type(candidate) is type(first_rung_estimator.named_steps["clf"].estimator)
+    )
+
+    # The budget runs out in the second rung before the winner of the first one is scored
+    score = data_utils._halving_fold_score
+
+    def partial_rung(estimators, classificator, *args):
+        deadline = args[-1]
+        if deadline is not None and classificator is first_rung_winner:
+            return np.nan
+        return score(estimators, classificator, *args)
+
+    monkeypatch.setattr(data_utils, "_halving_fold_score", partial_rung)
+    best_estimator, acc = successive_halving_search(
+        data, labels, pipeline, candidates, cv, factor=2, time_budget=1e9, n_jobs=1
+    )
+
+    assert type(best_estimator.named_steps["clf"].estimator) is type(first_rung_winner)
+    assert acc == first_rung_acc
@@ -0,0 +1,69 @@
+import features_extraction.get_features_probs as get_features_probs
+import numpy as np
+from data_utils import convert_into_independent_channels
+from features_extraction.get_features_probs import (
+    TrialFeaturesCache,
+    by_frequency_band,
+    get_frequency_ranges,
+    trials_by_frequency_band,
+)
+from joblib import parallel_config
+
+dataset_info: dict = {"sample_rate": 250}
+
+
+def test_trial_features_cache_matches_by_frequency_band():
+    data = np.random.default_rng(42).normal(size=(6, 2, 250))
+    data_independent_channels, _ = convert_into_independent_channels(
+        data, np.zeros(len(data))
+    )
+    expected = by_frequency_band(data_independent_channels, dataset_info)
+
+    features_cache = TrialFeaturesCache()
+    with parallel_config(
+        backend="threading"
+    ):  # Same split of the trials, without the workers start-up
+        features = features_cache.by_frequency_band(data, dataset_info, n_jobs=2)
+
+    assert list(features.columns) == list(expected.columns)
+    np.testing.assert_allclose(features.array, expected.array)
+
+
+def test_trial_features_cache_slices_folds(monkeypatch):
+    data = np.random.default_rng(42).normal(size=(6, 2, 250))
+    features_cache = TrialFeaturesCache()
+    all_features = features_cache.by_frequency_band(data, dataset_info, n_jobs=1)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("The trials of the fold are already in the cache")
+
+    monkeypatch.setattr(get_features_probs, "_by_frequency_band_of_trials", fail)
+    fold = np.array([4, 0, 3])
+    fold_features = features_cache.by_frequency_band(data[fold], dataset_info)
+
+    np.testing.assert_array_equal(
+        fold_features.array,
+        all_features.array.reshape(6, 2, -1)[fold].reshape(6, -1),
+    )
+
+
+def test_trial_features_cache_is_bounded_and_keyed_by_configuration():
+    data = np.random.default_rng(42).normal(size=(6, 2, 250))
+    features_cache = TrialFeaturesCache(max_trials=4)
+
+    features_cache.by_frequency_band(data, dataset_info, n_jobs=1)
+    assert len(features_cache.features) == 4
+
+    extractions = ("mean", "variance")
+    features = features_cache.by_frequency_band(
+        data[:2], dataset_info, n_jobs=1, extractions=extractions
+    )
+    assert features.columns == [
+        f"{band}_{name}"
+        for band in ["complete", *get_frequency_ranges(250)]
+        for name in ["mean_values", "variance_values"]
+    ]
+    np.testing.assert_allclose(
+        features.array,
+        trials_by_frequency_band(data[:2], dataset_info, extractions).array,
+    )
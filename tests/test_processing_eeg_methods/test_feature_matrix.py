@@ -0,0 +1,22 @@
+import numpy as np
+from feature_matrix import FeatureMatrix
+
+
+def test_feature_matrix_grows_and_selects_columns():
+    rng = np.random.default_rng(42)
+    blocks = [rng.normal(size=(3, n_columns)) for n_columns in [2, 5, 1]]
+    features = FeatureMatrix(3, n_columns=2)
+
+    for i_block, block in enumerate(blocks):
+        features.add([f"block{i_block}_{num}" for num in range(block.shape[1])], block)
+    features.add(["single"], np.arange(3))
+
+    expected = np.column_stack(blocks + [np.arange(3)]).astype(np.float32)
+    assert features.shape == (3, 9)
+    assert features.array.dtype == np.float32
+    np.testing.assert_array_equal(features.array, expected)
+    np.testing.assert_array_equal(np.asarray(features), expected)
+    np.testing.assert_array_equal(
+        features.select(["single", "block1_3", "block0_0"]), expected[:, [8, 5, 0]]
+    )
+    assert list(features.to_dataframe().columns) == features.columns
@@ -0,0 +1,391 @@
+import antropy as ant
+import features_extraction.EEGExtract as eeg
+import librosa
+import numpy as np
+import pytest
+from features_extraction.get_features_probs import (
+    get_entropy,
+    get_extractions,
+    get_frequency_ranges,
+    get_hjorth,
+    get_ratio,
+    hjorth,
+    trials_by_frequency_band,
+)
+from filter_bank import get_filter_bank
+from scipy import signal
+from sklearn.metrics import mutual_info_score
+from statsmodels.regression.linear_model import yule_walker
+
+
+def loop_hjorth(X):
+    # Previous implementation, one time series at a time
+    D = np.diff(X).tolist()
+    D.insert(0, X[0])
+    D = np.array(D)
+    n = len(X)
+    M2 = float(sum(D**2)) / n
+    TP = sum(np.array(X) ** 2)
+    M4 = 0
+    for i in range(1, len(D)):
+        M4 += (D[i] - D[i - 1]) ** 2
+    M4 = M4 / n
+    return np.sqrt(M2 / TP), np.sqrt(float(M4) * TP / M2 / M2)
+
+
+def test_hjorth_matches_loop_implementation():
+    data = np.random.default_rng(42).normal(size=(12, 350))
+
+    mobility, complexity = get_hjorth(data)
+
+    expected = np.array([loop_hjorth(data_trial) for data_trial in data])
+    np.testing.assert_allclose(mobility, expected[:, 0])
+    np.testing.assert_allclose(complexity, expected[:, 1])
+
+    mobility, complexity = hjorth(data[0], D=np.diff(data[0]))
+    np.testing.assert_allclose([mobility, complexity], expected[0])
+
+
+def test_hjorth_parameters_matches_previous_implementation():
+    eeg_data = np.random.default_rng(42).normal(size=(4, 350, 6))
+
+    mobility, complexity = eeg.hjorthParameters(eeg_data)
+
+    dxV = np.diff(eeg_data, axis=1)
+    ddxV = np.diff(dxV, axis=1)
+    mx2 = np.mean(np.square(eeg_data), axis=1)
+    mdx2 = np.mean(np.square(dxV), axis=1)
+    mddx2 = np.mean(np.square(ddxV), axis=1)
+    mob = mdx2 / mx2
+    np.testing.assert_allclose(mobility, np.sqrt(mob))
+    np.testing.assert_allclose(complexity, np.sqrt((mddx2 / mdx2) / mob))
+
+
+def test_higuchi_fd_matches_antropy():
+    data = np.random.default_rng(42).normal(size=(12, 350))
+    data[0] = np.sin(2 * np.pi * np.arange(350) / 50)
+    data[1] = np.arange(350)
+
+    expected = [ant.higuchi_fd(data_trial) for data_trial in data]
+    np.testing.assert_allclose(get_entropy(data), expected)
+    np.testing.assert_allclose(
+        eeg.higuchiFD(data.reshape(3, 4, 350), kmax=5),
+        np.reshape([ant.higuchi_fd(data_trial, kmax=5) for data_trial in data], (3, 4)),
+    )
+
+
+def test_spectral_features_from_one_psd():
+    time = np.arange(500) / 250
+    data = np.array(
+        [
+            np.sin(2 * np.pi * 10 * time) + 2 * np.sin(2 * np.pi * 2 * time),
+            3 * np.sin(2 * np.pi * 10 * time) + np.sin(2 * np.pi * 2 * time),
+        ]
+    )
+
+    # Power goes with the square of the amplitude
+    np.testing.assert_allclose(get_ratio(data, 250)[:, 0], [1 / 4, 9], rtol=1e-6)
+    np.testing.assert_allclose(get_ratio(data, 250)[0], eeg.eegRatio(data[0], 250))
+
+    freqs, powers = eeg.powerSpectrum(data, 250, axis=-1)
+    np.testing.assert_allclose(eeg.psdSpectralEdge(freqs, powers), [10, 10])
+    np.testing.assert_allclose(eeg.psdSpectralEdge(freqs, powers, edge=0.5), [2, 10])
+
+
+def test_median_freq_matches_previous_implementation():
+    eeg_data = np.random.default_rng(42).normal(size=(4, 350, 6))
+
+    expected = np.zeros((4, 6))
+    for chan in range(4):
+        freqs, powers = signal.periodogram(eeg_data[chan, :, :], 250, axis=0)
+        expected[chan, :] = freqs[np.argsort(powers, axis=0)[len(powers) // 2]]
+    np.testing.assert_array_equal(eeg.medianFreq(eeg_data, 250), expected)
+
+
+def loop_remove_short_events(z, n):
+    # Previous implementation of fcnRemoveShortEvents
+    for chan in range(z.shape[0]):
+        ct = 0
+        i0 = 1
+        i1 = 1
+        for i in range(2, len(z[chan, :])):
+            if z[chan, i] == z[chan, i - 1]:
+                ct = ct + 1
+                i1 = i
+            else:
+                if ct < n:
+                    z[chan, i0:i1] = 0
+                    z[chan, i1] = 0
+                ct = 0
+                i0 = i
+                i1 = i
+        if z[chan, 0] == 1 and z[chan, 1] == 0:
+            z[chan, 0] = 0
+    return z
+
+
+def test_remove_short_events_matches_loop_implementation():
+    rng = np.random.default_rng(42)
+    for n_samples in [2, 3, 10, 60]:
+        z = np.array(
+            [
+                np.repeat(rng.integers(0, 2, n_samples), rng.integers(1, 8, n_samples))[
+                    :n_samples
+                ]
+                for _ in range(20)
+            ]
+        )
+        for n in [0, 2, 3.5]:
+            np.testing.assert_array_equal(
+                eeg.fcnRemoveShortEvents(z.copy(), n),
+                loop_remove_short_events(z.copy(), n),
+            )
+
+
+def test_burst_features_share_one_detection():
+    rng = np.random.default_rng(42)
+    amplitudes = [
+        np.repeat(rng.choice([1.0, 40.0], 40), rng.integers(20, 120, 40))[:500]
+        for _ in range(4 * 6)
+    ]
+    eeg_data = (rng.normal(size=(24, 500)) * amplitudes).reshape(4, 6, 500)
+    eeg_data = eeg_data.transpose(0, 2, 1)  # [chans x ms x epochs]
+    burst_suppression = eeg.BurstSuppression(eeg_data, 100)
+
+    expected_bursts = [
+        eeg.burst_supression_detection(eeg_data[:, :, epoch], 100)[0]
+        for epoch in range(6)
+    ]
+    lengths = [
+        [
+            [end - start for start, end in expected_bursts[epoch][chan]]
+            for epoch in range(6)
+        ]
+        for chan in range(4)
+    ]
+    np.testing.assert_array_equal(
+        eeg.numBursts(eeg_data, 100, burstSuppression=burst_suppression),
+        [[len(epoch_lengths) for epoch_lengths in chan] for chan in lengths],
+    )
+    mean, std = eeg.burstLengthStats(eeg_data, 100, burstSuppression=burst_suppression)
+    np.testing.assert_allclose(
+        mean,
+        [[np.mean(epoch_lengths or [0]) for epoch_lengths in chan] for chan in lengths],
+    )
+    np.testing.assert_allclose(
+        std,
+        [[np.std(epoch_lengths or [0]) for epoch_lengths in chan] for chan in lengths],
+    )
+
+
+def test_channel_pair_connectivity_matches_pair_by_pair():
+    rng = np.random.default_rng(42)
+    common = rng.normal(size=(350, 3)) * 30
+    eeg_data = np.stack([common + rng.normal(size=(350, 3)) * 30 for _ in range(4)])
+    eeg_data[3] = np.roll(eeg_data[1], 7, axis=0)
+    connectivity = eeg.ChannelPairConnectivity(
+        eeg_data, 250, chunk_values=4 * 3 * 350
+    )  # Chunks of 4 pairs for the mutual information, 2 for the cross-correlation
+    magnitude, lag = connectivity.crossCorrelation()
+    mutual_information = connectivity.mutualInformation()
+    coherence = connectivity.coherence()
+
+    for (ii, jj), pair_values in zip(
+        connectivity.pairs, zip(magnitude, lag, mutual_information, coherence)
+    ):
+        f, Cxy = signal.coherence(
+            eeg_data[ii], eeg_data[jj], fs=250, nfft=350, nperseg=256, axis=0
+        )
+        np.testing.assert_allclose(
+            pair_values[3], np.mean(Cxy[(f >= 0.5) & (f <= 4)], axis=0)
+        )
+        for epoch in range(3):
+            ccor = np.abs(
+                np.correlate(eeg_data[ii, :, epoch], eeg_data[jj, :, epoch], "full")
+            )
+            np.testing.assert_allclose(
+                pair_values[0][epoch], (ccor.max() - ccor.mean()) / ccor.std()
+            )
+            assert pair_values[1][epoch] == (np.argmax(ccor) - 349) / 250
+            c_xy = np.histogram2d(
+                eeg_data[ii, :, epoch],
+                eeg_data[jj, :, epoch],
+                np.arange(-199, 200, 2),
+            )[0]
+            np.testing.assert_allclose(
+                pair_values[2][epoch],
+                mutual_info_score(None, None, contingency=c_xy),
+                atol=1e-12,
+            )
+    assert np.all(lag[4] == -7 / 250)  # Pair (1, 3), the second one is delayed
+
+
+def test_coherence_of_requested_pairs_only():
+    rng = np.random.default_rng(42)
+    eeg_data = rng.normal(size=(5, 600, 3)) * 30
+    all_pairs = eeg.ChannelPairConnectivity(eeg_data, 250).coherence()
+    # Chunks of one pair, in a different order than all the combinations
+    coherence = eeg.ChannelPairConnectivity(
+        eeg_data, 250, pairs=[(3, 4), (0, 2)], chunk_values=1
+    ).coherence()
+
+    np.testing.assert_allclose(coherence, all_pairs[[9, 1]])
+
+
+def test_false_nearest_neighbor_embedding_dimension():
+    rng = np.random.default_rng(42)
+    time = np.arange(1000) / 100
+    quasi_periodic = np.sin(2 * np.pi * 1.3 * time) + np.sin(2 * np.pi * 2.9 * time)
+    eeg_data = np.stack(
+        [
+            [quasi_periodic + 0.01 * rng.normal(size=1000) for _ in range(2)],
+            [rng.normal(size=1000) for _ in range(2)],
+        ]
+    ).transpose(
+        0, 2, 1
+    )  # [chans x ms x epochs]
+
+    dimensions = eeg.falseNearestNeighbor(eeg_data, maxdims=6)
+
+    assert dimensions.shape == (2, 2)
+    # Noise never settles, the quasi-periodic signal needs a few dimensions
+    assert np.all(dimensions[1] == 6)
+    assert np.all((dimensions[0] >= 2) & (dimensions[0] < 6))
+
+
+def test_histogram_entropies_match_per_signal_histograms():
+    rng = np.random.default_rng(42)
+    eegData = rng.normal(scale=40, size=(3, 500, 4))
+    eegData[0, :, 0] = 500  # Outside the bins, empty histogram
+    eegData[1, :10, 1] = [-199, 199, 197, -200, 200, 0, 1, 2.5, -1, 3]  # On the edges
+
+    entropy = eeg.HistogramEntropy(eegData, -200, 200, 2)
+    tsallis = eeg.tsalisEntropy(eegData, -200, 200, 2, orders=[1, 2, 0.5])
+    renyi = eeg.renyiEntropy(eegData, -200, 200, 2, orders=[1, 2])
+
+    shannon = entropy.shannon()
+    assert shannon[0, 0] == tsallis[1][0, 0] == renyi[1][0, 0] == 0
+    for chan, epoch in [(0, 1), (1, 1), (2, 3)]:
+        counts, _ = np.histogram(eegData[chan, :, epoch], bins=np.arange(-199, 200, 2))
+        np.testing.assert_array_equal(entropy.counts[chan, epoch], counts)
+        prob = counts[counts > 0] / counts.sum()
+        np.testing.assert_allclose(
+            shannon[chan, epoch], -np.dot(prob, np.log2(prob / 2))
+        )
+        np.testing.assert_allclose(tsallis[0][chan, epoch], -np.dot(prob, np.log(prob)))
+        np.testing.assert_allclose(tsallis[1][chan, epoch], 1 - np.sum(prob**2))
+        np.testing.assert_allclose(
+            tsallis[2][chan, epoch], (1 - np.sum(prob**0.5)) / -0.5
+        )
+        np.testing.assert_allclose(renyi[0][chan, epoch], -np.dot(prob, np.log2(prob)))
+        np.testing.assert_allclose(renyi[1][chan, epoch], -np.log2(np.sum(prob**2)))
+
+
+def test_yule_walker_matches_statsmodels():
+    rng = np.random.default_rng(42)
+    xV = signal.lfilter([1], [1, -0.6, 0.3, -0.1], rng.normal(size=(5, 700)), axis=1)
+    xV[2] = 3.0  # Constant
+
+    coefficients, variances = eeg.yuleWalker(xV, order=3)
+
+    assert coefficients.shape == (5, 3)
+    np.testing.assert_array_equal(coefficients[2], 0)
+    for row in [0, 1, 3, 4]:
+        rho, sigma = yule_walker(xV[row], order=3, method="mle", inv=False)
+        np.testing.assert_allclose(coefficients[row], rho)
+        np.testing.assert_allclose(variances[row], sigma**2)
+    np.testing.assert_allclose(
+        eeg.arma(np.transpose(xV.reshape(1, 5, 700), (0, 2, 1)), order=3)[0],
+        coefficients,
+    )
+
+
+def test_mfcc_features_match_librosa_frames_mean():
+    xV = np.random.default_rng(42).normal(scale=20, size=(4, 500))
+    xV[1] = 0
+
+    H = eeg.mfccFeatures(xV, 250, n_mfcc=4, n_fft=256, hop_length=64, n_mels=40)
+
+    for row in range(4):
+        expected = librosa.feature.mfcc(
+            y=xV[row], sr=250, n_mfcc=4, n_fft=256, hop_length=64, n_mels=40
+        ).mean(axis=1)
+        np.testing.assert_allclose(H[row], expected, rtol=1e-6, atol=1e-6)
+    assert eeg.mfcc(np.transpose(xV[np.newaxis], (0, 2, 1)), 250).shape == (1, 4, 2)
+
+
+def test_spike_detection_matches_per_signal_find_peaks():
+    rng = np.random.default_rng(42)
+    eegData = signal.lfilter(
+        [1], [1, -0.9], rng.standard_t(3, size=(3, 500, 6)), axis=1
+    )
+    eegData[1, :, 2] = 0  # Constant, no spikes
+    eegData_subband = rng.normal(size=eegData.shape)
+
+    spikes, shortSpikes, preBurst, postBurst = eeg.SpikeDetection(eegData).features(
+        eegData_subband
+    )
+
+    assert spikes.sum() > 0 and shortSpikes.sum() > 0
+    for chan in range(3):
+        for epoch in range(6):
+            x = eegData[chan, :, epoch]
+            height = 3 * np.std(x) if np.std(x) > 0 else np.inf
+            longPeaks = signal.find_peaks(abs(x - np.mean(x)), height, width=7)[0]
+            allPeaks = signal.find_peaks(abs(x - np.mean(x)), height, width=1)[0]
+            assert spikes[chan, epoch] == len(longPeaks)
+            assert shortSpikes[chan, epoch] == len(allPeaks) - len(longPeaks)
+            subband = eegData_subband[chan, :, epoch]
+            np.testing.assert_allclose(
+                postBurst[chan, epoch] - preBurst[chan, epoch],
+                sum(
+                    np.mean(subband[idx + 1 : idx + 7])
+                    - np.mean(subband[max(idx - 7, 0) : idx - 1])
+                    for idx in longPeaks
+                    if idx > 1
+                ),
+            )
+    np.testing.assert_array_equal(eeg.spikeNum(eegData), spikes)
+
+
+@pytest.mark.parametrize(("sample_rate", "n_samples"), [(250, 350), (500, 701)])
+def test_false_nearest_neighbor_of_short_delta_band(sample_rate, n_samples):
+    # Long delays (slow delta signals) on short trials, the cap of the delay must leave own neighbours
+    rng = np.random.default_rng(42)
+    data = rng.normal(size=(3, 4, n_samples))
+    frequency_ranges = {"delta": get_frequency_ranges(sample_rate)["delta"]}
+    delta = get_filter_bank(sample_rate, frequency_ranges).apply(data)[0]
+    rows = delta.reshape(-1, n_samples)
+    dataset_info = {"sample_rate": sample_rate}
+
+    features = get_extractions(
+        rows, dataset_info, "delta", extractions=("false_nearest_neighbor",)
+    )
+
+    assert features.columns == ["delta_false_nearest_neighbor"]
+    dimensions = features.array[:, 0]
+    assert np.all((dimensions >= 1) & (dimensions <= 10))
+    # Same value alone as in the batch
+    for row in [0, 5, 11]:
+        alone = get_extractions(
+            rows[row : row + 1],
+            dataset_info,
+            "delta",
+            extractions=("false_nearest_neighbor",),
+        )
+        assert alone.array[0, 0] == dimensions[row]
+
+
+def test_trials_by_frequency_band_of_short_trials():
+    data = np.random.default_rng(42).normal(size=(2, 24, 350))
+
+    features = trials_by_frequency_band(data, {"sample_rate": 250})
+
+    assert features.shape[0] == 2 * 24
+    assert np.all(
+        np.isfinite(
+            features.select(
+                [column for column in features.columns if "false_nearest" in column]
+            )
+        )
+    )
@@ -0,0 +1,70 @@
+import mne
+import numpy as np
+from filter_bank import StreamingFilterBank, get_filter_bank
+from scipy import signal
+
+frequency_ranges: dict = {
+    "delta": [0, 3],
+    "theta": [3, 7],
+    "alpha": [7, 13],
+    "gamma": [35, 124],
+}
+
+
+def test_filter_bank_matches_mne_iir_filters():
+    data = np.random.default_rng(42).normal(size=(5, 8, 350))
+
+    filtered_by_band = get_filter_bank(250, frequency_ranges).apply(data)
+
+    assert filtered_by_band.shape == (4, 5, 8, 350)
+    for filtered, (l_freq, h_freq) in zip(filtered_by_band, frequency_ranges.values()):
+        filt = mne.filter.create_filter(
+            data,
+            250,
+            l_freq=l_freq,
+            h_freq=h_freq,
+            method="iir",
+            iir_params=dict(order=8, ftype="butter"),
+            verbose=False,
+        )
+        np.testing.assert_allclose(filtered, signal.sosfiltfilt(filt["sos"], data))
+
+
+def test_filter_bank_is_memoized():
+    assert get_filter_bank(250, frequency_ranges) is get_filter_bank(
+        250, dict(frequency_ranges)
+    )
+
+
+def test_streaming_filter_bank_keeps_state_between_chunks():
+    stream = np.random.default_rng(42).normal(size=(3, 1000))
+    streaming = StreamingFilterBank(
+        250, frequency_ranges, n_channels=3, window_size=350
+    )
+
+    chunks = [streaming.push(stream[:, i : i + 37]) for i in range(0, 1000, 37)]
+    streamed = np.concatenate(chunks, axis=-1)
+
+    filter_bank = get_filter_bank(250, frequency_ranges)
+    for filtered, sos in zip(streamed, filter_bank.sos):
+        zi = signal.sosfilt_zi(sos)[:, np.newaxis, :] * stream[:, 0, np.newaxis]
+        np.testing.assert_allclose(filtered, signal.sosfilt(sos, stream, zi=zi)[0])
+
+    window, raw_window = streaming.get_window()
+    assert streaming.is_full
+    np.testing.assert_allclose(window, streamed[:, :, -350:])
+    np.testing.assert_array_equal(raw_window, stream[:, -350:])
+
+
+def test_streaming_filter_bank_follows_offline_filtering():
+    # After the transient, a sine in the pass band only differs by the causal filter delay
+    time = np.arange(2500) / 250
+    stream = np.sin(2 * np.pi * 10 * time)[np.newaxis]
+    streaming = StreamingFilterBank(
+        250, {"alpha": [7, 13]}, n_channels=1, window_size=350
+    )
+    streaming.push(stream)
+    window, _ = streaming.get_window()
+
+    offline = get_filter_bank(250, {"alpha": [7, 13]}).apply(stream[:, -350:])
+    np.testing.assert_allclose(np.std(window), np.std(offline), rtol=0.05)
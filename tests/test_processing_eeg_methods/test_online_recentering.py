@@ -0,0 +1,59 @@
+import numpy as np
+from band_covariances import BandCovariances, transform_band
+from online_recentering import OnlineRecentering, geodesic_riemann
+from pyriemann.estimation import Covariances
+from pyriemann.tangentspace import TangentSpace
+from pyriemann.utils.mean import mean_riemann
+from sklearn.pipeline import Pipeline
+
+
+def random_spd(rng, n_matrices, n_channels):
+    A = rng.normal(size=(n_matrices, n_channels, 2 * n_channels))
+    return A @ A.transpose(0, 2, 1) / (2 * n_channels)
+
+
+def test_geodesic_riemann():
+    rng = np.random.default_rng(42)
+    A, B = random_spd(rng, 2, 4)
+
+    np.testing.assert_allclose(geodesic_riemann(A, B, 0), A, atol=1e-10)
+    np.testing.assert_allclose(geodesic_riemann(A, B, 1), B, atol=1e-10)
+    # The midpoint is the Riemannian mean of the two matrices
+    np.testing.assert_allclose(
+        geodesic_riemann(A, B, 0.5), mean_riemann(np.array([A, B])), atol=1e-6
+    )
+
+
+def test_running_mean_of_commuting_matrices_is_riemannian_mean():
+    rng = np.random.default_rng(42)
+    covariances = np.array([np.diag(d) for d in rng.uniform(0.5, 2, size=(10, 3))])
+    tangent_space = TangentSpace().fit(covariances[:4])
+
+    recentering = OnlineRecentering(n_seen=4)
+    recentering.recenter(tangent_space, covariances[4:])
+
+    np.testing.assert_allclose(
+        tangent_space.reference_, mean_riemann(covariances), atol=1e-6
+    )
+    assert recentering.n_seen == 4
+
+
+def test_transform_band_recentering():
+    rng = np.random.default_rng(42)
+    X = rng.normal(size=(30, 4, 200))
+    pipeline = Pipeline([("Cova", Covariances()), ("ts", TangentSpace())])
+    pipeline.fit(X)
+    reference = pipeline.named_steps["ts"].reference_.copy()
+
+    # Same session with twice the amplitude, the reference follows it
+    drifted = BandCovariances(2 * X)
+    recentering = OnlineRecentering(n_seen=len(X), memory=10)
+    transform_band(pipeline, drifted, recentering=recentering)
+
+    recentered = pipeline.named_steps["ts"].reference_
+    assert np.trace(recentered) > 2 * np.trace(reference)
+    np.testing.assert_allclose(recentered, recentered.T)
+
+    recentering.advance(len(X))
+    assert recentering.n_seen == 2 * len(X)
+    np.testing.assert_allclose(recentering.weights(2), [0.1, 0.1])
@@ -0,0 +1,49 @@
+import numpy as np
+from multiple_transforms_with_models.transforms_selectKBest_probs import (
+    feature_nodes,
+    transform_data,
+)
+
+dataset_info: dict = {"sample_rate": 250}
+
+
+def test_feature_nodes_of_columns():
+    assert feature_nodes(["beta 1_ERPcova_12", "beta 1_ERPcova_3", "gamma_CSP_0"]) == {
+        ("beta 1", "ERPcova"),
+        ("gamma", "CSP"),
+    }
+
+
+def test_transform_data_only_computes_the_selected_nodes():
+    rng = np.random.default_rng(42)
+    labels = np.repeat(np.arange(4), 30)
+    data = rng.normal(size=(120, 4, 500))
+    features_train, transform_methods = transform_data(
+        data, dataset_info, labels=labels, transform_methods={}
+    )
+
+    # Each band has its own fit
+    assert len(transform_methods) == 32
+    assert (
+        transform_methods[("alpha", "Cova")] is not transform_methods[("gamma", "Cova")]
+    )
+    trial = rng.normal(size=(1, 4, 500))
+    all_features, _ = transform_data(
+        trial, dataset_info, transform_methods=transform_methods
+    )
+    columns_list = [
+        column
+        for column in features_train.columns
+        if column.startswith(("theta_CSP_", "alpha_Cova_"))
+    ]
+    features, _ = transform_data(
+        trial,
+        dataset_info,
+        transform_methods=transform_methods,
+        nodes=feature_nodes(columns_list),
+    )
+
+    assert features.columns == columns_list
+    np.testing.assert_allclose(
+        features.select(columns_list), all_features.select(columns_list)
+    )